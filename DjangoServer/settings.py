@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import json
 from pathlib import Path
 
 import structlog
@@ -36,6 +37,10 @@ DEBUG = config("DEBUG", default='dev') == 'debug' or 'dev' or 'development'
 ALLOWED_HOSTS = ['localhost', '0.0.0.0', '127.0.0.1', '*', '[::1]']
 ALLOWED_HOSTS += config('ALLOWED_HOSTS', default='').split(',')
 
+# Сколько доверенных прокси (балансировщиков) стоит перед приложением и дописывает адрес в X-Forwarded-For.
+# 0 - заголовок не учитывается, адрес клиента берется из соединения
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', cast=int, default=0)
+
 
 # Application definition
 
@@ -47,6 +52,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "knox",
     'booking.apps.BookingConfig',
@@ -184,6 +190,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хэшер PBKDF2 по умолчанию заменен тем же PBKDF2, но считающим хэш в отдельном пуле процессов
+PASSWORD_HASHERS = [
+    "authentication.hashers.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Пул хэширования паролей: количество процессов (0 - хэшировать в потоке запроса) и сколько хэширований может
+# одновременно выполняться и ждать в очереди, прежде чем вход и регистрация начнут отвечать 429
+PASSWORD_HASHING_WORKERS = config("PASSWORD_HASHING_WORKERS", cast=int, default=2)
+PASSWORD_HASHING_MAX_PENDING = config("PASSWORD_HASHING_MAX_PENDING", cast=int, default=16)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -226,6 +246,35 @@ MESSAGE_TEMPLATE = "Ваш код, {0}"
 # Время действия одноразового кода (OTP) в минутах
 OTP_TTL = config("OTP_TTL", default=15)
 
+# Серверный секрет (pepper), которым подписываются хэши одноразовых кодов,
+# и сколько раз можно проверить один код, прежде чем он перестанет приниматься
+OTP_PEPPER = config("OTP_PEPPER", default=SECRET_KEY)
+OTP_MAX_ATTEMPTS = config("OTP_MAX_ATTEMPTS", cast=int, default=5)
+
+# Хранилище одноразовых кодов: "redis" (коды истекают сами через OTP_TTL) или "database" (таблица OneTimePassword)
+OTP_BACKEND = config("OTP_BACKEND", default="redis")
+
+# Настройки ленты объявлений
+# Размер страницы ленты по умолчанию и максимальный размер страницы, который может запросить клиент
+ADVERT_FEED_PAGE_SIZE = config("ADVERT_FEED_PAGE_SIZE", cast=int, default=20)
+ADVERT_FEED_MAX_PAGE_SIZE = config("ADVERT_FEED_MAX_PAGE_SIZE", cast=int, default=100)
+
+# Снапшот ленты в Redis: включен ли, на сколько секунд берется (и продлевается после каждой пачки) блокировка
+# его построения и как часто он пересобирается целиком
+ADVERT_FEED_SNAPSHOT_ENABLED = config("ADVERT_FEED_SNAPSHOT_ENABLED", cast=bool, default=True)
+ADVERT_FEED_SNAPSHOT_BUILD_TIMEOUT = config("ADVERT_FEED_SNAPSHOT_BUILD_TIMEOUT", cast=int, default=30)
+ADVERT_FEED_SNAPSHOT_REBUILD_INTERVAL = config("ADVERT_FEED_SNAPSHOT_REBUILD_INTERVAL", cast=int, default=60 * 60)
+
+# Похожие объявления по совместным лайкам: сколько соседей хранить для объявления, профили с каким количеством лайков
+# не учитывать и как часто (в секундах) пересчитывать соседей
+ADVERT_SIMILARITY_TOP_K = config("ADVERT_SIMILARITY_TOP_K", cast=int, default=50)
+ADVERT_SIMILARITY_MAX_PROFILE_LIKES = config("ADVERT_SIMILARITY_MAX_PROFILE_LIKES", cast=int, default=500)
+ADVERT_SIMILARITY_REBUILD_INTERVAL = config("ADVERT_SIMILARITY_REBUILD_INTERVAL", cast=int, default=6 * 60 * 60)
+
+# Размер подборок похожих объявлений и персональной ленты и сколько последних лайков профиля учитывать в персональной
+ADVERT_RECOMMENDATIONS_LIMIT = config("ADVERT_RECOMMENDATIONS_LIMIT", cast=int, default=20)
+ADVERT_PERSONAL_FEED_SEED_LIKES = config("ADVERT_PERSONAL_FEED_SEED_LIKES", cast=int, default=50)
+
 # Настройки Celery
 REDIS_HOST = config("REDIS_HOST", default="localhost")
 REDIS_PORT = config("REDIS_PORT", cast=int, default=6379)
@@ -233,6 +282,139 @@ REDIS_PORT = config("REDIS_PORT", cast=int, default=6379)
 CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 
+# Кэш
+# Используется тот же Redis, что и для Celery, но отдельная база
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+    }
+}
+
+# Кэш ответов ленты и объявлений для анонимных пользователей: включен ли, время жизни записи и ответа с ошибкой
+# (в секундах) и сколько секунд остальные воркеры ждут, пока один пересчитывает протухшую запись
+ADVERT_CACHE_ENABLED = config("ADVERT_CACHE_ENABLED", cast=bool, default=True)
+ADVERT_CACHE_TTL = config("ADVERT_CACHE_TTL", cast=int, default=60)
+ADVERT_CACHE_ERROR_TTL = config("ADVERT_CACHE_ERROR_TTL", cast=int, default=5)
+ADVERT_CACHE_LOCK_TIMEOUT = config("ADVERT_CACHE_LOCK_TIMEOUT", cast=int, default=5)
+
+# A/B эксперимент ранжирования поиска: доли стратегий в процентах (в сумме не больше 100, остаток получает
+# стратегия по умолчанию), например {"recency": 10, "popular": 10}. Пустой словарь - эксперимент выключен
+ADVERT_RANKING_EXPERIMENT = config("ADVERT_RANKING_EXPERIMENT", cast=json.loads, default="{}")
+# Сколько самых свежих объявлений выборки ранжируют стратегии, чей score не поддерживается индексом
+ADVERT_RANKING_CANDIDATES = config("ADVERT_RANKING_CANDIDATES", cast=int, default=5000)
+
+# Максимальный радиус поиска объявлений поблизости, км
+ADVERT_SEARCH_MAX_RADIUS_KM = config("ADVERT_SEARCH_MAX_RADIUS_KM", cast=float, default=500)
+
+# Разрезы (фасеты) результатов поиска: границы корзин гистограммы цен, сколько самых частых местоположений отдавать
+# и время жизни закэшированных разрезов (в секундах)
+ADVERT_FACET_PRICE_EDGES = [0, 1000, 5000, 10000, 50000, 100000, 500000]
+ADVERT_FACET_TOP_LOCATIONS = config("ADVERT_FACET_TOP_LOCATIONS", cast=int, default=10)
+ADVERT_FACETS_CACHE_TTL = config("ADVERT_FACETS_CACHE_TTL", cast=int, default=30)
+
+# Время жизни закэшированных подсказок автодополнения (в секундах) и максимальное количество подсказок
+ADVERT_AUTOCOMPLETE_CACHE_TTL = config("ADVERT_AUTOCOMPLETE_CACHE_TTL", cast=int, default=60)
+ADVERT_AUTOCOMPLETE_MAX_LIMIT = config("ADVERT_AUTOCOMPLETE_MAX_LIMIT", cast=int, default=10)
+
+# Redis для счетчиков и прочих структур, которые не укладываются в интерфейс кэша (отдельная база)
+REDIS_STORAGE_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/2"
+
+# Счетчик просмотров объявлений: окно (в секундах), в течение которого повторные просмотры одного зрителя
+# не засчитываются, период переноса накопленных просмотров в бд (в секундах) и размер пачки одного UPDATE
+ADVERT_VIEWS_DEDUP_WINDOW = config("ADVERT_VIEWS_DEDUP_WINDOW", cast=int, default=30 * 60)
+ADVERT_VIEWS_FLUSH_INTERVAL = config("ADVERT_VIEWS_FLUSH_INTERVAL", cast=int, default=60)
+ADVERT_VIEWS_FLUSH_BATCH_SIZE = config("ADVERT_VIEWS_FLUSH_BATCH_SIZE", cast=int, default=1000)
+
+# Счетчик лайков объявлений: период переноса накопленных лайков в бд (в секундах) и размер пачки одного UPDATE
+ADVERT_LIKES_FLUSH_INTERVAL = config("ADVERT_LIKES_FLUSH_INTERVAL", cast=int, default=60)
+ADVERT_LIKES_FLUSH_BATCH_SIZE = config("ADVERT_LIKES_FLUSH_BATCH_SIZE", cast=int, default=1000)
+
+# Время (в секундах), на которое один воркер получает перенос счетчика просмотров или лайков в бд
+ADVERT_COUNTERS_FLUSH_TIMEOUT = config("ADVERT_COUNTERS_FLUSH_TIMEOUT", cast=int, default=10 * 60)
+
+# Снятие с публикации истекших объявлений: период запуска (в секундах), размер пачки
+# и максимальное количество пачек за один запуск
+ADVERT_EXPIRY_INTERVAL = config("ADVERT_EXPIRY_INTERVAL", cast=int, default=5 * 60)
+ADVERT_EXPIRY_BATCH_SIZE = config("ADVERT_EXPIRY_BATCH_SIZE", cast=int, default=500)
+ADVERT_EXPIRY_MAX_BATCHES = config("ADVERT_EXPIRY_MAX_BATCHES", cast=int, default=20)
+
+# Уменьшенные копии (рендиции) изображений объявлений: максимальные ширина и высота каждой копии
+# и качество сжатия WebP/JPEG
+ADVERT_IMAGE_RENDITIONS = {
+    "thumbnail": (200, 200),
+    "card": (640, 480),
+    "full": (1600, 1200),
+}
+ADVERT_IMAGE_QUALITY = config("ADVERT_IMAGE_QUALITY", cast=int, default=82)
+
+# Загрузка изображений объявлений отдельным запросом: максимальный размер файла (в байтах) и сколько секунд
+# хранится загрузка, на которую так и не сослалось ни одно объявление
+ADVERT_UPLOAD_MAX_SIZE = config("ADVERT_UPLOAD_MAX_SIZE", cast=int, default=10 * 1024 * 1024)
+ADVERT_UPLOAD_TTL = config("ADVERT_UPLOAD_TTL", cast=int, default=24 * 60 * 60)
+
+# Импорт объявлений из CSV/XLSX: максимальный размер файла (в байтах), сколько строк проверяется и вставляется
+# за раз, сколько ошибок по строкам сохраняется и таймаут (в секундах) скачивания изображения по ссылке из файла
+ADVERT_IMPORT_MAX_SIZE = config("ADVERT_IMPORT_MAX_SIZE", cast=int, default=100 * 1024 * 1024)
+ADVERT_IMPORT_CHUNK_SIZE = config("ADVERT_IMPORT_CHUNK_SIZE", cast=int, default=500)
+ADVERT_IMPORT_MAX_ERRORS = config("ADVERT_IMPORT_MAX_ERRORS", cast=int, default=1000)
+ADVERT_IMPORT_IMAGE_TIMEOUT = config("ADVERT_IMPORT_IMAGE_TIMEOUT", cast=int, default=10)
+
+# Выгрузки (объявлений, платежей): сколько записей читается из бд и отправляется клиенту за раз
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", cast=int, default=2000)
+
+# Максимальное количество объявлений в одном запросе массового управления объявлениями
+ADVERT_BULK_MAX_ITEMS = config("ADVERT_BULK_MAX_ITEMS", cast=int, default=500)
+
+# Кэш проверенных токенов авторизации: включен ли, сколько секунд токен хранится в Redis, сколько секунд и сколько
+# токенов хранится в памяти процесса (на это время отзыв токена может опоздать в других процессах)
+# и сколько секунд отозванный токен нельзя закэшировать снова
+AUTH_TOKEN_CACHE_ENABLED = config("AUTH_TOKEN_CACHE_ENABLED", cast=bool, default=True)
+AUTH_TOKEN_CACHE_TTL = config("AUTH_TOKEN_CACHE_TTL", cast=int, default=5 * 60)
+AUTH_TOKEN_CACHE_LOCAL_TTL = config("AUTH_TOKEN_CACHE_LOCAL_TTL", cast=int, default=5)
+AUTH_TOKEN_CACHE_LOCAL_SIZE = config("AUTH_TOKEN_CACHE_LOCAL_SIZE", cast=int, default=10000)
+AUTH_TOKEN_REVOCATION_TTL = config("AUTH_TOKEN_REVOCATION_TTL", cast=int, default=60)
+
+# Продление токенов авторизации (при включенном REST_KNOX AUTO_REFRESH): режим ("sync" - как в knox, записью в бд
+# на каждом запросе, "deferred" - не раньше, чем пройдет доля TTL токена, с переносом в бд пачками фоновой задачей),
+# эта доля, период переноса продлений в бд (в секундах) и размер пачки одного UPDATE
+AUTH_TOKEN_REFRESH_MODE = config("AUTH_TOKEN_REFRESH_MODE", default="deferred")
+AUTH_TOKEN_REFRESH_FRACTION = config("AUTH_TOKEN_REFRESH_FRACTION", cast=float, default=0.1)
+AUTH_TOKEN_REFRESH_FLUSH_INTERVAL = config("AUTH_TOKEN_REFRESH_FLUSH_INTERVAL", cast=int, default=60)
+AUTH_TOKEN_REFRESH_FLUSH_BATCH_SIZE = config("AUTH_TOKEN_REFRESH_FLUSH_BATCH_SIZE", cast=int, default=1000)
+
+# Периодические задачи Celery (запускаются celery beat)
+CELERY_BEAT_SCHEDULE = {
+    "flush-advert-views": {
+        "task": "booking.tasks.flush_advert_views_task",
+        "schedule": ADVERT_VIEWS_FLUSH_INTERVAL,
+    },
+    "flush-advert-likes": {
+        "task": "booking.tasks.flush_advert_likes_task",
+        "schedule": ADVERT_LIKES_FLUSH_INTERVAL,
+    },
+    "expire-adverts": {
+        "task": "booking.tasks.expire_adverts_task",
+        "schedule": ADVERT_EXPIRY_INTERVAL,
+    },
+    "rebuild-feed-snapshot": {
+        "task": "booking.tasks.rebuild_feed_snapshot_task",
+        "schedule": ADVERT_FEED_SNAPSHOT_REBUILD_INTERVAL,
+    },
+    "delete-stale-advert-uploads": {
+        "task": "booking.tasks.delete_stale_uploads_task",
+        "schedule": 60 * 60,
+    },
+    "rebuild-advert-neighbours": {
+        "task": "booking.tasks.rebuild_advert_neighbours_task",
+        "schedule": ADVERT_SIMILARITY_REBUILD_INTERVAL,
+    },
+    "flush-token-refreshes": {
+        "task": "authentication.tasks.flush_token_refreshes_task",
+        "schedule": AUTH_TOKEN_REFRESH_FLUSH_INTERVAL,
+    },
+}
+
 # Email
 EMAIL_BACKEND = config("EMAIL_BACKEND", "")
 EMAIL_HOST = config("EMAIL_HOST", "")
@@ -1,2 +1,12 @@
 def user_directory_path(instance, filename):
-    return 'adverts/images/user_{0}/{1}'.format(instance.contact.id, filename)
+    # У фотографии объявления нет своего контакта, берется контакт объявления
+    contact_id = instance.contact_id if hasattr(instance, 'contact_id') else instance.advert.contact_id
+    return 'adverts/images/user_{0}/{1}'.format(contact_id, filename)
+
+
+def upload_directory_path(instance, filename):
+    return 'adverts/uploads/user_{0}/{1}'.format(instance.owner_id, filename)
+
+
+def import_directory_path(instance, filename):
+    return 'adverts/imports/user_{0}/{1}'.format(instance.owner_id, filename)
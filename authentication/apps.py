@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        # Подписываем отзыв токенов из кэша на удаление токенов
+        import authentication.token_cache  # noqa: F401
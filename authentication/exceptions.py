@@ -1,2 +1,14 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
 class InvalidPhoneError(ValueError):
     pass
+
+
+class PasswordHashingBusy(APIException):
+    """Все слоты пула хэширования паролей заняты: вход и регистрация временно отклоняются"""
+
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'Сервер перегружен входами, повторите попытку позже'
+    default_code = 'password_hashing_busy'
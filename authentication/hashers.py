@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import structlog
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from prometheus_client import Counter, Gauge, Histogram
+
+from authentication.exceptions import PasswordHashingBusy
+
+logger = structlog.get_logger(__name__)
+
+hashing_in_flight = Gauge(
+    'password_hashing_in_flight',
+    'Хэширования паролей, которые выполняются или ждут своей очереди в пуле процессов',
+)
+hashing_latency = Histogram(
+    'password_hashing_seconds',
+    'Время хэширования пароля вместе с ожиданием в очереди пула',
+)
+hashing_rejected = Counter(
+    'password_hashing_rejected_total',
+    'Хэширования паролей, отклоненные из-за переполнения очереди пула',
+)
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_in_flight = 0
+
+
+def _encode(password: str, salt: str, iterations: Optional[int]) -> str:
+    # Выполняется в процессе пула
+    return PBKDF2PasswordHasher().encode(password, salt, iterations)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    with _lock:
+        # Пул, унаследованный при fork воркера сервера, в дочернем процессе не работает
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _lock:
+        _pool = None
+
+
+def _acquire_slot() -> bool:
+    global _in_flight
+    with _lock:
+        if _in_flight >= settings.PASSWORD_HASHING_MAX_PENDING:
+            return False
+        _in_flight += 1
+        return True
+
+
+def _release_slot() -> None:
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+
+
+def hash_in_pool(password: str, salt: str, iterations: Optional[int]) -> str:
+    """
+    Посчитать PBKDF2 хэш пароля в пуле процессов `PASSWORD_HASHING_WORKERS`
+
+    Поток запроса ждет результат, но CPU расходуется ограниченным числом процессов пула, так что всплеск входов
+    не отнимает процессор у остальных запросов. Если уже выполняются или ждут `PASSWORD_HASHING_MAX_PENDING`
+    хэширований, новое сразу отклоняется. При `PASSWORD_HASHING_WORKERS = 0` хэш считается в потоке запроса
+
+    :raises PasswordHashingBusy: очередь пула переполнена
+    """
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return _encode(password, salt, iterations)
+
+    if not _acquire_slot():
+        hashing_rejected.inc()
+        raise PasswordHashingBusy()
+
+    hashing_in_flight.inc()
+    started = time.monotonic()
+    try:
+        return _get_pool().submit(_encode, password, salt, iterations).result()
+    except BrokenProcessPool:
+        # Процесс пула упал (например, убит OOM killer): пул пересоздается при следующем хэшировании
+        logger.error('password hashing pool is broken, hashing inline')
+        _reset_pool()
+        return _encode(password, salt, iterations)
+    finally:
+        hashing_latency.observe(time.monotonic() - started)
+        hashing_in_flight.dec()
+        _release_slot()
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Стандартный PBKDF2 хэшер Django, считающий хэш в пуле процессов (см. `hash_in_pool`)
+
+    Алгоритм и формат хэша те же, так что сохраненные пароли проверяются без миграции. Проверка пароля
+    (`verify`) тоже хэширует через `encode`, поэтому вход, регистрация и смена пароля проходят через пул
+    """
+
+    def encode(self, password: str, salt: str, iterations: Optional[int] = None) -> str:
+        return hash_in_pool(password, salt, iterations)
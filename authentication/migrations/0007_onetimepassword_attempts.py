@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_alter_profile_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onetimepassword',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток проверки'),
+        ),
+    ]
@@ -1,9 +1,20 @@
+import binascii
+from datetime import datetime, timezone
+from hmac import compare_digest
+
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import get_token_model
+from knox.settings import CONSTANTS, knox_settings
 from rest_framework import exceptions, HTTP_HEADER_ENCODING
 from rest_framework.authentication import BasicAuthentication
 from rest_framework.request import Request
 
+from authentication.token_cache import CachedToken, cache_token, get_cached_token, revoke_cached_tokens
+from authentication.token_refresh import refresh_token_expiry
 from authentication.utils import make_phone_uniform
 
 
@@ -39,3 +50,68 @@ class CookieTokenAuthentication(TokenAuthentication):
 
         user, auth_token = self.authenticate_credentials(auth[1])
         return (user, auth_token)
+
+    def authenticate_credentials(self, key: bytes):
+        """
+        Проверка токена как в knox, но токен загружается вместе с пользователем и его профилем одним запросом,
+        так что request.user.profile дальше в запросе не обращается к бд
+
+        Проверенные токены кэшируются (см. authentication.token_cache): для закэшированного токена из бд
+        загружаются только пользователь и профиль, без поиска токена и сравнения хэшей
+        """
+        msg = _('Invalid token.')
+        token = key.decode("utf-8")
+        try:
+            digest = hash_token(token)
+        except (TypeError, binascii.Error):
+            raise exceptions.AuthenticationFailed(msg)  # type: ignore[arg-type]
+
+        cached = get_cached_token(digest)
+        if cached is not None:
+            return self._authenticate_cached(digest, cached)
+
+        auth_tokens = (
+            get_token_model()
+            .objects.filter(token_key=token[: CONSTANTS.TOKEN_KEY_LENGTH])
+            .select_related('user', 'user__profile')
+        )
+        for auth_token in auth_tokens:
+            if self._cleanup_token(auth_token):
+                continue
+
+            if compare_digest(digest, auth_token.digest):
+                if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                    self.renew_token(auth_token)
+                user, auth_token = self.validate_user(auth_token)
+                cache_token(auth_token)
+                return user, auth_token
+        raise exceptions.AuthenticationFailed(msg)  # type: ignore[arg-type]
+
+    def _authenticate_cached(self, digest: str, cached: CachedToken):
+        user = User.objects.select_related('profile').filter(pk=cached.user_id).first()
+        if user is None:
+            revoke_cached_tokens([digest])
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))  # type: ignore[arg-type]
+
+        auth_token = get_token_model()(
+            digest=digest,
+            token_key=cached.token_key,
+            user=user,
+            created=datetime.fromtimestamp(cached.created, tz=timezone.utc),
+            expiry=datetime.fromtimestamp(cached.expiry, tz=timezone.utc) if cached.expiry is not None else None,
+        )
+        if knox_settings.AUTO_REFRESH and auth_token.expiry and self.renew_token(auth_token):
+            cache_token(auth_token)
+        return self.validate_user(auth_token)
+
+    def renew_token(self, auth_token) -> bool:
+        """
+        Продлить токен в режиме `AUTH_TOKEN_REFRESH_MODE`: "sync" - как в knox, записью в бд на каждом запросе,
+        "deferred" - не чаще чем раз в долю TTL токена, с отложенной записью в бд (см. authentication.token_refresh)
+        :return: изменилось ли время истечения токена
+        """
+        if settings.AUTH_TOKEN_REFRESH_MODE == 'deferred':
+            return refresh_token_expiry(auth_token)
+
+        super().renew_token(auth_token)
+        return True
@@ -6,9 +6,9 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.db import models
-from django.contrib.auth.hashers import make_password as hash_value
 
 from DjangoServer.settings import OTP_TTL
+from authentication.utils import hash_otp
 
 
 # Create your models here.
@@ -66,6 +66,7 @@ class OneTimePassword(models.Model):
     + user: Связь с User'ом, которому был назначен и отослан код
     + code: Хэшированный 6-ти значный код
     + creation_date: Дата создания кода
+    + attempts: Количество попыток проверки кода
 
     Properties:
     + has_expired(): Проверка истекла ли валидность кода
@@ -74,12 +75,13 @@ class OneTimePassword(models.Model):
     user = models.ForeignKey(User, related_name="otps", on_delete=models.CASCADE, verbose_name="Пользователь")
     code = models.CharField(max_length=128, default="", verbose_name="Одноразовый код (хэш)")
     creation_date = models.DateTimeField(auto_now=True, verbose_name="Время создания")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток проверки")
 
     def save(self, *args, **kwargs) -> str:  # type: ignore
         otp = ""
         if not self.code:
             otp = OneTimePassword.generate_otp()
-            self.code = hash_value(otp)
+            self.code = hash_otp(self.user_id, otp)
         super().save(*args, **kwargs)
         return otp
 
@@ -0,0 +1,152 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password as compare_otps
+from django.contrib.auth.models import User
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from authentication.models import OneTimePassword
+from authentication.utils import OTP_HMAC_PREFIX, hash_otp, otp_matches
+from common.redis import get_redis
+
+OTP_KEY = 'auth:otp:{user_id}'
+
+# Проверяет код пользователя: засчитывает попытку, сравнивает хэш и при совпадении (если ARGV[3] == 1) удаляет код.
+# KEYS[1] - хэш с кодом и счетчиком попыток; ARGV[1] - хэш проверяемого кода, ARGV[2] - максимум попыток.
+# Возвращает 1 - код верный, 0 - кода нет (не отправлялся или истек), -1 - попытки исчерпаны, -2 - код неверный
+VERIFY_OTP_SCRIPT = """
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 0
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) > tonumber(ARGV[2]) then
+    return -1
+end
+if code ~= ARGV[1] then
+    return -2
+end
+if ARGV[3] == '1' then
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+NO_CODES_ERROR = {"detail": "user doesn't have any codes"}
+EXPIRED_ERROR = {"detail": "latest otp already expired"}
+TOO_MANY_ATTEMPTS_ERROR = {"detail": "too many otp attempts"}
+MISMATCH_ERROR = {"detail": "otp doesn't match"}
+
+
+class OTPBackend(ABC):
+    """Хранилище одноразовых кодов: у пользователя действует только последний отправленный код"""
+
+    name: str
+
+    @abstractmethod
+    def create(self, user: User) -> str:
+        """Создать новый код пользователя вместо прежнего и вернуть его в открытом виде"""
+
+    @abstractmethod
+    def verify(self, user: User, otp: str, consume: bool) -> None:
+        """
+        Проверить код пользователя, засчитав попытку
+
+        :param consume (bool) Погасить верный код, чтобы его нельзя было использовать повторно
+        :raises ValidationError: кода нет, он истек, неверен или по нему исчерпаны попытки
+        """
+
+
+OTP_BACKENDS: Dict[str, Type[OTPBackend]] = {}
+
+
+def register(backend_class: Type[OTPBackend]) -> Type[OTPBackend]:
+    """Декоратор, регистрирующий хранилище под его именем"""
+    OTP_BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+@register
+class DatabaseOTPBackend(OTPBackend):
+    """Коды в таблице OneTimePassword, действует последний созданный"""
+
+    name = 'database'
+
+    def create(self, user: User) -> str:
+        return OneTimePassword(user=user).save()
+
+    def verify(self, user: User, otp: str, consume: bool) -> None:
+        try:
+            latest_otp = user.otps.latest("creation_date")  # type: ignore[attr-defined]
+        except OneTimePassword.DoesNotExist:
+            raise ValidationError(detail=NO_CODES_ERROR)
+
+        # Попытка засчитывается до сравнения одним UPDATE, так что параллельный перебор не обходит ограничение
+        attempt_counted = OneTimePassword.objects.filter(
+            pk=latest_otp.pk, attempts__lt=settings.OTP_MAX_ATTEMPTS
+        ).update(attempts=F("attempts") + 1)
+        if not attempt_counted:
+            raise ValidationError(detail=TOO_MANY_ATTEMPTS_ERROR)
+
+        if latest_otp.code.startswith(OTP_HMAC_PREFIX):
+            otp_valid = otp_matches(user.pk, otp, latest_otp.code)
+        else:
+            # Код, созданный до перехода на HMAC
+            otp_valid = compare_otps(otp, latest_otp.code)
+
+        if not otp_valid:
+            raise ValidationError(detail=MISMATCH_ERROR)
+
+        if latest_otp.has_expired:
+            raise ValidationError(detail=EXPIRED_ERROR)
+
+        if consume:
+            # Вместе с погашенным удаляются и прежние коды, иначе последним стал бы предыдущий
+            user.otps.all().delete()  # type: ignore[attr-defined]
+
+
+@register
+class RedisOTPBackend(OTPBackend):
+    """
+    Коды в Redis: хэш кода и счетчик попыток под ключом пользователя, который истекает через `OTP_TTL` минут
+
+    Проверка, подсчет попыток и погашение кода выполняются одним Lua скриптом, так что параллельные запросы
+    не могут ни превысить число попыток, ни использовать один код дважды. Хэш кода подписан секретом
+    (см. `hash_otp`), поэтому сравнение хэшей в скрипте не за постоянное время ничего не раскрывает
+    """
+
+    name = 'redis'
+
+    def create(self, user: User) -> str:
+        otp = OneTimePassword.generate_otp()
+        key = OTP_KEY.format(user_id=user.pk)
+        with get_redis().pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={'code': hash_otp(user.pk, otp), 'attempts': 0})
+            pipe.expire(key, int(settings.OTP_TTL) * 60)
+            pipe.execute()
+
+        return otp
+
+    def verify(self, user: User, otp: str, consume: bool) -> None:
+        result = get_redis().eval(
+            VERIFY_OTP_SCRIPT,
+            1,
+            OTP_KEY.format(user_id=user.pk),
+            hash_otp(user.pk, otp),
+            settings.OTP_MAX_ATTEMPTS,
+            int(consume),
+        )
+
+        if result == 0:
+            raise ValidationError(detail=NO_CODES_ERROR)
+        if result == -1:
+            raise ValidationError(detail=TOO_MANY_ATTEMPTS_ERROR)
+        if result == -2:
+            raise ValidationError(detail=MISMATCH_ERROR)
+
+
+def get_otp_backend() -> OTPBackend:
+    """Хранилище одноразовых кодов, выбранное настройкой `OTP_BACKEND`"""
+    return OTP_BACKENDS[settings.OTP_BACKEND]()
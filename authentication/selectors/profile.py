@@ -1,5 +1,8 @@
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from rest_framework.request import Request
 from rest_framework.exceptions import NotFound
 
 from authentication.models import Profile
@@ -28,3 +31,24 @@ def get_user_with_profile_by_phone(phone: str) -> User:
     except User.DoesNotExist:
         raise NotFound(detail={"detail": "user not found"})
     return user
+
+
+def get_request_profile(request: Request) -> Profile:
+    """
+    Получить профиль авторизованного пользователя запроса
+
+    Профиль кэшируется на объекте пользователя запроса: CookieTokenAuthentication загружает его вместе с
+    пользователем одним запросом, а при других способах аутентификации он загружается при первом обращении,
+    так что view, permissions и сервисы в рамках запроса получают один и тот же объект без запросов к бд
+    :param request: Запрос авторизованного пользователя
+    :return: Объект Profile пользователя запроса
+    """
+    try:
+        profile = request.user.profile
+    except (AttributeError, ObjectDoesNotExist):
+        raise Http404
+    if profile.pk is None:
+        # Профиль привязан к пользователю, но еще не сохранен в бд
+        raise Http404
+
+    return profile
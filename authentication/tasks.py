@@ -0,0 +1,9 @@
+from django.conf import settings
+
+from DjangoServer import celery_app
+from authentication.token_refresh import flush_token_refreshes
+
+
+@celery_app.task
+def flush_token_refreshes_task():
+    return flush_token_refreshes(batch_size=settings.AUTH_TOKEN_REFRESH_FLUSH_BATCH_SIZE)
@@ -0,0 +1,208 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.http import Http404
+from django.urls import reverse
+from django.utils import timezone
+from knox.models import AuthToken
+from knox.settings import knox_settings
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from authentication.misc.custom_auth import CookieTokenAuthentication
+from authentication.models import Profile
+from authentication.selectors.profile import get_request_profile
+from authentication.token_cache import TOKEN_CACHE_KEY, cache_token, get_cached_token, local_token_cache
+from authentication.token_refresh import TOKEN_REFRESH_PENDING_KEY, flush_token_refreshes
+
+pytestmark = pytest.mark.django_db
+
+
+def make_request(token: str) -> Request:
+    factory = APIRequestFactory()
+    factory.cookies['Authorization'] = f'Token {token}'
+    return Request(factory.get('/'))
+
+
+class TestCookieTokenAuthentication:
+
+    def test_authenticate_loads_profile(self, auth_profile: Profile, django_assert_num_queries):
+        """
+        Arrange: Токен пользователя с профилем
+        Act: Аутентификация запроса по токену из cookie и получение профиля запроса
+        Assert: Пользователь и профиль загружены вместе с токеном, профиль получен без запросов к бд
+        """
+        auth_profile.user.save()
+        auth_profile.save()
+        _, token = AuthToken.objects.create(user=auth_profile.user)
+        request = make_request(token)
+
+        user, auth_token = CookieTokenAuthentication().authenticate(request)
+        request.user = user
+
+        assert auth_token.user_id == auth_profile.user.pk
+        with django_assert_num_queries(0):
+            assert get_request_profile(request) == auth_profile
+            assert get_request_profile(request) is get_request_profile(request)
+
+    def test_authenticate_invalid_token(self, auth_profile: Profile):
+        """
+        Arrange: Токен пользователя
+        Act: Аутентификация с токеном, отличающимся от выданного
+        Assert: Ошибка аутентификации
+        """
+        auth_profile.user.save()
+        auth_profile.save()
+        _, token = AuthToken.objects.create(user=auth_profile.user)
+
+        with pytest.raises(exceptions.AuthenticationFailed):
+            CookieTokenAuthentication().authenticate(make_request(token[:-1] + ('0' if token[-1] != '0' else '1')))
+
+    def test_request_profile_missing(self, auth_user: User):
+        """
+        Arrange: Токен пользователя без профиля
+        Act: Получение профиля запроса
+        Assert: 404 ошибка
+        """
+        auth_user.save()
+        _, token = AuthToken.objects.create(user=auth_user)
+        request = make_request(token)
+        request.user, _ = CookieTokenAuthentication().authenticate(request)
+
+        with pytest.raises(Http404):
+            get_request_profile(request)
+
+
+class TestTokenCache:
+
+    def _create_token(self, auth_profile: Profile) -> str:
+        auth_profile.user.save()
+        auth_profile.save()
+        _, token = AuthToken.objects.create(user=auth_profile.user)
+        return token
+
+    def test_cached_token_skips_token_lookup(self, auth_profile: Profile, django_assert_num_queries, redis_storage):
+        """
+        Arrange: Токен, уже прошедший проверку
+        Act: Повторная аутентификация в этом процессе и в другом (кэш в памяти пуст)
+        Assert: Токен берется из кэша, из бд загружаются только пользователь с профилем
+        """
+        token = self._create_token(auth_profile)
+        CookieTokenAuthentication().authenticate(make_request(token))
+
+        with django_assert_num_queries(1):
+            user, auth_token = CookieTokenAuthentication().authenticate(make_request(token))
+        local_token_cache.clear()
+        with django_assert_num_queries(1):
+            CookieTokenAuthentication().authenticate(make_request(token))
+
+        assert user == auth_profile.user
+        assert user.profile == auth_profile
+        assert AuthToken.objects.get(pk=auth_token.pk).token_key == auth_token.token_key
+        assert redis_storage.exists(TOKEN_CACHE_KEY.format(digest=auth_token.digest))
+
+    @pytest.mark.parametrize('url_name', ('logout', 'logout-all'))
+    def test_logout_revokes_cached_token(
+        self, api_client: APIClient, auth_profile: Profile, url_name: str, django_capture_on_commit_callbacks
+    ):
+        """
+        Arrange: Закэшированный токен пользователя
+        Act: Выход (из текущей или из всех сессий) по этому токену
+        Assert: Токен больше не принимается
+        """
+        token = self._create_token(auth_profile)
+        CookieTokenAuthentication().authenticate(make_request(token))
+        api_client.cookies['Authorization'] = f'Token {token}'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse(url_name))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        with pytest.raises(exceptions.AuthenticationFailed):
+            CookieTokenAuthentication().authenticate(make_request(token))
+
+    def test_token_read_before_logout_not_cached(
+        self, auth_profile: Profile, redis_storage, django_capture_on_commit_callbacks
+    ):
+        """
+        Arrange: Запрос прочитал токен из бд
+        Act: Выход по токену коммитится раньше, чем запрос кэширует прочитанный токен
+        Assert: Токен не попал в кэш и больше не принимается
+        """
+        token = self._create_token(auth_profile)
+        auth_token = AuthToken.objects.get(user=auth_profile.user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            AuthToken.objects.filter(digest=auth_token.digest).delete()
+        cache_token(auth_token)
+
+        assert get_cached_token(auth_token.digest) is None
+        assert not redis_storage.exists(TOKEN_CACHE_KEY.format(digest=auth_token.digest))
+        with pytest.raises(exceptions.AuthenticationFailed):
+            CookieTokenAuthentication().authenticate(make_request(token))
+
+
+class TestTokenRefresh:
+
+    @pytest.fixture(autouse=True)
+    def auto_refresh(self, monkeypatch, settings):
+        monkeypatch.setattr(knox_settings, 'AUTO_REFRESH', True)
+        settings.AUTH_TOKEN_REFRESH_MODE = 'deferred'
+        settings.AUTH_TOKEN_REFRESH_FRACTION = 0.1
+
+    def _create_token(self, auth_profile: Profile, expires_in: timedelta) -> tuple[AuthToken, str]:
+        auth_profile.user.save()
+        auth_profile.save()
+        auth_token, token = AuthToken.objects.create(user=auth_profile.user)
+        AuthToken.objects.filter(pk=auth_token.pk).update(expiry=timezone.now() + expires_in)
+        return AuthToken.objects.get(pk=auth_token.pk), token
+
+    def test_fresh_token_not_refreshed(self, auth_profile: Profile, redis_storage):
+        """
+        Arrange: Токен, продленный меньше доли TTL назад
+        Act: Аутентификация по токену
+        Assert: Токен не продлевается
+        """
+        auth_token, token = self._create_token(auth_profile, knox_settings.TOKEN_TTL - timedelta(minutes=1))
+
+        CookieTokenAuthentication().authenticate(make_request(token))
+
+        assert not redis_storage.exists(TOKEN_REFRESH_PENDING_KEY)
+        assert AuthToken.objects.get(pk=auth_token.pk).expiry == auth_token.expiry
+
+    def test_refresh_deferred_and_coalesced(self, auth_profile: Profile, redis_storage, django_assert_num_queries):
+        """
+        Arrange: Токен, с продления которого прошло больше доли TTL
+        Act: Несколько аутентификаций по токену и перенос продлений в бд
+        Assert: Запросы не пишут в бд, токен продлевается один раз и попадает в бд только при переносе
+        """
+        auth_token, token = self._create_token(auth_profile, knox_settings.TOKEN_TTL / 2)
+
+        CookieTokenAuthentication().authenticate(make_request(token))
+        with django_assert_num_queries(1):
+            _, cached_token = CookieTokenAuthentication().authenticate(make_request(token))
+
+        assert AuthToken.objects.get(pk=auth_token.pk).expiry == auth_token.expiry
+        assert redis_storage.hlen(TOKEN_REFRESH_PENDING_KEY) == 1
+        assert cached_token.expiry > timezone.now() + knox_settings.TOKEN_TTL - timedelta(minutes=1)
+
+        assert flush_token_refreshes(batch_size=10) == 1
+
+        refreshed_expiry = AuthToken.objects.get(pk=auth_token.pk).expiry
+        assert abs((refreshed_expiry - cached_token.expiry).total_seconds()) < 1
+        assert not redis_storage.exists(TOKEN_REFRESH_PENDING_KEY)
+
+    def test_sync_mode_writes_immediately(self, auth_profile: Profile, settings):
+        """
+        Arrange: Режим продления как в knox, токен, с продления которого прошло больше минуты
+        Act: Аутентификация по токену
+        Assert: Токен продлен в бд сразу
+        """
+        settings.AUTH_TOKEN_REFRESH_MODE = 'sync'
+        auth_token, token = self._create_token(auth_profile, knox_settings.TOKEN_TTL / 2)
+
+        CookieTokenAuthentication().authenticate(make_request(token))
+
+        assert AuthToken.objects.get(pk=auth_token.pk).expiry > auth_token.expiry
@@ -0,0 +1,67 @@
+import base64
+
+import pytest
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+pytestmark = pytest.mark.django_db
+
+PASSWORD = 'dVk3-secret-pass'
+
+
+def login(api_client: APIClient, user: User, password: str):
+    credentials = base64.b64encode(f'{user.username}:{password}'.encode()).decode()
+    api_client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+    return api_client.post(reverse('login'))
+
+
+class TestPooledPasswordHasher:
+
+    @pytest.fixture(autouse=True)
+    def hashing_pool(self, settings):
+        settings.PASSWORD_HASHING_WORKERS = 1
+        settings.PASSWORD_HASHING_MAX_PENDING = 4
+
+    @pytest.fixture
+    def user(self, auth_user: User) -> User:
+        auth_user.set_password(PASSWORD)
+        auth_user.save()
+        return auth_user
+
+    def test_hash_compatible_with_pbkdf2(self):
+        """
+        Arrange: -
+        Act: Хэширование пароля в пуле процессов
+        Assert: Хэш в формате стандартного PBKDF2 хэшера Django и проверяется им
+        """
+        encoded = make_password(PASSWORD)
+
+        assert encoded.startswith('pbkdf2_sha256$')
+        assert PBKDF2PasswordHasher().verify(PASSWORD, encoded)
+        assert check_password(PASSWORD, encoded)
+        assert not check_password('wrong', encoded)
+
+    def test_login(self, api_client: APIClient, user: User):
+        """
+        Arrange: Пользователь с паролем
+        Act: Вход по телефону и паролю
+        Assert: Вход выполнен
+        """
+        response = login(api_client, user, PASSWORD)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_login_rejected_when_pool_saturated(self, api_client: APIClient, user: User, settings):
+        """
+        Arrange: Пользователь с паролем, очередь пула хэширования заполнена
+        Act: Вход по телефону и паролю
+        Assert: 429 ошибка
+        """
+        settings.PASSWORD_HASHING_MAX_PENDING = 0
+
+        response = login(api_client, user, PASSWORD)
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
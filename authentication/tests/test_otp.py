@@ -0,0 +1,152 @@
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from rest_framework.exceptions import ValidationError
+
+from authentication.models import OneTimePassword
+from authentication.otp import OTP_KEY
+from authentication.services.verification import BaseVerificationService
+from authentication.utils import OTP_HMAC_PREFIX
+
+pytestmark = pytest.mark.django_db
+
+
+class TestOneTimePassword:
+
+    @pytest.fixture
+    def user(self, auth_user: User) -> User:
+        auth_user.save()
+        return auth_user
+
+    def test_verify_otp(self, user: User):
+        """
+        Arrange: Пользователь
+        Act: Создание кода и его проверка
+        Assert: Код хранится в виде HMAC хэша и проходит проверку
+        """
+        service = BaseVerificationService(user)
+
+        otp = service.create_otp()
+
+        assert len(otp) == 6 and otp.isdigit()
+        assert user.otps.get().code.startswith(OTP_HMAC_PREFIX)
+        service.verify_otp(otp)
+
+    def test_wrong_otp(self, user: User):
+        """
+        Arrange: Код пользователя
+        Act: Проверка неверного кода
+        Assert: Ошибка валидации
+        """
+        service = BaseVerificationService(user)
+        otp = service.create_otp()
+
+        with pytest.raises(ValidationError):
+            service.verify_otp(str((int(otp) + 1) % 1_000_000).zfill(6))
+
+    def test_otp_attempts_limited(self, user: User, settings):
+        """
+        Arrange: Код пользователя, по которому исчерпаны попытки проверки
+        Act: Проверка верного кода
+        Assert: Код больше не принимается
+        """
+        settings.OTP_MAX_ATTEMPTS = 3
+        service = BaseVerificationService(user)
+        otp = service.create_otp()
+        wrong_otp = str((int(otp) + 1) % 1_000_000).zfill(6)
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            with pytest.raises(ValidationError):
+                service.verify_otp(wrong_otp)
+
+        with pytest.raises(ValidationError, match='too many otp attempts'):
+            service.verify_otp(otp)
+
+    def test_legacy_otp(self, user: User, settings):
+        """
+        Arrange: Код, созданный до перехода на HMAC (хэш PBKDF2)
+        Act: Проверка кода
+        Assert: Код проходит проверку
+        """
+        settings.PASSWORD_HASHING_WORKERS = 0
+        OneTimePassword.objects.create(user=user, code=make_password('123456'))
+
+        BaseVerificationService(user).verify_otp('123456')
+
+    def test_otp_consumed(self, user: User):
+        """
+        Arrange: Два кода пользователя
+        Act: Проверка последнего кода без погашения, затем с погашением
+        Assert: Код принимается, пока не погашен, после погашения не принимаются ни он, ни прежний
+        """
+        service = BaseVerificationService(user)
+        previous_otp = service.create_otp()
+        otp = service.create_otp()
+
+        service.verify_otp(otp, consume=False)
+        service.verify_otp(otp)
+
+        assert not user.otps.exists()
+        for code in (otp, previous_otp):
+            with pytest.raises(ValidationError):
+                service.verify_otp(code)
+
+
+class TestRedisOneTimePassword:
+
+    @pytest.fixture
+    def user(self, auth_user: User, settings) -> User:
+        settings.OTP_BACKEND = 'redis'
+        auth_user.save()
+        return auth_user
+
+    def test_verify_otp(self, user: User, redis_storage, settings):
+        """
+        Arrange: Код пользователя в Redis
+        Act: Проверка кода без погашения, затем с погашением и повторная проверка
+        Assert: Код хранится в Redis со временем жизни OTP_TTL, а не в бд, и принимается только до погашения
+        """
+        service = BaseVerificationService(user)
+        otp = service.create_otp()
+        key = OTP_KEY.format(user_id=user.pk)
+
+        assert not OneTimePassword.objects.exists()
+        assert 0 < redis_storage.ttl(key) <= int(settings.OTP_TTL) * 60
+
+        service.verify_otp(otp, consume=False)
+        service.verify_otp(otp)
+
+        assert not redis_storage.exists(key)
+        with pytest.raises(ValidationError, match="user doesn't have any codes"):
+            service.verify_otp(otp)
+
+    def test_new_otp_replaces_previous(self, user: User):
+        """
+        Arrange: Два кода пользователя
+        Act: Проверка первого кода
+        Assert: Действует только последний код
+        """
+        service = BaseVerificationService(user)
+        previous_otp = service.create_otp()
+        otp = service.create_otp()
+
+        if previous_otp != otp:
+            with pytest.raises(ValidationError, match="otp doesn't match"):
+                service.verify_otp(previous_otp)
+        service.verify_otp(otp)
+
+    def test_otp_attempts_limited(self, user: User, settings):
+        """
+        Arrange: Код пользователя, по которому исчерпаны попытки проверки
+        Act: Проверка верного кода
+        Assert: Код больше не принимается
+        """
+        settings.OTP_MAX_ATTEMPTS = 2
+        service = BaseVerificationService(user)
+        otp = service.create_otp()
+        wrong_otp = str((int(otp) + 1) % 1_000_000).zfill(6)
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            with pytest.raises(ValidationError, match="otp doesn't match"):
+                service.verify_otp(wrong_otp)
+
+        with pytest.raises(ValidationError, match='too many otp attempts'):
+            service.verify_otp(otp)
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Iterable, NamedTuple, Optional
+
+import redis
+import structlog
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from knox.models import get_token_model
+from prometheus_client import Counter
+
+from common.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+TOKEN_CACHE_KEY = 'auth:token:{digest}'
+TOKEN_REVOKED_KEY = 'auth:token:revoked:{digest}'
+
+# Кэширует токен, если его не отзывали в последние `AUTH_TOKEN_REVOCATION_TTL` секунд.
+# KEYS[1] - запись токена, KEYS[2] - отметка об отзыве; ARGV[1] - запись, ARGV[2] - TTL записи.
+# Возвращает 1 - токен закэширован, 0 - токен отозван
+CACHE_TOKEN_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+token_cache_requests = Counter(
+    'auth_token_cache_requests_total',
+    'Обращения к кэшу проверенных токенов авторизации',
+    ['result'],
+)
+
+
+class CachedToken(NamedTuple):
+    """Проверенный токен: чей он, его ключ и время создания и истечения (timestamp, None - бессрочный)"""
+
+    user_id: int
+    token_key: str
+    created: float
+    expiry: Optional[float]
+
+    def dumps(self) -> str:
+        return f'{self.user_id}:{self.token_key}:{self.created}:{"" if self.expiry is None else self.expiry}'
+
+    @classmethod
+    def loads(cls, value: bytes) -> 'CachedToken':
+        user_id, token_key, created, expiry = value.decode().split(':')
+        return cls(int(user_id), token_key, float(created), float(expiry) if expiry else None)
+
+
+class _LocalTokenCache:
+    """Ограниченный по размеру LRU кэш токенов в памяти процесса, записи которого живут не дольше `ttl` секунд"""
+
+    def __init__(self) -> None:
+        self._entries: 'OrderedDict[str, tuple[float, CachedToken]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str, now: float) -> Optional[CachedToken]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            stored_until, token = entry
+            if stored_until <= now:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return token
+
+    def set(self, digest: str, token: CachedToken, now: float) -> None:
+        with self._lock:
+            self._entries[digest] = (now + settings.AUTH_TOKEN_CACHE_LOCAL_TTL, token)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_LOCAL_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, digest: str) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+local_token_cache = _LocalTokenCache()
+
+
+def get_cached_token(digest: str) -> Optional[CachedToken]:
+    """
+    Проверенный ранее токен по его хэшу: сначала из памяти процесса, затем из Redis
+
+    Истекший токен не возвращается, чтобы его удалила и отклонила обычная проверка knox
+    :param digest (str) Хэш токена (как в AuthToken.digest)
+    :return: CachedToken или None, если токена нет в кэше
+    """
+    if not settings.AUTH_TOKEN_CACHE_ENABLED:
+        return None
+
+    now = time.time()
+    token = local_token_cache.get(digest, now)
+    if token is not None:
+        token_cache_requests.labels(result='local').inc()
+    else:
+        try:
+            value = get_redis().get(TOKEN_CACHE_KEY.format(digest=digest))
+        except redis.RedisError as e:
+            logger.warning('auth token cache unavailable', error=str(e))
+            value = None
+        if value is None:
+            token_cache_requests.labels(result='miss').inc()
+            return None
+        token_cache_requests.labels(result='redis').inc()
+        token = CachedToken.loads(value)
+        local_token_cache.set(digest, token, now)
+
+    if token.expiry is not None and token.expiry <= now:
+        return None
+
+    return token
+
+
+def cache_token(auth_token) -> None:
+    """
+    Запомнить проверенный токен в памяти процесса и в Redis
+
+    В Redis запись живет `AUTH_TOKEN_CACHE_TTL` секунд, но не дольше самого токена. Недавно отозванный токен
+    (см. `revoke_cached_tokens`) не кэшируется: запрос мог прочитать его из бд до того, как закоммитился выход
+    :param auth_token (AuthToken) Токен, прошедший проверку
+    """
+    if not settings.AUTH_TOKEN_CACHE_ENABLED:
+        return
+
+    now = time.time()
+    expiry = auth_token.expiry.timestamp() if auth_token.expiry else None
+    token = CachedToken(auth_token.user_id, auth_token.token_key, auth_token.created.timestamp(), expiry)
+    ttl = settings.AUTH_TOKEN_CACHE_TTL if expiry is None else min(settings.AUTH_TOKEN_CACHE_TTL, int(expiry - now))
+    if ttl <= 0:
+        return
+
+    try:
+        cached = get_redis().eval(
+            CACHE_TOKEN_SCRIPT,
+            2,
+            TOKEN_CACHE_KEY.format(digest=auth_token.digest),
+            TOKEN_REVOKED_KEY.format(digest=auth_token.digest),
+            token.dumps(),
+            ttl,
+        )
+    except redis.RedisError as e:
+        logger.warning('auth token cache unavailable', error=str(e))
+        cached = True
+    if cached:
+        local_token_cache.set(auth_token.digest, token, now)
+
+
+def revoke_cached_tokens(digests: Iterable[str]) -> None:
+    """
+    Убрать токены из кэша: из памяти текущего процесса и из Redis
+
+    В Redis на `AUTH_TOKEN_REVOCATION_TTL` секунд остается отметка об отзыве, чтобы запрос, прочитавший токен
+    из бд до отзыва, не закэшировал его снова. В памяти других процессов токен остается
+    не дольше `AUTH_TOKEN_CACHE_LOCAL_TTL` секунд
+    :param digests (Iterable[str]) Хэши отозванных токенов
+    """
+    digests = list(digests)
+    for digest in digests:
+        local_token_cache.delete(digest)
+    if not digests:
+        return
+
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.delete(*[TOKEN_CACHE_KEY.format(digest=digest) for digest in digests])
+            for digest in digests:
+                pipe.set(TOKEN_REVOKED_KEY.format(digest=digest), 1, ex=settings.AUTH_TOKEN_REVOCATION_TTL)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.error('auth token cache revocation failed', error=str(e), tokens=len(digests))
+
+
+@receiver(post_delete, sender=get_token_model())
+def revoke_deleted_token(sender, instance, **kwargs) -> None:
+    # Выход, выход из всех сессий и удаление истекших токенов удаляют AuthToken: вместе с ним токен уходит и из кэша.
+    # Сразу - чтобы текущий процесс перестал его принимать, после коммита - чтобы запрос, успевший прочитать
+    # еще не удаленный токен из бд, не оставил его в кэше
+    revoke_cached_tokens([instance.digest])
+    transaction.on_commit(partial(revoke_cached_tokens, [instance.digest]))
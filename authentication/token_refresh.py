@@ -0,0 +1,117 @@
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+import redis
+import structlog
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from knox.models import get_token_model
+from knox.settings import knox_settings
+
+from common.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+TOKEN_REFRESH_PENDING_KEY = 'auth:tokens:refresh:pending'
+TOKEN_REFRESH_FLUSHING_KEY = '{key}:flushing:{token}'
+
+
+def _new_expiry(auth_token) -> datetime:
+    new_expiry = timezone.now() + knox_settings.TOKEN_TTL
+    # Как и в knox, токен не продлевается дальше AUTO_REFRESH_MAX_TTL с момента создания
+    if knox_settings.AUTO_REFRESH_MAX_TTL is not None:
+        new_expiry = min(new_expiry, auth_token.created + knox_settings.AUTO_REFRESH_MAX_TTL)
+
+    return new_expiry
+
+
+def refresh_token_expiry(auth_token) -> bool:
+    """
+    Продлить токен, если с последнего продления прошла доля `AUTH_TOKEN_REFRESH_FRACTION` его TTL
+
+    Новое время истечения копится в Redis и переносится в бд периодической задачей `flush_token_refreshes_task`,
+    так что запросы только на чтение не пишут в бд. Если Redis недоступен, токен продлевается в бд сразу
+
+    :param auth_token (AuthToken) Проверенный токен, `expiry` которого обновляется на месте
+    :return: продлен ли токен
+    """
+    new_expiry = _new_expiry(auth_token)
+    min_delta = knox_settings.TOKEN_TTL.total_seconds() * settings.AUTH_TOKEN_REFRESH_FRACTION
+    if (new_expiry - auth_token.expiry).total_seconds() < min_delta:
+        return False
+
+    auth_token.expiry = new_expiry
+    try:
+        get_redis().hset(TOKEN_REFRESH_PENDING_KEY, auth_token.digest, new_expiry.timestamp())
+    except redis.RedisError as e:
+        logger.warning('failed to defer token refresh, updating database directly', error=str(e))
+        auth_token.save(update_fields=('expiry',))
+
+    return True
+
+
+def _chunks(items: List[Tuple[str, float]], size: int) -> Iterable[List[Tuple[str, float]]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def apply_token_refreshes(expiries: Dict[str, float], batch_size: int) -> None:
+    """
+    Записать новые времена истечения токенов пачками вида `UPDATE ... FROM (VALUES ...)`, по одному запросу на пачку
+
+    Время истечения только увеличивается, удаленные за это время токены пропускаются
+
+    :param expiries (dict) Новые времена истечения (timestamp) по хэшам токенов
+    :param batch_size (int) Количество токенов в одном UPDATE
+    """
+    table = connection.ops.quote_name(get_token_model()._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in _chunks(sorted(expiries.items()), batch_size):
+            values = ', '.join(['(%s::varchar, to_timestamp(%s::double precision))'] * len(batch))
+            cursor.execute(
+                f'UPDATE {table} AS token SET expiry = GREATEST(token.expiry, refresh.expiry) '
+                f'FROM (VALUES {values}) AS refresh (digest, expiry) '
+                'WHERE token.digest = refresh.digest',
+                [value for pair in batch for value in pair],
+            )
+
+
+def flush_token_refreshes(batch_size: int) -> int:
+    """
+    Перенести накопленные в Redis продления токенов в бд
+
+    Хэш атомарно переименовывается, так что продления, пришедшие во время переноса, попадают уже в новый хэш.
+    Если запись в бд не удалась, продления возвращаются обратно (если токен не успели продлить еще раз)
+
+    :param batch_size (int) Количество токенов в одном UPDATE
+    :return: количество продленных токенов
+    """
+    client = get_redis()
+    flushing_key = TOKEN_REFRESH_FLUSHING_KEY.format(key=TOKEN_REFRESH_PENDING_KEY, token=uuid.uuid4().hex)
+
+    try:
+        client.rename(TOKEN_REFRESH_PENDING_KEY, flushing_key)
+    except redis.ResponseError:
+        # Нет накопленных продлений
+        return 0
+
+    expiries = {digest.decode(): float(expiry) for digest, expiry in client.hgetall(flushing_key).items()}
+
+    try:
+        apply_token_refreshes(expiries, batch_size)
+    except Exception:
+        with client.pipeline() as pipe:
+            for digest, expiry in expiries.items():
+                pipe.hsetnx(TOKEN_REFRESH_PENDING_KEY, digest, expiry)
+            pipe.delete(flushing_key)
+            pipe.execute()
+        raise
+
+    client.delete(flushing_key)
+    if expiries:
+        logger.info('auth token refreshes flushed', tokens=len(expiries))
+
+    return len(expiries)
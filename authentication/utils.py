@@ -1,5 +1,13 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+
 from authentication.exceptions import InvalidPhoneError
 
+# Префикс хэша одноразового кода, посчитанного HMAC-SHA256 (коды, созданные раньше, хэшированы PBKDF2)
+OTP_HMAC_PREFIX = 'hmac_sha256$'
+
 
 # TODO сделать так, чтобы телефон приводился к ЗАДАННОМУ стандарту, а не захардкоженному
 def make_phone_uniform(phone: str) -> str:
@@ -14,3 +22,19 @@ def make_phone_uniform(phone: str) -> str:
         return phone
     else:
         raise InvalidPhoneError("Phone starts with invalid code")
+
+
+def hash_otp(user_id: int, otp: str) -> str:
+    """
+    Хэш одноразового кода: HMAC-SHA256 с серверным секретом `OTP_PEPPER`, привязанный к пользователю
+
+    Без секрета перебрать миллион шестизначных кодов по хэшу нельзя, поэтому медленный PBKDF2 не нужен,
+    а перебор через API ограничивается счетчиком попыток `OTP_MAX_ATTEMPTS`
+    """
+    digest = hmac.new(settings.OTP_PEPPER.encode(), f'{user_id}:{otp}'.encode(), hashlib.sha256).hexdigest()
+    return f'{OTP_HMAC_PREFIX}{digest}'
+
+
+def otp_matches(user_id: int, otp: str, encoded: str) -> bool:
+    """Совпадает ли код с хэшем `hash_otp` (сравнение за постоянное время)"""
+    return hmac.compare_digest(hash_otp(user_id, otp), encoded)
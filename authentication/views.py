@@ -140,7 +140,8 @@ class ResetPasswordValidateTokenView(APIView):
         user = get_user_with_profile_by_phone(phone)
         otp = serializer.validated_data.get("otp_code")
 
-        BaseVerificationService(user).verify_otp(otp)
+        # Код только проверяется: им еще подтверждается смена пароля
+        BaseVerificationService(user).verify_otp(otp, consume=False)
 
         return Response(status=status.HTTP_200_OK)
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from booking.models import Advert, Promotion, AdvertImage
+from booking.models import Advert, Promotion, AdvertImage, Location
 
 
 @admin.register(Advert)
@@ -25,3 +25,9 @@ class PromotionAdmin(admin.ModelAdmin):
 @admin.register(AdvertImage)
 class AdvertImageAdmin(admin.ModelAdmin):
     list_display = ['image']
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'latitude', 'longitude']
+    search_fields = ['name']
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking'
+
+    def ready(self):
+        # Подписываем обработчики на сигналы объявлений
+        import booking.cache  # noqa: F401
+        import booking.feed  # noqa: F401
@@ -0,0 +1,161 @@
+import hashlib
+import time
+from typing import Any, Callable, Tuple
+
+import structlog
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from prometheus_client import Counter
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from booking.signals import advert_changed
+
+logger = structlog.get_logger(__name__)
+
+FEED_VERSION_KEY = 'adverts:feed:version'
+FEED_PAGE_KEY = 'adverts:feed:v{version}:{query_hash}'
+ADVERT_VERSION_KEY = 'adverts:detail:{advert_id}:version'
+ADVERT_DETAIL_KEY = 'adverts:detail:{advert_id}:v{version}'
+LOCK_KEY = '{key}:lock'
+
+# Пауза между проверками, не посчитал ли ответ другой воркер
+LOCK_POLL_INTERVAL = 0.05
+
+response_cache_requests = Counter(
+    'advert_response_cache_requests_total',
+    'Обращения к кэшу ответов ленты объявлений',
+    ['endpoint', 'result'],
+)
+
+CachedResponse = Tuple[int, Any]
+
+
+def _version_timeout() -> int:
+    # Версия живет дольше любой записи, посчитанной по ней (включая ту, что досчитывалась под блокировкой)
+    return settings.ADVERT_CACHE_TTL + settings.ADVERT_CACHE_LOCK_TIMEOUT
+
+
+def _get_version(version_key: str) -> int:
+    # Версия заводится только при изменении (см. `_bump_version`), поэтому запросы несуществующих объявлений
+    # не оставляют в кэше ключей. Истекшая версия читается как 0: к этому моменту все записи по прежним версиям
+    # уже вытеснены по TTL, так что нумерация с нуля не вернет устаревший ответ
+    return cache.get(version_key, 0)
+
+
+def _bump_version(version_key: str) -> None:
+    # Старые записи не удаляются, а перестают читаться и вытесняются по TTL
+    timeout = _version_timeout()
+    cache.add(version_key, 0, timeout=timeout)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # Версия истекла между add и incr
+        cache.add(version_key, 1, timeout=timeout)
+    cache.touch(version_key, timeout=timeout)
+
+
+def _get_or_compute(key: str, endpoint: str, compute: Callable[[], CachedResponse]) -> CachedResponse:
+    """
+    Прочитать ответ из кэша или посчитать его, не допуская, чтобы несколько воркеров считали один ключ одновременно
+
+    Считает только воркер, захвативший блокировку `cache.add`, остальные ждут его результат не дольше
+    `ADVERT_CACHE_LOCK_TIMEOUT` секунд. Ответ с ошибкой кэшируется на `ADVERT_CACHE_ERROR_TTL` секунд, чтобы
+    ожидающие тоже получили его сразу. Если блокировка снята, а ответа в кэше нет (первый воркер упал),
+    или ожидание истекло, воркер считает ответ сам
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        response_cache_requests.labels(endpoint=endpoint, result='hit').inc()
+        return cached
+
+    lock_key = LOCK_KEY.format(key=key)
+    if cache.add(lock_key, 1, timeout=settings.ADVERT_CACHE_LOCK_TIMEOUT):
+        response_cache_requests.labels(endpoint=endpoint, result='miss').inc()
+        try:
+            status_code, data = compute()
+            timeout = (
+                settings.ADVERT_CACHE_TTL if status_code == status.HTTP_200_OK else settings.ADVERT_CACHE_ERROR_TTL
+            )
+            if timeout > 0:
+                cache.set(key, (status_code, data), timeout=timeout)
+            return status_code, data
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + settings.ADVERT_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        values = cache.get_many([key, lock_key])
+        if key in values:
+            response_cache_requests.labels(endpoint=endpoint, result='wait').inc()
+            return values[key]
+        if lock_key not in values:
+            response_cache_requests.labels(endpoint=endpoint, result='released').inc()
+            return compute()
+
+    logger.warning('response cache lock wait timed out', key=key)
+    response_cache_requests.labels(endpoint=endpoint, result='timeout').inc()
+    return compute()
+
+
+def _respond(request: Request, key_factory: Callable[[], str], endpoint: str, view: Callable[[], Response]) -> Response:
+    if not settings.ADVERT_CACHE_ENABLED or request.user.is_authenticated:
+        return view()
+
+    def compute() -> CachedResponse:
+        response = view()
+        return response.status_code, response.data
+
+    status_code, data = _get_or_compute(key_factory(), endpoint, compute)
+    return Response(data, status=status_code)
+
+
+def cached_feed_response(request: Request, view: Callable[[], Response]) -> Response:
+    """
+    Отдать анонимному пользователю страницу ленты из кэша
+
+    Ключ строится по версии ленты, схеме, хосту и query параметрам запроса, так что любое изменение объявления
+    (см. `advert_changed`) делает недействительными сразу все закэшированные страницы. Схема и хост входят в ключ,
+    потому что страница содержит абсолютную ссылку `next`: иначе ответ на запрос с подставным Host
+    отдавался бы всем
+
+    :param request (Request) Запрос к ленте
+    :param view (Callable) Функция, формирующая ответ без кэша
+    :return: Response
+    """
+
+    def key() -> str:
+        query = f'{request.scheme}://{request.get_host()}?{request.query_params.urlencode()}'
+        query_hash = hashlib.md5(query.encode()).hexdigest()
+        return FEED_PAGE_KEY.format(version=_get_version(FEED_VERSION_KEY), query_hash=query_hash)
+
+    return _respond(request, key, 'feed', view)
+
+
+def cached_advert_response(request: Request, advert_id: int, view: Callable[[], Response]) -> Response:
+    """
+    Отдать анонимному пользователю объявление из ленты из кэша
+
+    :param request (Request) Запрос объявления
+    :param advert_id (int) Идентификатор объявления
+    :param view (Callable) Функция, формирующая ответ без кэша
+    :return: Response
+    """
+
+    def key() -> str:
+        version = _get_version(ADVERT_VERSION_KEY.format(advert_id=advert_id))
+        return ADVERT_DETAIL_KEY.format(advert_id=advert_id, version=version)
+
+    return _respond(request, key, 'detail', view)
+
+
+@receiver(advert_changed)
+def invalidate_advert_cache(sender, advert_id: int, **kwargs) -> None:
+    """Сбросить закэшированные страницы ленты и само объявление"""
+    _bump_version(FEED_VERSION_KEY)
+    _bump_version(ADVERT_VERSION_KEY.format(advert_id=advert_id))
+
+    logger.debug('advert cache invalidated', advert_id=advert_id, sender=sender)
@@ -0,0 +1,217 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import redis
+import structlog
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.request import Request
+
+from booking.models import Advert
+from common.helpers.request import get_client_ip
+from common.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+VIEWS_PENDING_KEY = 'adverts:views:pending'
+VIEWS_SEEN_KEY = 'adverts:views:seen:{advert_id}:{viewer}'
+LIKES_PENDING_KEY = 'adverts:likes:pending'
+COUNTER_FLUSHING_KEY = '{key}:flushing'
+COUNTER_FLUSH_LOCK_KEY = '{key}:flush:lock'
+
+# Засчитывает просмотр, только если этот зритель не смотрел объявление в течение окна дедупликации.
+# KEYS[1] - ключ "зритель уже смотрел", KEYS[2] - хэш накопленных просмотров; ARGV[1] - окно, ARGV[2] - id объявления
+RECORD_VIEW_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    return redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+end
+return 0
+"""
+
+# Забирает накопленные приращения на перенос. Если перенос, оставшийся от упавшего воркера, так и не был удален,
+# новые приращения прибавляются к нему, иначе хэш просто переименовывается. Возвращает 1, если есть что переносить.
+# KEYS[1] - хэш накопленных приращений, KEYS[2] - хэш переносимых приращений
+TAKE_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    if redis.call('EXISTS', KEYS[2]) == 0 then
+        redis.call('RENAME', KEYS[1], KEYS[2])
+    else
+        local entries = redis.call('HGETALL', KEYS[1])
+        for i = 1, #entries, 2 do
+            redis.call('HINCRBY', KEYS[2], entries[i], entries[i + 1])
+        end
+        redis.call('DEL', KEYS[1])
+    end
+end
+return redis.call('EXISTS', KEYS[2])
+"""
+
+
+def _viewer(request: Request) -> str:
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+
+    return f'ip:{get_client_ip(request)}'
+
+
+def record_advert_view(request: Request, advert_id: int) -> None:
+    """
+    Засчитать просмотр объявления в Redis, не трогая строку объявления в бд
+
+    Повторные просмотры одного зрителя в течение `ADVERT_VIEWS_DEDUP_WINDOW` секунд не засчитываются.
+    Накопленные приращения переносятся в `Advert.views` периодической задачей `flush_advert_views_task`
+
+    :param request (Request) Запрос, по которому определяется зритель
+    :param advert_id (int) Идентификатор просмотренного объявления
+    """
+    try:
+        get_redis().eval(
+            RECORD_VIEW_SCRIPT,
+            2,
+            VIEWS_SEEN_KEY.format(advert_id=advert_id, viewer=_viewer(request)),
+            VIEWS_PENDING_KEY,
+            settings.ADVERT_VIEWS_DEDUP_WINDOW,
+            advert_id,
+        )
+    except redis.RedisError as e:
+        # Потерянный просмотр лучше, чем упавшая страница объявления
+        logger.warning('failed to record advert view', advert_id=advert_id, error=str(e))
+
+
+def _chunks(items: List[Tuple[int, int]], size: int) -> Iterable[List[Tuple[int, int]]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def apply_counter_deltas(column: str, deltas: Dict[int, int], batch_size: int) -> None:
+    """
+    Прибавить приращения к счетчику объявлений пачками вида `UPDATE ... FROM (VALUES ...)`, по одному запросу на пачку
+
+    Строки обновляются в порядке id, чтобы параллельные переносы не взаимоблокировались. Отрицательные приращения
+    не опускают счетчик ниже нуля
+
+    :param column (str) Колонка счетчика в таблице объявлений
+    :param deltas (dict) Приращения счетчика по идентификаторам объявлений
+    :param batch_size (int) Количество объявлений в одном UPDATE
+    """
+    table = connection.ops.quote_name(Advert._meta.db_table)
+    column = connection.ops.quote_name(column)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in _chunks(sorted(deltas.items()), batch_size):
+            values = ', '.join(['(%s::bigint, %s::integer)'] * len(batch))
+            cursor.execute(
+                f'UPDATE {table} AS advert SET {column} = GREATEST(advert.{column} + delta.value, 0) '
+                f'FROM (VALUES {values}) AS delta (id, value) '
+                'WHERE advert.id = delta.id',
+                [value for pair in batch for value in pair],
+            )
+
+
+def apply_view_deltas(deltas: Dict[int, int], batch_size: int) -> None:
+    """Прибавить накопленные просмотры к `Advert.views`"""
+    apply_counter_deltas('views', deltas, batch_size)
+
+
+def apply_like_deltas(deltas: Dict[int, int], batch_size: int) -> None:
+    """Прибавить накопленные лайки к `Advert.likes_count`"""
+    apply_counter_deltas('likes_count', deltas, batch_size)
+
+
+def _flush_counter(pending_key: str, apply: Callable[[Dict[int, int], int], None], batch_size: int) -> Dict[int, int]:
+    """
+    Перенести накопленные в хэше Redis приращения счетчика в бд функцией `apply`
+
+    Хэш атомарно переименовывается, так что приращения, пришедшие во время переноса,
+    попадают уже в новый хэш и не теряются. Если запись в бд не удалась, приращения возвращаются обратно.
+    Переносит только один воркер (под блокировкой), поэтому хэш переноса, найденный в начале, остался от воркера,
+    упавшего до удаления, и его приращения переносятся вместе с новыми
+
+    :return: перенесенные приращения по идентификаторам объявлений
+    """
+    client = get_redis()
+    flushing_key = COUNTER_FLUSHING_KEY.format(key=pending_key)
+
+    lock = client.lock(COUNTER_FLUSH_LOCK_KEY.format(key=pending_key), timeout=settings.ADVERT_COUNTERS_FLUSH_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        logger.info('counter is already being flushed', key=pending_key)
+        return {}
+
+    try:
+        if not client.eval(TAKE_PENDING_SCRIPT, 2, pending_key, flushing_key):
+            # Нет накопленных приращений
+            return {}
+
+        deltas = {int(advert_id): int(delta) for advert_id, delta in client.hgetall(flushing_key).items()}
+        # Лайк и снятие лайка между переносами взаимно сокращаются
+        deltas = {advert_id: delta for advert_id, delta in deltas.items() if delta}
+
+        try:
+            apply(deltas, batch_size)
+        except Exception:
+            with client.pipeline() as pipe:
+                for advert_id, delta in deltas.items():
+                    pipe.hincrby(pending_key, advert_id, delta)
+                pipe.delete(flushing_key)
+                pipe.execute()
+            raise
+
+        client.delete(flushing_key)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+
+    return deltas
+
+
+def flush_advert_views(batch_size: int) -> int:
+    """
+    Перенести накопленные в Redis просмотры в `Advert.views`
+
+    :param batch_size (int) Количество объявлений в одном UPDATE
+    :return: количество объявлений, у которых обновились просмотры
+    """
+    deltas = _flush_counter(VIEWS_PENDING_KEY, apply_view_deltas, batch_size)
+    if deltas:
+        logger.info('advert views flushed', adverts=len(deltas), views=sum(deltas.values()))
+
+    return len(deltas)
+
+
+def record_advert_like(advert_id: int, delta: int) -> None:
+    """
+    Учесть лайк (`delta=1`) или его снятие (`delta=-1`) в `Advert.likes_count` после коммита текущей транзакции
+
+    Приращение копится в Redis и переносится в бд периодической задачей `flush_advert_likes_task`, так что
+    одновременные лайки популярного объявления не выстраиваются в очередь за блокировкой его строки.
+    Если Redis недоступен, счетчик обновляется в бд сразу
+
+    :param advert_id (int) Идентификатор объявления
+    :param delta (int) Приращение счетчика
+    """
+
+    def push() -> None:
+        try:
+            get_redis().hincrby(LIKES_PENDING_KEY, advert_id, delta)
+        except redis.RedisError as e:
+            logger.warning(
+                'failed to record advert like, updating database directly', advert_id=advert_id, error=str(e)
+            )
+            apply_like_deltas({advert_id: delta}, batch_size=1)
+
+    transaction.on_commit(push)
+
+
+def flush_advert_likes(batch_size: int) -> int:
+    """
+    Перенести накопленные в Redis лайки в `Advert.likes_count`
+
+    :param batch_size (int) Количество объявлений в одном UPDATE
+    :return: количество объявлений, у которых обновился счетчик лайков
+    """
+    deltas = _flush_counter(LIKES_PENDING_KEY, apply_like_deltas, batch_size)
+    if deltas:
+        logger.info('advert likes flushed', adverts=len(deltas), likes=sum(deltas.values()))
+
+    return len(deltas)
@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import structlog
+from django.db import transaction
+from django.utils import timezone
+from prometheus_client import Counter, Gauge
+
+from booking.models import Advert, AdvertStatus
+from booking.signals import notify_advert_changed
+
+logger = structlog.get_logger(__name__)
+
+expired_adverts = Counter(
+    'advert_expiry_processed_total',
+    'Объявления, снятые с публикации по истечении active_until',
+)
+expiry_lag = Gauge(
+    'advert_expiry_lag_seconds',
+    'На сколько секунд самое давно истекшее объявление последней пачки пережило свой active_until',
+)
+
+
+def expire_adverts_batch(batch_size: int, now: Optional[datetime] = None) -> int:
+    """
+    Снять с публикации одну пачку объявлений, у которых истек `active_until`
+
+    Строки блокируются через `SELECT ... FOR UPDATE SKIP LOCKED`, поэтому несколько воркеров, запущенных
+    одновременно, разбирают разные пачки и не ждут друг друга, а одно объявление не обрабатывается дважды
+
+    :param batch_size (int) Максимальное количество объявлений в пачке
+    :param now (datetime) Момент, относительно которого объявление считается истекшим
+    :return: количество снятых с публикации объявлений
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        expired: List[Tuple[int, datetime]] = list(
+            Advert.objects.select_for_update(skip_locked=True)
+            .filter(status=AdvertStatus.ACTIVE, active_until__lte=now)
+            .order_by('active_until')
+            .values_list('id', 'active_until')[:batch_size]
+        )
+        if not expired:
+            return 0
+
+        advert_ids = [advert_id for advert_id, _ in expired]
+        Advert.objects.filter(id__in=advert_ids).update(status=AdvertStatus.DISABLED, activated_at=None)
+        for advert_id in advert_ids:
+            notify_advert_changed(Advert, advert_id)
+
+    expiry_lag.set((now - expired[0][1]).total_seconds())
+    expired_adverts.inc(len(advert_ids))
+
+    return len(advert_ids)
+
+
+def expire_adverts(batch_size: int, max_batches: int) -> int:
+    """
+    Снять с публикации истекшие объявления, не больше `max_batches` пачек за запуск
+
+    Каждая пачка обрабатывается в своей транзакции, чтобы блокировки держались недолго. Если истекших объявлений
+    больше, остаток заберет следующий запуск
+
+    :param batch_size (int) Максимальное количество объявлений в пачке
+    :param max_batches (int) Максимальное количество пачек за запуск
+    :return: количество снятых с публикации объявлений
+    """
+    now = timezone.now()
+    processed = 0
+
+    for _ in range(max_batches):
+        expired = expire_adverts_batch(batch_size, now)
+        processed += expired
+        if expired < batch_size:
+            break
+
+    if processed == 0:
+        expiry_lag.set(0)
+
+    logger.info('expired adverts deactivated', count=processed)
+
+    return processed
@@ -0,0 +1,93 @@
+import hashlib
+import json
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+
+FACETS_CACHE_KEY = 'adverts:facets:{filters_hash}'
+
+# Все три разреза считаются одним проходом по отфильтрованной выборке: GROUPING SETS дает
+# по строке на каждую группу каждого разреза, а GROUPING(...) показывает, к какому разрезу относится строка
+FACETS_SQL = '''
+SELECT GROUPING(bucket) AS no_bucket, GROUPING(location) AS no_location, bucket, location, promoted, COUNT(*)
+FROM (
+    SELECT width_bucket(filtered.price, %s::numeric[]) AS bucket,
+           filtered.location AS location,
+           filtered.effective_rank > 0 AS promoted
+    FROM ({filtered_sql}) AS filtered
+) AS facets
+GROUP BY GROUPING SETS ((bucket), (location), (promoted))
+'''
+
+
+def compute_facets(queryset: QuerySet) -> Dict[str, Any]:
+    """
+    Посчитать по отфильтрованным объявлениям гистограмму цен, самые частые местоположения
+    и количество продвигаемых и обычных объявлений
+
+    :param queryset (QuerySet[Advert]) Отфильтрованные объявления
+    :return: словарь с разрезами `price`, `locations` и `promoted`
+    """
+    edges: List[int] = settings.ADVERT_FACET_PRICE_EDGES
+    filtered_sql, params = queryset.order_by().values('price', 'location', 'effective_rank').query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(FACETS_SQL.format(filtered_sql=filtered_sql), [edges, *params])
+        rows = cursor.fetchall()
+
+    buckets: Dict[int, int] = {}
+    locations: Dict[str, int] = {}
+    promoted = {'promoted': 0, 'regular': 0}
+
+    for no_bucket, no_location, bucket, location, is_promoted, count in rows:
+        if not no_bucket:
+            buckets[bucket] = count
+        elif not no_location:
+            locations[location] = count
+        else:
+            promoted['promoted' if is_promoted else 'regular'] = count
+
+    # Корзина i (1-based) - цены от edges[i - 1] до edges[i], последняя корзина не ограничена сверху
+    price = [
+        {'min': edges[bucket - 1], 'max': edges[bucket] if bucket < len(edges) else None, 'count': count}
+        for bucket, count in sorted(buckets.items())
+        if bucket > 0
+    ]
+    top_locations = sorted(locations.items(), key=lambda item: (-item[1], item[0]))
+    top_locations = top_locations[: settings.ADVERT_FACET_TOP_LOCATIONS]
+
+    return {
+        'price': price,
+        'locations': [{'location': location, 'count': count} for location, count in top_locations],
+        'promoted': promoted,
+    }
+
+
+def _normalize_filters(filters: Dict[str, Any]) -> str:
+    normalized = {
+        key: str(value).strip().lower()
+        for key, value in filters.items()
+        if key not in ('facets', 'strategy') and value not in (None, '')
+    }
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+
+def get_facets(queryset: QuerySet, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Разрезы по отфильтрованным объявлениям, закэшированные на `ADVERT_FACETS_CACHE_TTL` секунд
+
+    Одинаковые с точностью до регистра, пробелов и порядка параметров фильтры попадают в одну запись кэша
+
+    :param queryset (QuerySet[Advert]) Отфильтрованные объявления
+    :param filters (dict) Провалидированные параметры фильтра, по которым получена выборка
+    """
+    filters_hash = hashlib.md5(_normalize_filters(filters).encode()).hexdigest()
+
+    return cache.get_or_set(
+        FACETS_CACHE_KEY.format(filters_hash=filters_hash),
+        lambda: compute_facets(queryset),
+        timeout=settings.ADVERT_FACETS_CACHE_TTL,
+    )
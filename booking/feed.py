@@ -0,0 +1,269 @@
+import datetime
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis
+import structlog
+from django.conf import settings
+from django.dispatch import receiver
+
+from booking.models import Advert, AdvertStatus
+from booking.signals import advert_changed
+from common.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+FEED_SNAPSHOT_KEY = 'adverts:feed:snapshot:{strategy}'
+FEED_SNAPSHOT_MEMBERS_KEY = 'adverts:feed:snapshot:{strategy}:members'
+FEED_SNAPSHOT_READY_KEY = 'adverts:feed:snapshot:{strategy}:ready'
+FEED_SNAPSHOT_BUILDING_KEY = 'adverts:feed:snapshot:{strategy}:building:{token}'
+FEED_SNAPSHOT_BUILDING_MEMBERS_KEY = 'adverts:feed:snapshot:{strategy}:building:{token}:members'
+FEED_SNAPSHOT_LOCK_KEY = 'adverts:feed:snapshot:{strategy}:lock'
+FEED_SNAPSHOT_CHANGED_KEY = 'adverts:feed:snapshot:{strategy}:changed'
+FEED_SNAPSHOT_SCHEDULED_KEY = 'adverts:feed:snapshot:{strategy}:scheduled'
+
+DEFAULT_STRATEGY = 'default'
+
+# Члены sorted set - позиции в ленте вида "ранг:время создания в микросекундах:id", дополненные нулями
+# до одной длины, у всех score 0. Redis сортирует их лексикографически, то есть ровно как бд сортирует ленту
+# по (effective_rank, created_at, id), вплоть до микросекунд. Ранг (уровень продвижения) не отрицателен
+RANK_WIDTH = 6
+CREATED_AT_WIDTH = 17
+ID_WIDTH = 12
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+REBUILD_CHUNK_SIZE = 5000
+
+# Переставляет объявление в снапшоте: убирает прежнюю позицию (по хэшу id -> позиция) и добавляет новую.
+# KEYS[1] - снапшот, KEYS[2] - хэш позиций; ARGV[1] - id, ARGV[2] - новая позиция, '' - убрать объявление
+UPDATE_MEMBER_SCRIPT = """
+local previous = redis.call('HGET', KEYS[2], ARGV[1])
+if previous then
+    redis.call('ZREM', KEYS[1], previous)
+end
+if ARGV[2] == '' then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    redis.call('ZADD', KEYS[1], 0, ARGV[2])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+"""
+
+# Позиция в ленте: (ранг, время создания, id)
+FeedPosition = Tuple[int, datetime.datetime, int]
+
+
+def encode_position(effective_rank: int, created_at: datetime.datetime, advert_id: int) -> str:
+    created_at_us = (created_at - EPOCH) // MICROSECOND
+    return (
+        f'{str(effective_rank).zfill(RANK_WIDTH)}:{str(created_at_us).zfill(CREATED_AT_WIDTH)}'
+        f':{str(advert_id).zfill(ID_WIDTH)}'
+    )
+
+
+def decode_position(member: bytes) -> FeedPosition:
+    rank, created_at_us, advert_id = member.decode().split(':')
+    return int(rank), EPOCH + int(created_at_us) * MICROSECOND, int(advert_id)
+
+
+class FeedSnapshotNotReady(Exception):
+    """Снапшот ленты еще не построен, его пересборка поставлена в очередь"""
+
+
+class FeedSnapshot:
+    """
+    Заранее упорядоченная лента: позиции активных объявлений (см. `encode_position`) в sorted set Redis
+    и хэш id -> позиция, по которому объявление находят в снапшоте при изменении
+
+    Страница ленты читается из Redis за O(log N + размер страницы), а из бд объявления страницы достаются
+    одним запросом по первичному ключу. Позиции точно совпадают с ключом сортировки ленты в бд, так что курсор
+    снапшота продолжает ленту и в бд (когда Redis недоступен), и наоборот. Снапшот строится целиком периодической задачей (при первом обращении
+    она ставится в очередь, а лента до тех пор отдается из бд), а дальше обновляется точечно
+    по сигналу `advert_changed`
+
+    Methods:
+        + rebuild(): Построить снапшот заново по бд
+        + ensure_built(): Поставить построение снапшота в очередь, если его еще нет
+        + update(advert_id): Обновить положение объявления в снапшоте
+        + page(after, count): Позиции объявлений страницы ленты
+
+    Снапшот строится только для ленты (порядок `DEFAULT_STRATEGY`, он же порядок `/api/adverts/`). Остальные
+    стратегии ранжирования работают в поиске по произвольным фильтрам, а их score зависит от времени запроса
+    (затухание) или от постоянно меняющихся счетчиков, поэтому заранее упорядочить их нельзя
+    """
+
+    def __init__(self, strategy: str = DEFAULT_STRATEGY):
+        self.strategy = strategy
+        self.client = get_redis()
+        self.key = FEED_SNAPSHOT_KEY.format(strategy=strategy)
+        self.members_key = FEED_SNAPSHOT_MEMBERS_KEY.format(strategy=strategy)
+        self.ready_key = FEED_SNAPSHOT_READY_KEY.format(strategy=strategy)
+        self.lock_key = FEED_SNAPSHOT_LOCK_KEY.format(strategy=strategy)
+        self.changed_key = FEED_SNAPSHOT_CHANGED_KEY.format(strategy=strategy)
+
+    def rebuild(self) -> Optional[int]:
+        """
+        Построить снапшот по активным объявлениям из бд
+
+        Снапшот собирается в отдельном ключе этого построения и подменяет старый атомарным RENAME, так что читатели
+        не видят наполовину построенную ленту. Строит только один воркер: блокировка продлевается после каждой
+        пачки, и если ее все же потеряли, построение отменяется. Объявления, измененные во время построения,
+        запоминаются (см. `update`) и после RENAME пересчитываются уже в новом снапшоте
+
+        :return: количество объявлений в снапшоте или None, если снапшот уже строит другой воркер
+        """
+        timeout = settings.ADVERT_FEED_SNAPSHOT_BUILD_TIMEOUT
+        lock = self.client.lock(self.lock_key, timeout=timeout)
+        if not lock.acquire(blocking=False):
+            logger.info('feed snapshot is already being rebuilt', strategy=self.strategy)
+            return None
+
+        token = uuid.uuid4().hex
+        building_key = FEED_SNAPSHOT_BUILDING_KEY.format(strategy=self.strategy, token=token)
+        building_members_key = FEED_SNAPSHOT_BUILDING_MEMBERS_KEY.format(strategy=self.strategy, token=token)
+        try:
+            # Изменения, записанные до взятия блокировки, уже видны запросу к бд ниже
+            self.client.delete(self.changed_key)
+
+            rows = (
+                Advert.objects.filter(status=AdvertStatus.ACTIVE)
+                .values_list('id', 'effective_rank', 'created_at')
+                .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+            )
+
+            count = 0
+            chunk = {}
+            for advert_id, effective_rank, created_at in rows:
+                chunk[advert_id] = encode_position(effective_rank, created_at, advert_id)
+                if len(chunk) == REBUILD_CHUNK_SIZE:
+                    self._add_chunk(building_key, building_members_key, chunk, timeout)
+                    lock.extend(timeout, replace_ttl=True)
+                    count += len(chunk)
+                    chunk = {}
+            if chunk:
+                self._add_chunk(building_key, building_members_key, chunk, timeout)
+                count += len(chunk)
+
+            # Продление заодно проверяет, что блокировка все еще наша
+            lock.extend(timeout, replace_ttl=True)
+            with self.client.pipeline() as pipe:
+                if count:
+                    pipe.rename(building_key, self.key)
+                    pipe.rename(building_members_key, self.members_key)
+                    pipe.persist(self.key)
+                    pipe.persist(self.members_key)
+                else:
+                    pipe.delete(self.key, self.members_key)
+                pipe.set(self.ready_key, 1)
+                pipe.execute()
+
+            with self.client.pipeline() as pipe:
+                pipe.smembers(self.changed_key)
+                pipe.delete(self.changed_key)
+                changed, _ = pipe.execute()
+            self._apply(int(advert_id) for advert_id in changed)
+        except redis.exceptions.LockError:
+            logger.warning('feed snapshot lock lost, rebuild aborted', strategy=self.strategy)
+            return None
+        finally:
+            self.client.delete(building_key, building_members_key)
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass
+
+        logger.info('feed snapshot rebuilt', strategy=self.strategy, adverts=count, replayed=len(changed))
+
+        return count
+
+    def _add_chunk(self, building_key: str, building_members_key: str, chunk: Dict[int, str], timeout: int) -> None:
+        # Ключи брошенного построения (воркер упал) истекают сами
+        with self.client.pipeline() as pipe:
+            pipe.zadd(building_key, dict.fromkeys(chunk.values(), 0))
+            pipe.hset(building_members_key, mapping=chunk)
+            pipe.expire(building_key, timeout)
+            pipe.expire(building_members_key, timeout)
+            pipe.execute()
+
+    def ensure_built(self) -> None:
+        """
+        Поставить построение снапшота в очередь, если его еще нет. Задача ставится не чаще раза
+        в `ADVERT_FEED_SNAPSHOT_BUILD_TIMEOUT` секунд
+
+        :raises FeedSnapshotNotReady: снапшот еще не построен
+        """
+        if self.client.exists(self.ready_key):
+            return
+
+        scheduled_key = FEED_SNAPSHOT_SCHEDULED_KEY.format(strategy=self.strategy)
+        if self.client.set(scheduled_key, 1, nx=True, ex=settings.ADVERT_FEED_SNAPSHOT_BUILD_TIMEOUT):
+            # Задачи импортируют этот модуль, поэтому задача импортируется здесь, а не на уровне модуля
+            from booking.tasks import rebuild_feed_snapshot_task
+
+            rebuild_feed_snapshot_task.delay()
+
+        raise FeedSnapshotNotReady
+
+    def _apply(self, advert_ids: Iterable[int]) -> None:
+        advert_ids = set(advert_ids)
+        if not advert_ids:
+            return
+
+        rows = Advert.objects.filter(pk__in=advert_ids, status=AdvertStatus.ACTIVE).values_list(
+            'id', 'effective_rank', 'created_at'
+        )
+        active = {
+            advert_id: encode_position(effective_rank, created_at, advert_id)
+            for advert_id, effective_rank, created_at in rows
+        }
+
+        update_member = self.client.register_script(UPDATE_MEMBER_SCRIPT)
+        with self.client.pipeline() as pipe:
+            for advert_id in advert_ids:
+                update_member(
+                    keys=[self.key, self.members_key], args=[advert_id, active.get(advert_id, '')], client=pipe
+                )
+            pipe.execute()
+
+    def update(self, advert_id: int) -> None:
+        """
+        Добавить объявление в снапшот, пересчитать его положение или убрать, если оно больше не активно
+
+        Если снапшот в это время строится, объявление запоминается, чтобы пересчитать его и в новом снапшоте:
+        изменение, закоммиченное после начала построения, запрос построения к бд уже не увидит
+        """
+        self._apply([advert_id])
+        if self.client.exists(self.lock_key):
+            self.client.sadd(self.changed_key, advert_id)
+
+    def page(self, after: Optional[FeedPosition], count: int) -> List[FeedPosition]:
+        """
+        Позиции объявлений, идущих в ленте сразу после `after`
+
+        :param after (FeedPosition) Позиция последнего объявления предыдущей страницы, None - начало ленты
+        :param count (int) Количество позиций
+        :return: позиции (ранг, время создания, id) в порядке ленты
+        :raises FeedSnapshotNotReady: снапшот еще не построен
+        """
+        self.ensure_built()
+
+        if after is None:
+            members = self.client.zrevrange(self.key, 0, count - 1)
+        else:
+            members = self.client.zrevrangebylex(self.key, f'({encode_position(*after)}', '-', start=0, num=count)
+
+        return [decode_position(member) for member in members]
+
+
+@receiver(advert_changed)
+def update_feed_snapshot(sender, advert_id: int, **kwargs) -> None:
+    """Обновить положение измененного объявления в снапшоте ленты"""
+    if not settings.ADVERT_FEED_SNAPSHOT_ENABLED:
+        return
+
+    try:
+        FeedSnapshot().update(advert_id)
+    except redis.RedisError as e:
+        # Снапшот догонит бд при следующей полной пересборке
+        logger.warning('failed to update feed snapshot', advert_id=advert_id, error=str(e))
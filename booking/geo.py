@@ -0,0 +1,78 @@
+import math
+from typing import Tuple
+
+from django.db.models import F, FloatField, QuerySet, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+# Средний радиус Земли, км
+EARTH_RADIUS_KM = 6371.0
+
+# Длина одного градуса широты, км
+KM_PER_LATITUDE_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Прямоугольник из широт и долгот, гарантированно содержащий круг радиуса `radius_km` вокруг точки
+
+    Условие на прямоугольник дешево проверяется по B-tree индексу и отсекает почти все лишние строки
+    до точного расчета расстояния. Если круг задевает полюс или 180-й меридиан, долгота не ограничивается
+
+    :return: (мин. широта, макс. широта, мин. долгота, макс. долгота)
+    """
+    latitude_delta = radius_km / KM_PER_LATITUDE_DEGREE
+    min_latitude, max_latitude = latitude - latitude_delta, latitude + latitude_delta
+
+    if min_latitude <= -90 or max_latitude >= 90:
+        return max(min_latitude, -90), min(max_latitude, 90), -180, 180
+
+    longitude_delta = math.degrees(
+        math.asin(min(1.0, math.sin(math.radians(latitude_delta)) / math.cos(math.radians(latitude))))
+    )
+    min_longitude, max_longitude = longitude - longitude_delta, longitude + longitude_delta
+
+    if min_longitude < -180 or max_longitude > 180:
+        return min_latitude, max_latitude, -180, 180
+
+    return min_latitude, max_latitude, min_longitude, max_longitude
+
+
+def haversine_km(latitude_field: str, longitude_field: str, latitude: float, longitude: float):
+    """Выражение расстояния по дуге большого круга (км) от точки до координат из полей модели"""
+    latitude_delta = Radians(F(latitude_field) - Value(latitude)) / 2
+    longitude_delta = Radians(F(longitude_field) - Value(longitude)) / 2
+
+    a = Power(Sin(latitude_delta), 2) + Cos(Radians(Value(latitude))) * Cos(Radians(F(latitude_field))) * Power(
+        Sin(longitude_delta), 2
+    )
+    return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(Sqrt(a))
+
+
+def within_radius(
+    queryset: QuerySet, latitude: float, longitude: float, radius_km: float, prefix: str = 'place__'
+) -> QuerySet:
+    """
+    Отфильтровать выборку по расстоянию до точки и добавить аннотацию `distance_km`
+
+    Сначала фильтр по прямоугольнику (индекс по широте и долготе), затем точное расстояние по формуле гаверсинусов
+    только для попавших в прямоугольник строк
+
+    :param queryset (QuerySet) Выборка, координаты которой лежат в полях `{prefix}latitude` и `{prefix}longitude`
+    :param latitude (float) Широта точки
+    :param longitude (float) Долгота точки
+    :param radius_km (float) Радиус поиска, км
+    :param prefix (str) Путь до модели с координатами
+    :return: QuerySet
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+
+    return (
+        queryset.filter(
+            **{
+                f'{prefix}latitude__range': (min_latitude, max_latitude),
+                f'{prefix}longitude__range': (min_longitude, max_longitude),
+            }
+        )
+        .annotate(distance_km=haversine_km(f'{prefix}latitude', f'{prefix}longitude', latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+    )
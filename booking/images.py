@@ -0,0 +1,170 @@
+import io
+import os
+from typing import Dict
+
+import structlog
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from booking.models import Advert, AdvertImage
+from booking.signals import notify_advert_changed
+
+logger = structlog.get_logger(__name__)
+
+# Форматы рендиций: расширение файла -> формат Pillow
+RENDITION_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+# Метаданные оригинала (кроме EXIF), которые могут раскрыть автора снимка или место съемки
+METADATA_KEYS = ('xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+EXIF_ORIENTATION = 0x0112
+
+# {имя рендиции: {формат: путь в хранилище}}
+Renditions = Dict[str, Dict[str, str]]
+
+
+def _load_image(field_file: FieldFile) -> Image.Image:
+    with field_file.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+
+    return image
+
+
+def strip_metadata(field_file: FieldFile, image: Image.Image) -> bool:
+    """
+    Перезаписать оригинал изображения без EXIF (в том числе GPS координат) и других метаданных
+
+    Поворот из EXIF применяется к пикселям. JPEG без поворота пересохраняется с прежними таблицами квантования,
+    так что качество не теряется
+
+    :param field_file (FieldFile) Оригинал изображения
+    :param image (Image) Загруженный оригинал
+    :return: были ли в оригинале метаданные
+    """
+    exif = image.getexif()
+    if not exif and not any(key in image.info for key in METADATA_KEYS):
+        return False
+
+    params = {'icc_profile': image.info.get('icc_profile')}
+    if exif.get(EXIF_ORIENTATION, 1) != 1:
+        stripped = ImageOps.exif_transpose(image)
+        params['quality'] = settings.ADVERT_IMAGE_QUALITY
+    else:
+        stripped = image
+        if image.format == 'JPEG':
+            params.update(quality='keep', subsampling='keep')
+
+    buffer = io.BytesIO()
+    stripped.save(buffer, format=image.format, **{key: value for key, value in params.items() if value is not None})
+    with field_file.storage.open(field_file.name, 'wb') as file:
+        file.write(buffer.getvalue())
+
+    return True
+
+
+def _prepare(image: Image.Image) -> Image.Image:
+    # Поворот из EXIF применяется к пикселям, а сами метаданные в рендиции не попадают
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+
+    return image.convert('RGB')
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=settings.ADVERT_IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_renditions(field_file: FieldFile) -> Renditions:
+    """
+    Сохранить уменьшенные копии изображения во всех размерах `ADVERT_IMAGE_RENDITIONS` и форматах `RENDITION_FORMATS`
+
+    Копии кладутся рядом с оригиналом в каталог с именем оригинала, EXIF в них не сохраняется,
+    а из самого оригинала метаданные вычищаются (см. `strip_metadata`)
+
+    :param field_file (FieldFile) Оригинал изображения
+    :return: пути сохраненных копий
+    """
+    original = _load_image(field_file)
+    source = _prepare(original)
+    strip_metadata(field_file, original)
+    directory = os.path.splitext(field_file.name)[0]
+    renditions: Renditions = {}
+
+    for name, size in settings.ADVERT_IMAGE_RENDITIONS.items():
+        image = source.copy()
+        # Пропорции сохраняются, маленькие изображения не растягиваются
+        image.thumbnail(size, Image.LANCZOS)
+
+        renditions[name] = {
+            extension: field_file.storage.save(
+                f'{directory}/{name}.{extension}', ContentFile(_encode(image, image_format))
+            )
+            for extension, image_format in RENDITION_FORMATS.items()
+        }
+
+    return renditions
+
+
+def rendition_urls(renditions: Renditions, storage) -> Dict[str, Dict[str, str]]:
+    """Ссылки на рендиции вместо путей в хранилище"""
+    return {
+        name: {extension: storage.url(path) for extension, path in formats.items()}
+        for name, formats in renditions.items()
+    }
+
+
+def _generate_or_log(field_file: FieldFile, **log_context) -> Renditions:
+    try:
+        return generate_renditions(field_file)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        logger.warning('failed to generate image renditions', error=str(e), **log_context)
+        return {}
+
+
+def process_advert_images(advert_id: int) -> int:
+    """
+    Сгенерировать рендиции логотипа и фотографий объявления, у которых их еще нет
+
+    :param advert_id (int) Идентификатор объявления
+    :return: количество обработанных изображений
+    """
+    advert = Advert.objects.filter(pk=advert_id).first()
+    if advert is None:
+        return 0
+
+    processed = 0
+
+    if advert.logo and not advert.logo_renditions:
+        renditions = _generate_or_log(advert.logo, advert_id=advert_id)
+        # Если логотип успели заменить, пока генерировались рендиции, они уже не нужны
+        if renditions and Advert.objects.filter(pk=advert_id, logo=advert.logo.name).update(logo_renditions=renditions):
+            processed += 1
+
+    for image in AdvertImage.objects.filter(advert_id=advert_id, renditions={}):
+        if not image.image:
+            continue
+
+        renditions = _generate_or_log(image.image, advert_id=advert_id, image_id=image.pk)
+        if renditions:
+            AdvertImage.objects.filter(pk=image.pk).update(renditions=renditions)
+            processed += 1
+
+    if processed:
+        notify_advert_changed(Advert, advert_id)
+
+    logger.info('advert images processed', advert_id=advert_id, processed=processed)
+
+    return processed
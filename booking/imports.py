@@ -0,0 +1,483 @@
+import csv
+import io
+import ipaddress
+import os
+import posixpath
+import socket
+import zipfile
+from functools import partial
+from itertools import islice
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from xml.etree import ElementTree
+
+import requests
+import structlog
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from authentication.models import Profile
+from booking.images import process_advert_images
+from booking.models import Advert, AdvertImage, AdvertImport, AdvertImportStatus, AdvertStatus
+from booking.search import update_search_vector
+from booking.serializers import AdvertImportRowSerializer
+from booking.signals import notify_advert_changed
+from common.helpers.datetime import renew_for_month
+
+logger = structlog.get_logger(__name__)
+
+# Строка файла: (номер строки в файле, значения по заголовкам колонок)
+Row = Tuple[int, Dict[str, str]]
+
+CSV_SNIFF_SIZE = 64 * 1024
+CSV_DELIMITERS = ',;\t'
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_DOWNLOAD_SCHEMES = ('http', 'https')
+IMAGE_DOWNLOAD_MAX_REDIRECTS = 3
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+class ImportFileError(ValueError):
+    """Файл импорта не удалось прочитать как CSV или XLSX"""
+
+
+def _with_header(rows: Iterator[List[str]]) -> Iterator[Row]:
+    header = [name.strip() for name in next(rows, [])]
+    if not any(header):
+        raise ImportFileError('В файле нет строки заголовков')
+
+    # Номера строк считаются, как в редакторе таблиц: заголовок - первая строка
+    for row_number, values in enumerate(rows, start=2):
+        if any(value.strip() for value in values):
+            yield row_number, {name: value.strip() for name, value in zip(header, values) if name}
+
+
+def iter_csv_rows(file: IO[bytes]) -> Iterator[Row]:
+    """
+    Строки CSV файла по одной. Разделитель (запятая, точка с запятой или табуляция) определяется по началу файла
+
+    :param file (IO[bytes]) Файл, открытый в бинарном режиме
+    """
+    sample = file.read(CSV_SNIFF_SIZE).decode('utf-8-sig', errors='ignore')
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        dialect = csv.excel  # type: ignore[assignment]
+
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        yield from _with_header(csv.reader(text, dialect))
+    except UnicodeDecodeError:
+        raise ImportFileError('CSV файл должен быть в кодировке UTF-8')
+    finally:
+        # Закрывать переданный файл должен тот, кто его открыл
+        text.detach()
+
+
+def _xlsx_column(reference: str) -> int:
+    """Номер колонки (с нуля) по адресу ячейки вида `AB12`"""
+    column = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        column = column * 26 + ord(char.upper()) - ord('A') + 1
+
+    return column - 1
+
+
+def _xlsx_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    try:
+        source = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    strings = []
+    with source:
+        for _, element in ElementTree.iterparse(source):
+            if element.tag == f'{XLSX_NS}si':
+                strings.append(''.join(text.text or '' for text in element.iter(f'{XLSX_NS}t')))
+                element.clear()
+
+    return strings
+
+
+def _xlsx_first_sheet(archive: zipfile.ZipFile) -> str:
+    """Путь к первому листу книги внутри архива"""
+    sheet = ElementTree.parse(archive.open('xl/workbook.xml')).find(f'{XLSX_NS}sheets/{XLSX_NS}sheet')
+    if sheet is None:
+        raise ImportFileError('В книге нет листов')
+
+    relations = ElementTree.parse(archive.open('xl/_rels/workbook.xml.rels')).getroot()
+    for relation in relations.iter(f'{XLSX_PACKAGE_REL_NS}Relationship'):
+        if relation.get('Id') == sheet.get(f'{XLSX_REL_NS}id'):
+            target = relation.get('Target', '')
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(f'xl/{target}')
+
+    raise ImportFileError('Не найден первый лист книги')
+
+
+def _xlsx_rows(archive: zipfile.ZipFile, sheet: str, strings: List[str]) -> Iterator[List[str]]:
+    row_number = 0
+    with archive.open(sheet) as source:
+        for _, element in ElementTree.iterparse(source):
+            if element.tag != f'{XLSX_NS}row':
+                continue
+
+            # Пустые строки в листе не хранятся, а нумерация строк должна совпадать с редактором таблиц
+            row_number += 1
+            while element.get('r') and row_number < int(element.get('r', 0)):
+                yield []
+                row_number += 1
+
+            values: Dict[int, str] = {}
+            for position, cell in enumerate(element.iter(f'{XLSX_NS}c')):
+                column = _xlsx_column(cell.get('r', '')) if cell.get('r') else position
+                value = cell.find(f'{XLSX_NS}v')
+                if cell.get('t') == 's' and value is not None:
+                    values[column] = strings[int(value.text or 0)]
+                elif cell.get('t') == 'inlineStr':
+                    values[column] = ''.join(text.text or '' for text in cell.iter(f'{XLSX_NS}t'))
+                elif value is not None:
+                    values[column] = value.text or ''
+
+            # Обработанная строка больше не нужна, иначе весь лист останется в памяти
+            element.clear()
+            yield [values.get(column, '') for column in range(max(values, default=-1) + 1)]
+
+
+def iter_xlsx_rows(file: IO[bytes]) -> Iterator[Row]:
+    """
+    Строки первого листа XLSX файла по одной
+
+    Лист разбирается потоково: в памяти держатся только общие строки книги и текущая строка листа
+
+    :param file (IO[bytes]) Файл, открытый в бинарном режиме (с возможностью seek)
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise ImportFileError('Файл не похож на XLSX')
+
+    with archive:
+        try:
+            strings = _xlsx_shared_strings(archive)
+            yield from _with_header(_xlsx_rows(archive, _xlsx_first_sheet(archive), strings))
+        except (KeyError, ElementTree.ParseError):
+            raise ImportFileError('Файл не похож на XLSX')
+
+
+def read_rows(file: IO[bytes], filename: str) -> Iterator[Row]:
+    """Строки CSV или XLSX файла (формат определяется по расширению имени файла)"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(file)
+    if extension == '.xlsx':
+        return iter_xlsx_rows(file)
+
+    raise ImportFileError('Поддерживаются только файлы .csv и .xlsx')
+
+
+class ImportProgress:
+    """
+    Прогресс импорта
+
+    Fields:
+        + processed (int): Сколько строк обработано
+        + created (int): Сколько объявлений создано
+        + failed (int): Сколько строк не прошли проверку
+        + errors (list): Ошибки по строкам, не больше `max_errors`
+    """
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def add_error(self, row_number: int, errors: dict) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+
+def _chunks(rows: Iterator[Row], size: int) -> Iterator[List[Row]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _schedule_image_download(advert_id: int, logo_url: Optional[str], image_urls: List[str]) -> None:
+    # Задачи импортируют этот модуль, поэтому задача скачивания импортируется здесь, а не на уровне модуля
+    from booking.tasks import download_advert_images_task
+
+    transaction.on_commit(partial(download_advert_images_task.delay, advert_id, logo_url, image_urls))
+
+
+@transaction.atomic
+def _import_chunk(chunk: List[Row], owner: Profile, progress: ImportProgress) -> None:
+    """Проверить строки пачки и вставить прошедшие проверку объявления одним `bulk_create`"""
+    adverts: List[Advert] = []
+    images: List[Tuple[Optional[str], List[str]]] = []
+    now = timezone.now()
+
+    # Поля сериализатора строятся один раз на пачку, а не на каждую строку, как при `is_valid()`
+    validator = AdvertImportRowSerializer()
+
+    for row_number, row in chunk:
+        try:
+            data = dict(validator.run_validation({name: value for name, value in row.items() if value}))
+        except ValidationError as e:
+            progress.add_error(row_number, e.detail)  # type: ignore[arg-type]
+            continue
+
+        images.append((data.pop('logo_url', None), data.pop('image_urls', [])))
+        if data.get('status') == AdvertStatus.ACTIVE:
+            data['activated_at'] = now
+            data['active_until'] = renew_for_month(now)
+
+        adverts.append(Advert(contact=owner, **data))
+
+    progress.processed += len(chunk)
+    if not adverts:
+        return
+
+    # bulk_create не вызывает Advert.save, поэтому поисковый вектор пересчитывается отдельным UPDATE на всю пачку
+    created = Advert.objects.bulk_create(adverts)
+    update_search_vector(Advert.objects.filter(pk__in=[advert.pk for advert in created]))
+    progress.created += len(created)
+
+    for advert, (logo_url, image_urls) in zip(created, images):
+        if advert.status == AdvertStatus.ACTIVE:
+            notify_advert_changed(AdvertImport, advert.pk)
+        if logo_url or image_urls:
+            _schedule_image_download(advert.pk, logo_url, image_urls)
+
+
+def import_adverts(
+    rows: Iterable[Row],
+    owner: Profile,
+    chunk_size: int,
+    on_progress: Optional[Callable[[ImportProgress], None]] = None,
+) -> ImportProgress:
+    """
+    Создать объявления профиля по строкам файла
+
+    Строки читаются и проверяются пачками по `chunk_size`, каждая пачка вставляется в своей транзакции, так что
+    ни файл, ни создаваемые объявления не держатся в памяти целиком. Строки с ошибками пропускаются и попадают
+    в отчет. Изображения по ссылкам из файла скачиваются фоновыми задачами после коммита пачки
+
+    :param rows (Iterable[Row]) Строки файла (см. `read_rows`)
+    :param owner (Profile) Профиль, от имени которого создаются объявления
+    :param chunk_size (int) Размер пачки
+    :param on_progress (callable) Вызывается с прогрессом после каждой пачки
+    :return: ImportProgress
+    """
+    progress = ImportProgress(max_errors=settings.ADVERT_IMPORT_MAX_ERRORS)
+
+    for chunk in _chunks(iter(rows), chunk_size):
+        _import_chunk(chunk, owner, progress)
+        if on_progress is not None:
+            on_progress(progress)
+
+    return progress
+
+
+def _save_progress(advert_import: AdvertImport, progress: ImportProgress, **fields) -> None:
+    AdvertImport.objects.filter(pk=advert_import.pk).update(
+        processed_rows=progress.processed,
+        created_count=progress.created,
+        failed_count=progress.failed,
+        errors=progress.errors,
+        **fields,
+    )
+
+
+def run_advert_import(import_id: int) -> Optional[ImportProgress]:
+    """
+    Выполнить загруженный импорт `AdvertImport`, сохраняя прогресс после каждой пачки
+
+    :param import_id (int) Идентификатор импорта
+    :return: ImportProgress или None, если импорт не найден или уже запущен
+    """
+    # Задача могла быть доставлена повторно: импорт выполняет только тот, кто перевел его из очереди
+    if not AdvertImport.objects.filter(pk=import_id, status=AdvertImportStatus.PENDING).update(
+        status=AdvertImportStatus.RUNNING
+    ):
+        return None
+
+    advert_import = AdvertImport.objects.select_related('owner').get(pk=import_id)
+    progress = ImportProgress(max_errors=settings.ADVERT_IMPORT_MAX_ERRORS)
+
+    def on_progress(current: ImportProgress) -> None:
+        nonlocal progress
+        progress = current
+        _save_progress(advert_import, current)
+
+    try:
+        with advert_import.file.open('rb') as file:
+            import_adverts(
+                read_rows(file, advert_import.file.name),
+                advert_import.owner,
+                settings.ADVERT_IMPORT_CHUNK_SIZE,
+                on_progress,
+            )
+    except ImportFileError as e:
+        progress.add_error(0, {'file': [str(e)]})
+        _save_progress(advert_import, progress, status=AdvertImportStatus.FAILED, finished_at=timezone.now())
+        return progress
+    except Exception:
+        _save_progress(advert_import, progress, status=AdvertImportStatus.FAILED, finished_at=timezone.now())
+        raise
+
+    _save_progress(advert_import, progress, status=AdvertImportStatus.DONE, finished_at=timezone.now())
+    logger.info(
+        'advert import finished',
+        import_id=import_id,
+        processed=progress.processed,
+        created=progress.created,
+        failed=progress.failed,
+    )
+
+    return progress
+
+
+def _check_public_url(url: str) -> str:
+    """
+    Проверить, что ссылка из файла импорта ведет в интернет: только http/https, и все адреса хоста публичные.
+    Иначе через импорт можно заставить воркер обращаться к localhost, Redis, бд, метаданным облака и
+    другим внутренним адресам
+
+    :return: проверенный адрес хоста, с которым и нужно соединяться
+    :raises ValueError: ссылка недопустима
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in IMAGE_DOWNLOAD_SCHEMES or not parsed.hostname:
+        raise ValueError('only http and https image urls are allowed')
+
+    try:
+        addresses = socket.getaddrinfo(parsed.hostname, None, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ValueError(f'cannot resolve image host: {e}')
+
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f'image host resolves to a non-public address {address}')
+
+    return addresses[0][4][0]
+
+
+class _PinnedAddressAdapter(HTTPAdapter):
+    """
+    Транспорт requests, соединяющийся с заранее проверенным адресом, а не разрешающий хост заново: иначе хост
+    с подменой DNS (DNS rebinding) мог бы пройти `_check_public_url` и затем вести на внутренний адрес.
+    Host и SNI (и проверка сертификата) остаются по имени хоста из ссылки
+    """
+
+    def __init__(self, address: str, **kwargs):
+        self.address = address
+        super().__init__(**kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        hostname = host_params['host']
+        host_params['host'] = self.address
+        if host_params['scheme'] == 'https':
+            pool_kwargs['server_hostname'] = hostname
+            pool_kwargs['assert_hostname'] = hostname
+        return host_params, pool_kwargs
+
+    def send(self, request, **kwargs):
+        request.headers['Host'] = urlparse(request.url).netloc.rpartition('@')[2]
+        return super().send(request, **kwargs)
+
+
+def _download_image(url: str) -> ContentFile:
+    """
+    Скачать изображение по ссылке, не больше `ADVERT_UPLOAD_MAX_SIZE`, и проверить, что это изображение
+
+    Редиректы проходятся вручную, чтобы проверить каждую ссылку по `_check_public_url`, а соединение
+    устанавливается с проверенным адресом (см. `_PinnedAddressAdapter`)
+    """
+    content = bytearray()
+    for _ in range(IMAGE_DOWNLOAD_MAX_REDIRECTS + 1):
+        address = _check_public_url(url)
+        with requests.Session() as session:
+            adapter = _PinnedAddressAdapter(address)
+            for scheme in IMAGE_DOWNLOAD_SCHEMES:
+                session.mount(f'{scheme}://', adapter)
+
+            with session.get(
+                url, stream=True, timeout=settings.ADVERT_IMPORT_IMAGE_TIMEOUT, allow_redirects=False
+            ) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers['Location'])
+                    continue
+
+                response.raise_for_status()
+                for chunk in response.iter_content(IMAGE_DOWNLOAD_CHUNK_SIZE):
+                    content += chunk
+                    if len(content) > settings.ADVERT_UPLOAD_MAX_SIZE:
+                        raise ValueError('image is too large')
+                break
+    else:
+        raise ValueError('too many image redirects')
+
+    with Image.open(io.BytesIO(content)) as image:
+        image.verify()
+
+    return ContentFile(bytes(content), name=os.path.basename(urlparse(url).path) or 'image')
+
+
+def download_advert_images(advert_id: int, logo_url: Optional[str], image_urls: List[str]) -> int:
+    """
+    Скачать логотип и фотографии импортированного объявления и сгенерировать их рендиции.
+    Изображения, которые не удалось скачать, пропускаются
+
+    :param advert_id (int) Идентификатор объявления
+    :param logo_url (str) Ссылка на логотип
+    :param image_urls (list) Ссылки на фотографии
+    :return: количество скачанных изображений
+    """
+    advert = Advert.objects.filter(pk=advert_id).first()
+    if advert is None:
+        return 0
+
+    downloaded = 0
+    for url in ([logo_url] if logo_url else []) + image_urls:
+        try:
+            content = _download_image(url)
+        except (
+            requests.RequestException,
+            UnidentifiedImageError,
+            Image.DecompressionBombError,
+            ValueError,
+            OSError,
+        ) as e:
+            logger.warning('failed to download advert image', advert_id=advert_id, url=url, error=str(e))
+            continue
+
+        if url == logo_url and not advert.logo:
+            advert.logo.save(content.name, content, save=False)
+            Advert.objects.filter(pk=advert_id).update(logo=advert.logo.name, logo_renditions={})
+        else:
+            image = AdvertImage(advert=advert)
+            image.image.save(content.name, content)
+        downloaded += 1
+
+    if downloaded:
+        process_advert_images(advert_id)
+
+    return downloaded
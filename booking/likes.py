@@ -0,0 +1,52 @@
+from django.db import connection, transaction
+
+from authentication.models import Profile
+from booking.counters import record_advert_like
+
+LikedAdvert = Profile.liked_adverts.through
+
+# Уникальность пары (профиль, объявление) обеспечивает сама таблица лайков, так что одновременные лайки
+# одного пользователя не создают дублей, а вставку выполняет ровно один из них
+INSERT_LIKE_SQL = '''
+INSERT INTO {table} (profile_id, advert_id) VALUES (%s, %s)
+ON CONFLICT (profile_id, advert_id) DO NOTHING
+'''
+
+
+@transaction.atomic
+def like_advert(profile: Profile, advert_id: int) -> bool:
+    """
+    Лайкнуть объявление. Повторный лайк ничего не меняет
+
+    :param profile (Profile) Профиль пользователя
+    :param advert_id (int) Идентификатор объявления
+    :return: True, если лайк поставлен этим вызовом
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            INSERT_LIKE_SQL.format(table=connection.ops.quote_name(LikedAdvert._meta.db_table)),
+            [profile.pk, advert_id],
+        )
+        created = cursor.rowcount == 1
+
+    if created:
+        record_advert_like(advert_id, 1)
+
+    return created
+
+
+@transaction.atomic
+def unlike_advert(profile: Profile, advert_id: int) -> bool:
+    """
+    Снять лайк с объявления. Снятие отсутствующего лайка ничего не меняет
+
+    :param profile (Profile) Профиль пользователя
+    :param advert_id (int) Идентификатор объявления
+    :return: True, если лайк снят этим вызовом
+    """
+    deleted, _ = LikedAdvert.objects.filter(profile_id=profile.pk, advert_id=advert_id).delete()
+
+    if deleted:
+        record_advert_like(advert_id, -1)
+
+    return bool(deleted)
@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from authentication.models import Profile
+from booking.models import Advert, AdvertStatus
+from booking.ranking import STRATEGIES
+from booking.selectors.advert import get_feed_adverts
+
+# Синтетические объявления: ~10% продвигаемых, возраст до 60 дней, просмотры до 10000, лайки до 500
+INSERT_ADVERTS_SQL = '''
+INSERT INTO {table} (
+    title, description, price, phone, location, contact_id, status,
+    effective_rank, views, likes_count, created_at, logo_renditions
+)
+SELECT 'Объявление ' || n, 'Описание', (random() * 100000)::numeric(11, 2), '79990000000', 'Москва', %s, %s,
+       CASE WHEN random() < 0.1 THEN 1 + (random() * 9)::int ELSE 0 END,
+       (random() * 10000)::int,
+       (random() * 500)::int,
+       now() - random() * interval '60 days',
+       '{{}}'
+FROM generate_series(1, %s) AS n
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время выборки первой страницы ленты разными стратегиями ранжирования на синтетических '
+        'объявлениях. Объявления создаются в транзакции, которая в конце откатывается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help='Количество объявлений'
+        )
+        parser.add_argument('--strategies', nargs='+', choices=sorted(STRATEGIES), default=sorted(STRATEGIES))
+        parser.add_argument('--page-size', type=int, default=20, help='Размер страницы ленты')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров на стратегию')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Вставка миллиона строк не укладывается в statement_timeout из настроек бд
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = 0')
+
+            user = User.objects.create(username='ranking-benchmark')
+            profile = Profile.objects.create(user=user, name='ranking-benchmark')
+            inserted = 0
+
+            for size in sorted(options['sizes']):
+                self._insert_adverts(profile, size - inserted)
+                inserted = size
+
+                for name in options['strategies']:
+                    timings = self._measure(name, options['page_size'], options['repeat'])
+                    self.stdout.write(
+                        f'{size:>9} объявлений | {name:<8} | медиана {statistics.median(timings):8.1f} мс '
+                        f'| максимум {max(timings):8.1f} мс'
+                    )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Замеры завершены, синтетические объявления удалены'))
+
+    def _insert_adverts(self, profile: Profile, count: int) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                INSERT_ADVERTS_SQL.format(table=connection.ops.quote_name(Advert._meta.db_table)),
+                [profile.pk, AdvertStatus.ACTIVE, count],
+            )
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Advert._meta.db_table)}')
+
+    def _measure(self, name: str, page_size: int, repeat: int) -> list:
+        strategy = STRATEGIES[name]
+        timings = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(strategy.rank(get_feed_adverts()).order_by(*strategy.ordering)[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        return timings
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import Profile
+from booking.imports import ImportFileError, ImportProgress, import_adverts, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует объявления профиля из CSV или XLSX файла. Файл читается построчно, объявления создаются '
+        'пачками, строки с ошибками пропускаются и выводятся в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .csv или .xlsx файлу')
+        parser.add_argument('--profile', type=int, required=True, help='id профиля, от имени которого создаются')
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.ADVERT_IMPORT_CHUNK_SIZE, help='Размер пачки строк'
+        )
+
+    def handle(self, *args, **options):
+        profile = Profile.objects.filter(pk=options['profile']).first()
+        if profile is None:
+            raise CommandError(f'Профиль {options["profile"]} не найден')
+
+        try:
+            with open(options['path'], 'rb') as file:
+                progress = import_adverts(
+                    read_rows(file, options['path']), profile, options['chunk_size'], self._report_progress
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for error in progress.errors:
+            self.stderr.write(f'Строка {error["row"]}: {error["errors"]}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано строк: {progress.processed}, создано объявлений: {progress.created}, '
+                f'строк с ошибками: {progress.failed}'
+            )
+        )
+
+    def _report_progress(self, progress: ImportProgress) -> None:
+        self.stdout.write(f'Обработано строк: {progress.processed}, создано объявлений: {progress.created}')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from booking.models import Advert
+from booking.search import update_search_vector
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы объявлений пачками по первичному ключу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество объявлений в одном UPDATE')
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Обновить только объявления, у которых поисковый вектор еще не заполнен',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Advert.objects.all()
+
+        if options['only_missing']:
+            queryset = queryset.filter(search_vector__isnull=True)
+
+        last_pk = 0
+        updated = 0
+
+        # Идем по диапазонам первичного ключа, а не OFFSET'ом, чтобы каждая пачка была коротким UPDATE по индексу
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+
+            updated += update_search_vector(Advert.objects.filter(pk__in=batch))
+            last_pk = batch[-1]
+
+            self.stdout.write(f'Обновлено объявлений: {updated}')
+
+        self.stdout.write(self.style.SUCCESS(f'Поисковые векторы пересчитаны, всего объявлений: {updated}'))
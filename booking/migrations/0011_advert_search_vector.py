@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:56
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('booking', '0010_alter_advert_logo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advert',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                blank=True, editable=False, null=True, verbose_name='Поисковый вектор'
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='advert',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='advert_search_vector_gin'),
+        ),
+    ]
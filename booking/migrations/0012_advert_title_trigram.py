@@ -0,0 +1,24 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:58
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('booking', '0011_advert_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='advert',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['title'], name='advert_title_trgm_gin', opclasses=['gin_trgm_ops']
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:59
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_effective_rank(apps, schema_editor):
+    Advert = apps.get_model('booking', 'Advert')
+    Promotion = apps.get_model('booking', 'Promotion')
+
+    Advert.objects.filter(promotion__status='ACTIVE').update(
+        effective_rank=Subquery(Promotion.objects.filter(pk=OuterRef('promotion_id')).values('rate')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('booking', '0012_advert_title_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advert',
+            name='effective_rank',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ранг в ленте'),
+        ),
+        migrations.RunPython(fill_effective_rank, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='advert',
+            index=models.Index(
+                condition=models.Q(('status', 'ACTIVE')),
+                fields=['status', '-effective_rank', '-created_at', '-id'],
+                name='advert_feed_rank_idx',
+            ),
+        ),
+    ]
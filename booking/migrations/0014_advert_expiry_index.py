@@ -0,0 +1,24 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('booking', '0013_advert_effective_rank'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='advert',
+            index=models.Index(
+                condition=models.Q(('status', 'ACTIVE')),
+                fields=['status', 'active_until'],
+                name='advert_expiry_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0014_advert_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advert',
+            name='logo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Уменьшенные копии логотипа'),
+        ),
+        migrations.AddField(
+            model_name='advertimage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Уменьшенные копии'),
+        ),
+    ]
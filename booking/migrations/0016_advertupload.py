@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:09
+
+import DjangoServer.utils
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_alter_profile_type'),
+        ('booking', '0015_advert_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertUpload',
+            fields=[
+                (
+                    'token',
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Токен'
+                    ),
+                ),
+                (
+                    'file',
+                    models.ImageField(upload_to=DjangoServer.utils.upload_directory_path, verbose_name='Изображение'),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Загружено')),
+                (
+                    'owner',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='advert_uploads',
+                        to='authentication.profile',
+                        verbose_name='Владелец',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Загрузка изображения',
+                'verbose_name_plural': 'Загрузки изображений',
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:11
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0016_advertupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                (
+                    'latitude',
+                    models.FloatField(
+                        validators=[
+                            django.core.validators.MinValueValidator(-90),
+                            django.core.validators.MaxValueValidator(90),
+                        ],
+                        verbose_name='Широта',
+                    ),
+                ),
+                (
+                    'longitude',
+                    models.FloatField(
+                        validators=[
+                            django.core.validators.MinValueValidator(-180),
+                            django.core.validators.MaxValueValidator(180),
+                        ],
+                        verbose_name='Долгота',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Местоположение',
+                'verbose_name_plural': 'Местоположения',
+                'indexes': [models.Index(fields=['latitude', 'longitude'], name='location_lat_lon_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='advert',
+            name='place',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='adverts',
+                to='booking.location',
+                verbose_name='Местоположение на карте',
+            ),
+        ),
+    ]
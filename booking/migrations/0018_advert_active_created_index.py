@@ -0,0 +1,24 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('booking', '0017_location'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='advert',
+            index=models.Index(
+                condition=models.Q(('status', 'ACTIVE')),
+                fields=['-created_at'],
+                name='advert_active_created_idx',
+            ),
+        ),
+    ]
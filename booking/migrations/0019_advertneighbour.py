@@ -0,0 +1,48 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0018_advert_active_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                (
+                    'advert',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='neighbours',
+                        to='booking.advert',
+                        verbose_name='Объявление',
+                    ),
+                ),
+                (
+                    'neighbour',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='similar_to',
+                        to='booking.advert',
+                        verbose_name='Похожее объявление',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Похожее объявление',
+                'verbose_name_plural': 'Похожие объявления',
+                'indexes': [models.Index(fields=['advert', '-score'], name='advert_neighbour_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='advertneighbour',
+            constraint=models.UniqueConstraint(fields=('advert', 'neighbour'), name='advert_neighbour_unique'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def fill_likes_count(apps, schema_editor):
+    Advert = apps.get_model('booking', 'Advert')
+    Profile = apps.get_model('authentication', 'Profile')
+    LikedAdvert = Profile.liked_adverts.through
+
+    Advert.objects.filter(pk__in=LikedAdvert.objects.values('advert_id')).update(
+        likes_count=Subquery(
+            LikedAdvert.objects.filter(advert_id=OuterRef('pk'))
+            .values('advert_id')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_alter_profile_type'),
+        ('booking', '0019_advertneighbour'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advert',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Лайки'),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
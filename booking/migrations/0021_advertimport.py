@@ -0,0 +1,56 @@
+# Generated by Django 4.2.20 on 2026-10-18 18:27
+
+import DjangoServer.utils
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_alter_profile_type'),
+        ('booking', '0020_advert_likes_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to=DjangoServer.utils.import_directory_path, verbose_name='Файл')),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('PENDING', 'В очереди'),
+                            ('RUNNING', 'Выполняется'),
+                            ('DONE', 'Завершен'),
+                            ('FAILED', 'Ошибка'),
+                        ],
+                        default='PENDING',
+                        max_length=16,
+                        verbose_name='Статус',
+                    ),
+                ),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Создано объявлений')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Строк с ошибками')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Ошибки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Загружен')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершен')),
+                (
+                    'owner',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='advert_imports',
+                        to='authentication.profile',
+                        verbose_name='Владелец',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Импорт объявлений',
+                'verbose_name_plural': 'Импорты объявлений',
+            },
+        ),
+    ]
@@ -1,9 +1,14 @@
+import uuid
 from typing import Dict, Optional
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
-from DjangoServer.utils import user_directory_path
+from DjangoServer.utils import import_directory_path, upload_directory_path, user_directory_path
 from authentication.models import Profile
+from booking.search import SEARCH_VECTOR_WEIGHTS, advert_search_vector
 
 
 class PromotionStatus:
@@ -46,6 +51,11 @@ class Promotion(models.Model):
     def is_active(self) -> bool:
         return self.status == PromotionStatus.ACTIVE
 
+    @property
+    def effective_rate(self) -> int:
+        """Уровень продвижения, учитываемый при ранжировании ленты: у отключенного продвижения он нулевой"""
+        return self.rate if self.is_active else 0
+
 
 class BoostType:
     INCREASE = 'increase'
@@ -61,9 +71,9 @@ class Boost:
     """
 
     def __init__(self, boost_type: BoostType, another: Optional[Dict[str, int]] = None):
-        self._validate()
         self.boost_type = boost_type
         self.another = another
+        self._validate()
 
     def _validate(self):
         if self.another and len(self.another) != 1:
@@ -86,6 +96,32 @@ class Boost:
         return promotion
 
 
+class Location(models.Model):
+    """
+    Модель местоположения с координатами
+
+    Fields:
+        + name (CharField): Название (город, адрес)
+        + latitude (FloatField): Широта в градусах
+        + longitude (FloatField): Долгота в градусах
+    """
+
+    name = models.CharField(max_length=255, verbose_name='Название')
+    latitude = models.FloatField(verbose_name='Широта', validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(verbose_name='Долгота', validators=[MinValueValidator(-180), MaxValueValidator(180)])
+
+    class Meta:
+        verbose_name = 'Местоположение'
+        verbose_name_plural = 'Местоположения'
+        indexes = [
+            # Поиск по радиусу сначала отбирает точки в прямоугольнике из широт и долгот
+            models.Index(fields=['latitude', 'longitude'], name='location_lat_lon_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
 class AdvertStatus:
     ACTIVE = 'ACTIVE'
     DISABLED = 'DISABLED'
@@ -107,7 +143,11 @@ class Advert(models.Model):
         + created_at (DateTimeField): Дата, когда было создано объявление
         + activated_at (DateTimeField): Дата, когда пользователь активировал свое объявление
         + status (CharField): Статус объявления. Принимает два значения: ACTIVE или DISABLED
+        + place (Location): Местоположение с координатами, по нему ищутся объявления поблизости
         + promotion (Promotion): Данные о продвижении объявления
+        + effective_rank (IntegerField): Денормализованный уровень активного продвижения, по нему сортируется лента
+        + search_vector (SearchVectorField): Взвешенный tsvector по названию, местоположению и описанию
+        + logo_renditions (JSONField): Пути уменьшенных копий логотипа по размерам и форматам
 
     Properties:
         + is_active(): возвращает True, если статус объявления ACTIVE (то есть активно)
@@ -136,10 +176,21 @@ class Advert(models.Model):
     location = models.CharField(
         max_length=255, verbose_name='Местоположение', default='Неизвестно'
     )  # TODO: пока charfield, позже сделаем модель локации
+    place = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        related_name='adverts',
+        verbose_name='Местоположение на карте',
+        null=True,
+        blank=True,
+    )
     promotion = models.OneToOneField(
         Promotion, on_delete=models.CASCADE, related_name='advert', verbose_name='Продвижение', null=True, blank=True
     )
+    effective_rank = models.IntegerField(verbose_name='Ранг в ленте', default=0, editable=False)
     views = models.PositiveIntegerField(verbose_name='Просмотры', default=0)
+    # Денормализованное количество лайков: копится в Redis и переносится сюда пачками (booking.counters)
+    likes_count = models.PositiveIntegerField(verbose_name='Лайки', default=0, editable=False)
     created_at = models.DateTimeField(
         auto_now_add=True, verbose_name='Создано'  # поле auto_now_add ставит datetime.now() когда объект только создан
     )
@@ -151,14 +202,49 @@ class Advert(models.Model):
     active_until = models.DateTimeField(verbose_name='Активно до', null=True, blank=True)
 
     logo = models.ImageField(upload_to=user_directory_path, verbose_name='Логотип', null=True, blank=True)
+    logo_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии логотипа', default=dict, blank=True, editable=False
+    )
+
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор', null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = 'Объявление'
         verbose_name_plural = 'Объявления'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='advert_search_vector_gin'),
+            GinIndex(fields=['title'], name='advert_title_trgm_gin', opclasses=['gin_trgm_ops']),
+            # Лента читается одним проходом по этому индексу, без сортировки и подзапросов
+            models.Index(
+                fields=['status', '-effective_rank', '-created_at', '-id'],
+                name='advert_feed_rank_idx',
+                condition=models.Q(status=AdvertStatus.ACTIVE),
+            ),
+            # Кандидаты для стратегий ранжирования - самые свежие активные объявления
+            models.Index(
+                fields=['-created_at'],
+                name='advert_active_created_idx',
+                condition=models.Q(status=AdvertStatus.ACTIVE),
+            ),
+            # Поиск истекших объявлений для снятия с публикации
+            models.Index(
+                fields=['status', 'active_until'],
+                name='advert_expiry_idx',
+                condition=models.Q(status=AdvertStatus.ACTIVE),
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        # Поисковый вектор пересчитывается на стороне БД, и только если изменились участвующие в нем поля
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(SEARCH_VECTOR_WEIGHTS):
+            Advert.objects.filter(pk=self.pk).update(search_vector=advert_search_vector())
+
     @property
     def is_active(self) -> bool:
         return self.status == AdvertStatus.ACTIVE
@@ -172,6 +258,7 @@ class AdvertImage(models.Model):
     """Модель фотографии объявления"""
 
     image = models.ImageField(upload_to=user_directory_path)
+    renditions = models.JSONField(verbose_name='Уменьшенные копии', default=dict, blank=True, editable=False)
     advert = models.ForeignKey(to=Advert, on_delete=models.CASCADE, related_name='images', verbose_name='Объявление')
 
     class Meta:
@@ -180,3 +267,117 @@ class AdvertImage(models.Model):
 
     def __str__(self) -> str:
         return f'{self.advert.title} - img {self.image}'
+
+
+class AdvertUpload(models.Model):
+    """
+    Изображение, загруженное заранее отдельным запросом, чтобы потом сослаться на него токеном при подаче объявления
+
+    Fields:
+        + token (UUIDField): Токен, по которому на загрузку ссылается объявление
+        + owner (Profile): Профиль, загрузивший изображение
+        + file (ImageField): Загруженное изображение
+        + created_at (DateTimeField): Дата загрузки
+    """
+
+    token = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='Токен')
+    owner = models.ForeignKey(
+        to=Profile, on_delete=models.CASCADE, related_name='advert_uploads', verbose_name='Владелец'
+    )
+    file = models.ImageField(upload_to=upload_directory_path, verbose_name='Изображение')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Загружено')
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+
+    def __str__(self) -> str:
+        return str(self.token)
+
+
+class AdvertNeighbour(models.Model):
+    """
+    Похожее объявление: его лайкали те же пользователи. Таблица пересчитывается целиком фоновой задачей
+
+    Fields:
+        + advert (Advert): Объявление
+        + neighbour (Advert): Похожее на него объявление
+        + score (FloatField): Косинусная мера сходства по лайкам, от 0 до 1
+    """
+
+    advert = models.ForeignKey(
+        to=Advert, on_delete=models.CASCADE, related_name='neighbours', verbose_name='Объявление'
+    )
+    neighbour = models.ForeignKey(
+        to=Advert, on_delete=models.CASCADE, related_name='similar_to', verbose_name='Похожее объявление'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожее объявление'
+        verbose_name_plural = 'Похожие объявления'
+        constraints = [
+            models.UniqueConstraint(fields=['advert', 'neighbour'], name='advert_neighbour_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['advert', '-score'], name='advert_neighbour_score_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.advert_id} ~ {self.neighbour_id} ({self.score:.3f})'
+
+
+class AdvertImportStatus:
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+
+class AdvertImport(models.Model):
+    """
+    Импорт объявлений из CSV/XLSX файла. Файл разбирается фоновой задачей, прогресс виден по этой записи
+
+    Fields:
+        + owner (Profile): Профиль, от имени которого создаются объявления
+        + file (FileField): Импортируемый файл
+        + status (CharField): Статус импорта
+        + processed_rows (PositiveIntegerField): Сколько строк файла обработано
+        + created_count (PositiveIntegerField): Сколько объявлений создано
+        + failed_count (PositiveIntegerField): Сколько строк не прошли проверку
+        + errors (JSONField): Ошибки по строкам `[{'row': номер строки, 'errors': {...}}]`, не больше
+        `ADVERT_IMPORT_MAX_ERRORS`
+        + created_at (DateTimeField): Дата загрузки файла
+        + finished_at (DateTimeField): Дата завершения импорта
+    """
+
+    ADVERT_IMPORT_STATUS_CHOICES = (
+        (AdvertImportStatus.PENDING, 'В очереди'),
+        (AdvertImportStatus.RUNNING, 'Выполняется'),
+        (AdvertImportStatus.DONE, 'Завершен'),
+        (AdvertImportStatus.FAILED, 'Ошибка'),
+    )
+
+    owner = models.ForeignKey(
+        to=Profile, on_delete=models.CASCADE, related_name='advert_imports', verbose_name='Владелец'
+    )
+    file = models.FileField(upload_to=import_directory_path, verbose_name='Файл')
+    status = models.CharField(
+        max_length=16,
+        choices=ADVERT_IMPORT_STATUS_CHOICES,
+        default=AdvertImportStatus.PENDING,
+        verbose_name='Статус',
+    )
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+    created_count = models.PositiveIntegerField(default=0, verbose_name='Создано объявлений')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='Строк с ошибками')
+    errors = models.JSONField(default=list, blank=True, verbose_name='Ошибки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Загружен')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершен')
+
+    class Meta:
+        verbose_name = 'Импорт объявлений'
+        verbose_name_plural = 'Импорты объявлений'
+
+    def __str__(self) -> str:
+        return f'{self.file.name} ({self.status})'
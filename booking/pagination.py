@@ -0,0 +1,173 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import redis
+import structlog
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from booking.feed import FeedSnapshot, FeedSnapshotNotReady
+from booking.models import Advert
+
+logger = structlog.get_logger(__name__)
+
+INVALID_CURSOR_MESSAGE = 'Некорректный курсор'
+
+
+class AdvertFeedCursorPagination(BasePagination):
+    """
+    Keyset (курсорная) пагинация ленты объявлений
+
+    Лента упорядочена по `(effective_rank, created_at, id)` по убыванию. Вместо OFFSET следующая страница
+    выбирается условием "строго после последней записи предыдущей страницы", поэтому стоимость запроса
+    не зависит от того, насколько глубоко пролистана лента. Курсор непрозрачен для клиента и представляет собой
+    base64 от ключа последней отданной записи
+
+    Fields:
+        + cursor_query_param (str): Имя query параметра курсора
+        + page_size_query_param (str): Имя query параметра размера страницы
+
+    Methods:
+        + is_requested(request): Запрошена ли лента в режиме пагинации
+        + paginate_queryset(queryset, request): Возвращает страницу объявлений
+        + get_paginated_response(data): Формирует ответ со ссылкой на следующую страницу
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-effective_rank', '-created_at', '-id')
+
+    def __init__(self):
+        self.page_size: int = settings.ADVERT_FEED_PAGE_SIZE
+        self.next_position: Optional[Tuple[int, str, int]] = None
+        self.base_url: Optional[str] = None
+
+    def is_requested(self, request: Request) -> bool:
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+    def get_page_size(self, request: Request) -> int:
+        """Размер страницы из запроса, ограниченный сверху `ADVERT_FEED_MAX_PAGE_SIZE`"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.ADVERT_FEED_PAGE_SIZE
+
+        if page_size <= 0:
+            return settings.ADVERT_FEED_PAGE_SIZE
+
+        return min(page_size, settings.ADVERT_FEED_MAX_PAGE_SIZE)
+
+    @staticmethod
+    def encode_cursor(position: Tuple[int, str, int]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, Any, int]:
+        try:
+            rank, created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            created_at = parse_datetime(created_at)
+            if created_at is None or timezone.is_naive(created_at):
+                raise ValueError
+            return int(rank), created_at, int(pk)
+
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise NotFound(INVALID_CURSOR_MESSAGE)
+
+    def paginate_queryset(self, queryset: QuerySet[Advert], request: Request, view=None) -> List[Advert]:
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            rank, created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(effective_rank__lt=rank)
+                | Q(effective_rank=rank, created_at__lt=created_at)
+                | Q(effective_rank=rank, created_at=created_at, id__lt=pk)
+            )
+
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница, не делая COUNT(*)
+        page = list(queryset[: self.page_size + 1])
+        has_next = len(page) > self.page_size
+        page = page[: self.page_size]
+
+        self.next_position = None
+        if has_next:
+            last = page[-1]
+            self.next_position = (last.effective_rank, last.created_at.isoformat(), last.pk)
+
+        return page
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_position is None or self.base_url is None:
+            return None
+
+        url = replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position))
+        return replace_query_param(url, self.page_size_query_param, self.page_size)
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(OrderedDict([('next', self.get_next_link()), ('results', data)]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AdvertFeedSnapshotPagination(AdvertFeedCursorPagination):
+    """
+    Та же курсорная пагинация ленты, но порядок объявлений берется из снапшота ленты в Redis (`FeedSnapshot`),
+    а из бд объявления страницы достаются одним запросом по id. Если Redis недоступен или снапшот еще не построен,
+    страница строится по бд, как в `AdvertFeedCursorPagination`. Курсоры у обоих вариантов одного формата и указывают
+    на одну и ту же позицию (ранг, время создания с микросекундами, id), так что ленту можно продолжить любым из них
+    """
+
+    def paginate_queryset(self, queryset: QuerySet[Advert], request: Request, view=None) -> List[Advert]:
+        if not settings.ADVERT_FEED_SNAPSHOT_ENABLED:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        after = self.decode_cursor(cursor) if cursor else None
+
+        try:
+            positions = FeedSnapshot().page(after, self.page_size + 1)
+        except FeedSnapshotNotReady:
+            logger.info('feed snapshot is not built yet, falling back to database')
+            return super().paginate_queryset(queryset, request, view)
+        except redis.RedisError as e:
+            logger.warning('feed snapshot unavailable, falling back to database', error=str(e))
+            return super().paginate_queryset(queryset, request, view)
+
+        has_next = len(positions) > self.page_size
+        positions = positions[: self.page_size]
+
+        # Объявления, которые успели снять с публикации, но еще не убрали из снапшота, отбрасываются
+        adverts = queryset.in_bulk([advert_id for _, _, advert_id in positions])
+        page = [adverts[advert_id] for _, _, advert_id in positions if advert_id in adverts]
+
+        self.next_position = None
+        if has_next:
+            rank, created_at, advert_id = positions[-1]
+            self.next_position = (rank, created_at.isoformat(), advert_id)
+
+        return page
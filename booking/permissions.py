@@ -1,5 +1,6 @@
 from rest_framework import permissions
 
+from authentication.selectors.profile import get_request_profile
 from booking.models import Advert
 
 
@@ -8,7 +9,7 @@ class IsAdvertOwnerOrReadOnly(permissions.BasePermission):  # type: ignore[misc]
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        profile = request.user.profile
+        profile = get_request_profile(request)
         is_advert_owner = obj.contact == profile
 
         return is_advert_owner
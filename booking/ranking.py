@@ -0,0 +1,147 @@
+import datetime
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple, Type
+
+from django.conf import settings
+from django.db.models import DurationField, ExpressionWrapper, F, FloatField, QuerySet, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Extract, Ln, Power
+from django.utils import timezone
+from rest_framework.request import Request
+
+from common.helpers.request import get_client_ip
+
+DEFAULT_STRATEGY = 'default'
+
+
+class RankingStrategy(ABC):
+    """
+    Стратегия ранжирования объявлений: score объявления считается одним SQL выражением прямо в запросе выборки,
+    так что ранжирование не требует отдельного прохода по кандидатам
+
+    Стратегии, score которых не поддерживается индексом, ранжируют не всю выборку, а только
+    `ADVERT_RANKING_CANDIDATES` самых свежих ее объявлений: кандидаты достаются по индексу
+    `advert_active_created_idx` за фиксированное время, и сортировать по score приходится ограниченное
+    количество строк. Поэтому, если выборка больше этого числа, такие стратегии отдают только ее свежую часть.
+    Разрезы (facets) от этого не зависят - они считаются по всей выборке
+
+    Fields:
+        + name (str): Имя стратегии, по которому ее выбирают в запросе
+        + ordering (tuple): Сортировка выборки после аннотации `ranking_score`
+        + bounded (bool): Ранжировать только ограниченный набор кандидатов
+
+    Methods:
+        + score(now): SQL выражение score объявления
+        + rank(queryset, now): Аннотировать выборку score'ом
+    """
+
+    name: str
+    ordering: Tuple[str, ...] = ('-ranking_score', '-created_at', '-id')
+    bounded = True
+
+    @abstractmethod
+    def score(self, now: datetime.datetime):
+        """SQL выражение score объявления на момент `now`"""
+
+    def rank(self, queryset: QuerySet, now: Optional[datetime.datetime] = None) -> QuerySet:
+        if self.bounded:
+            candidates = queryset.order_by('-created_at').values('pk')[: settings.ADVERT_RANKING_CANDIDATES]
+            queryset = queryset.filter(pk__in=Subquery(candidates))
+
+        return queryset.annotate(ranking_score=self.score(now or timezone.now()))
+
+
+STRATEGIES: Dict[str, RankingStrategy] = {}
+
+
+def register(strategy_class: Type[RankingStrategy]) -> Type[RankingStrategy]:
+    """Декоратор, регистрирующий стратегию под ее именем"""
+    STRATEGIES[strategy_class.name] = strategy_class()
+    return strategy_class
+
+
+@register
+class PromotionStrategy(RankingStrategy):
+    """Исходная сортировка ленты: по уровню продвижения, затем от новых к старым"""
+
+    name = DEFAULT_STRATEGY
+    # Сортировка целиком идет по индексу ленты
+    bounded = False
+
+    def score(self, now: datetime.datetime):
+        return F('effective_rank')
+
+
+@register
+class RecencyDecayStrategy(RankingStrategy):
+    """
+    Продвижение, затухающее со временем: `(1 + ранг) / (возраст в часах + 2) ^ gravity`
+
+    Свежее объявление без продвижения может обойти старое продвигаемое, а продвижение замедляет затухание
+    """
+
+    name = 'recency'
+    gravity = 1.5
+
+    def score(self, now: datetime.datetime):
+        age = ExpressionWrapper(Value(now) - F('created_at'), output_field=DurationField())
+        age_hours = Cast(Extract(age, 'epoch'), FloatField()) / 3600
+        return Cast(F('effective_rank') + 1, FloatField()) / Power(age_hours + 2, self.gravity)
+
+
+@register
+class PopularityStrategy(RankingStrategy):
+    """Популярность: `ln(1 + просмотры) + likes_weight * ln(1 + лайки)`"""
+
+    name = 'popular'
+    likes_weight = 2.0
+
+    def score(self, now: datetime.datetime):
+        views = Cast(F('views'), FloatField())
+        likes = Cast(F('likes_count'), FloatField())
+        return Ln(views + 1) + self.likes_weight * Ln(likes + 1)
+
+
+@register
+class RatingBoostStrategy(RankingStrategy):
+    """Продвижение с бонусом за рейтинг автора: `ранг + rating_weight * рейтинг профиля`"""
+
+    name = 'rating'
+    rating_weight = 1.0
+
+    def score(self, now: datetime.datetime):
+        rating = Cast(Coalesce(F('contact__rating'), Value(0), output_field=FloatField()), FloatField())
+        return Cast(F('effective_rank'), FloatField()) + self.rating_weight * rating
+
+
+def get_strategy(name: Optional[str]) -> RankingStrategy:
+    return STRATEGIES.get(name or DEFAULT_STRATEGY, STRATEGIES[DEFAULT_STRATEGY])
+
+
+def choose_strategy(request: Request, requested: Optional[str] = None) -> RankingStrategy:
+    """
+    Стратегия для запроса: явно запрошенная, иначе по A/B эксперименту `ADVERT_RANKING_EXPERIMENT`
+
+    Эксперимент задается долями стратегий в процентах. Пользователь (или IP анонима) попадает в группу
+    детерминированно по хэшу, поэтому от запроса к запросу видит одну и ту же ленту
+
+    :param request (Request) Запрос к ленте
+    :param requested (str) Имя стратегии из параметров запроса
+    :return: RankingStrategy
+    """
+    if requested:
+        return get_strategy(requested)
+
+    experiment: Dict[str, int] = settings.ADVERT_RANKING_EXPERIMENT
+    if not experiment:
+        return get_strategy(DEFAULT_STRATEGY)
+
+    viewer = f'user:{request.user.pk}' if request.user.is_authenticated else f'ip:{get_client_ip(request)}'
+    bucket = int(hashlib.md5(viewer.encode()).hexdigest(), 16) % 100
+
+    for name, share in experiment.items():
+        if bucket < share:
+            return get_strategy(name)
+        bucket -= share
+
+    return get_strategy(DEFAULT_STRATEGY)
@@ -0,0 +1,69 @@
+import structlog
+from django.db import connection, transaction
+
+from authentication.models import Profile
+from booking.models import AdvertNeighbour
+
+logger = structlog.get_logger(__name__)
+
+# Матрица "профиль x объявление" из таблицы лайков, умноженная сама на себя, дает количество общих лайков
+# у каждой пары объявлений - в SQL это самосоединение таблицы лайков по профилю. Количество делится
+# на sqrt(лайки A * лайки B) (косинусная мера), и для каждого объявления остаются top-K соседей.
+# Профили с очень большим количеством лайков пропускаются: они дают квадратичное число пар и почти не несут сигнала
+REBUILD_NEIGHBOURS_SQL = '''
+WITH likes AS (
+    SELECT liked.profile_id, liked.advert_id
+    FROM {likes_table} AS liked
+    WHERE liked.profile_id IN (
+        SELECT profile_id FROM {likes_table} GROUP BY profile_id HAVING COUNT(*) <= %(max_profile_likes)s
+    )
+),
+counts AS (
+    SELECT advert_id, COUNT(*) AS likes FROM likes GROUP BY advert_id
+),
+pairs AS (
+    SELECT a.advert_id, b.advert_id AS neighbour_id, COUNT(*) AS co_likes
+    FROM likes AS a
+    JOIN likes AS b ON b.profile_id = a.profile_id AND b.advert_id <> a.advert_id
+    GROUP BY a.advert_id, b.advert_id
+),
+scored AS (
+    SELECT pairs.advert_id, pairs.neighbour_id, pairs.co_likes / sqrt(ca.likes * cb.likes) AS score
+    FROM pairs
+    JOIN counts AS ca ON ca.advert_id = pairs.advert_id
+    JOIN counts AS cb ON cb.advert_id = pairs.neighbour_id
+),
+ranked AS (
+    SELECT scored.*, row_number() OVER (PARTITION BY advert_id ORDER BY score DESC, neighbour_id DESC) AS position
+    FROM scored
+)
+INSERT INTO {neighbours_table} (advert_id, neighbour_id, score)
+SELECT advert_id, neighbour_id, score FROM ranked WHERE position <= %(top_k)s
+'''
+
+
+def rebuild_advert_neighbours(top_k: int, max_profile_likes: int) -> int:
+    """
+    Пересчитать похожие объявления по совместным лайкам
+
+    Старые соседи удаляются и новые вставляются в одной транзакции, так что читатели до коммита видят
+    прежний набор, а не пустую таблицу
+
+    :param top_k (int) Сколько соседей хранить для каждого объявления
+    :param max_profile_likes (int) Профили с большим количеством лайков не учитываются
+    :return: количество сохраненных пар
+    """
+    quote = connection.ops.quote_name
+    sql = REBUILD_NEIGHBOURS_SQL.format(
+        likes_table=quote(Profile.liked_adverts.through._meta.db_table),
+        neighbours_table=quote(AdvertNeighbour._meta.db_table),
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        AdvertNeighbour.objects.all().delete()
+        cursor.execute(sql, {'top_k': top_k, 'max_profile_likes': max_profile_likes})
+        saved = cursor.rowcount
+
+    logger.info('advert neighbours rebuilt', pairs=saved)
+
+    return saved
@@ -0,0 +1,101 @@
+import hashlib
+from typing import List
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db.models import F, QuerySet
+
+# Конфигурация полнотекстового поиска PostgreSQL (стемминг для русского языка)
+SEARCH_CONFIG = 'russian'
+
+AUTOCOMPLETE_CACHE_KEY = 'adverts:autocomplete:{limit}:{prefix_hash}'
+
+# Поля объявления, по которым строится поисковый вектор, и их веса в ранжировании
+SEARCH_VECTOR_WEIGHTS = {
+    'title': 'A',
+    'location': 'B',
+    'description': 'C',
+}
+
+
+def advert_search_vector() -> SearchVector:
+    """Выражение взвешенного tsvector объявления, пригодное для `update(search_vector=...)`"""
+    vector = None
+    for field, weight in SEARCH_VECTOR_WEIGHTS.items():
+        field_vector = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = field_vector if vector is None else vector + field_vector
+
+    return vector  # type: ignore[return-value]
+
+
+def update_search_vector(queryset: QuerySet) -> int:
+    """
+    Пересчитать поисковый вектор объявлений одним UPDATE
+
+    :param queryset (QuerySet[Advert]) Объявления, вектор которых нужно пересчитать
+    :return: количество обновленных объявлений
+    """
+    return queryset.update(search_vector=advert_search_vector())
+
+
+def search_adverts(queryset: QuerySet, text: str) -> QuerySet:
+    """
+    Отфильтровать объявления по поисковому запросу с использованием GIN индекса по `search_vector`
+
+    Запрос разбирается в формате websearch (кавычки, `-слово`, `or`), к объявлениям добавляется
+    релевантность `search_rank` (ts_rank)
+
+    :param queryset (QuerySet[Advert]) Объявления, среди которых производится поиск
+    :param text (str) Поисковый запрос пользователя
+    :return: QuerySet[Advert]
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+    return queryset.filter(search_vector=query).annotate(search_rank=SearchRank(F('search_vector'), query))
+
+
+def normalize_search_prefix(prefix: str) -> str:
+    """Привести введенный пользователем префикс к каноническому виду: нижний регистр, одиночные пробелы"""
+    return ' '.join(prefix.lower().split())
+
+
+def _find_title_suggestions(queryset: QuerySet, prefix: str, limit: int) -> List[str]:
+    # Оператор `%>` (word similarity) обслуживается GIN индексом по триграммам названия
+    titles = (
+        queryset.filter(title__trigram_word_similar=prefix)
+        .annotate(similarity=TrigramWordSimilarity(prefix, 'title'))
+        .order_by('-similarity', '-created_at')
+        .values_list('title', flat=True)[: limit * 2]
+    )
+
+    suggestions: List[str] = []
+    for title in titles:
+        if title not in suggestions:
+            suggestions.append(title)
+
+    return suggestions[:limit]
+
+
+def suggest_titles(queryset: QuerySet, prefix: str, limit: int) -> List[str]:
+    """
+    Подсказки названий объявлений по введенному префиксу с учетом опечаток (pg_trgm)
+
+    Результат кэшируется на `ADVERT_AUTOCOMPLETE_CACHE_TTL` секунд по нормализованному префиксу
+
+    :param queryset (QuerySet[Advert]) Объявления, среди которых ищутся подсказки
+    :param prefix (str) Введенная пользователем строка
+    :param limit (int) Максимальное количество подсказок
+    :return: список различных названий, от наиболее похожего к наименее
+    """
+    prefix = normalize_search_prefix(prefix)
+    if not prefix:
+        return []
+
+    key = AUTOCOMPLETE_CACHE_KEY.format(limit=limit, prefix_hash=hashlib.md5(prefix.encode()).hexdigest())
+
+    return cache.get_or_set(
+        key,
+        lambda: _find_title_suggestions(queryset, prefix, limit),
+        timeout=settings.ADVERT_AUTOCOMPLETE_CACHE_TTL,
+    )
@@ -1,6 +1,10 @@
+from typing import Optional
+
+from django.db.models import Prefetch, QuerySet, Subquery, Sum
 from rest_framework.exceptions import ValidationError
 
-from booking.models import Advert
+from authentication.models import Profile
+from booking.models import Advert, AdvertImage, AdvertStatus
 
 
 def get_advert_by_id(pk: int) -> Advert:
@@ -10,3 +14,50 @@ def get_advert_by_id(pk: int) -> Advert:
         raise ValidationError("Нет такого объявления")
 
     return advert
+
+
+def with_feed_relations(queryset: QuerySet[Advert]) -> QuerySet[Advert]:
+    """
+    Подгрузить связи, которые отдает AdvertSerializer, за фиксированное количество запросов
+
+    Продвижение, местоположение и контакт приходят JOIN'ом в основном запросе, фотографии - одним дополнительным запросом
+    на всю выборку, вместо запроса на каждое объявление
+    """
+    return queryset.select_related('promotion', 'place', 'contact__user').prefetch_related(
+        Prefetch('images', queryset=AdvertImage.objects.order_by('pk'))
+    )
+
+
+def get_feed_adverts(queryset: Optional[QuerySet[Advert]] = None) -> QuerySet[Advert]:
+    """Получить активные объявления ленты вместе со связями, нужными для сериализации"""
+    if queryset is None:
+        queryset = Advert.objects.all()
+
+    return with_feed_relations(queryset.filter(status=AdvertStatus.ACTIVE))
+
+
+def get_similar_adverts(advert_id: int, limit: int) -> QuerySet[Advert]:
+    """Похожие объявления из заранее посчитанных соседей, от наиболее похожего"""
+    return get_feed_adverts().filter(similar_to__advert_id=advert_id).order_by('-similar_to__score', '-id')[:limit]
+
+
+def get_personal_adverts(profile: Profile, limit: int, seed_likes: int) -> QuerySet[Advert]:
+    """
+    Персональная подборка: соседи последних `seed_likes` лайкнутых профилем объявлений, кроме уже лайкнутых.
+    Чем больше лайкнутых объявлений похожи на кандидата и чем сильнее, тем он выше
+
+    :param profile (Profile) Профиль, для которого строится подборка
+    :param limit (int) Размер подборки
+    :param seed_likes (int) Сколько последних лайков профиля учитывать
+    :return: QuerySet[Advert], пустой, если у профиля нет лайков или у лайкнутых нет соседей
+    """
+    liked = Profile.liked_adverts.through.objects.filter(profile_id=profile.pk)
+    seed = liked.order_by('-id').values('advert_id')[:seed_likes]
+
+    return (
+        get_feed_adverts()
+        .filter(similar_to__advert_id__in=Subquery(seed))
+        .exclude(pk__in=liked.values('advert_id'))
+        .annotate(personal_score=Sum('similar_to__score'))
+        .order_by('-personal_score', '-created_at', '-id')[:limit]
+    )
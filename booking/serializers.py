@@ -1,8 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
 from authentication.models import Profile
-from booking.models import Advert, Promotion, AdvertImage
+from booking.images import rendition_urls
+from booking.models import Advert, Promotion, AdvertImage, AdvertImport, AdvertUpload, Location
+from booking.ranking import STRATEGIES
 
 
 class AdvertContactSerializer(serializers.Serializer):
@@ -33,36 +36,109 @@ class PromotionSerializer(serializers.ModelSerializer):
         fields = ['type', 'rate', 'status']
 
 
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = ['id', 'name', 'latitude', 'longitude']
+
+
 class AdvertImageSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=True)
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = AdvertImage
-        fields = ['image']
+        fields = ['image', 'renditions']
+
+    def get_renditions(self, obj: AdvertImage) -> dict:
+        return rendition_urls(obj.renditions, obj.image.storage)
 
 
 class AdvertSerializer(serializers.ModelSerializer):
     promotion = PromotionSerializer(required=False, read_only=True)
     images = AdvertImageSerializer(many=True, required=False, read_only=True)
+    place = LocationSerializer(required=False, read_only=True)
     logo = serializers.CharField(required=False, allow_blank=True)
+    logo_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Advert
-        fields = '__all__'
+        exclude = ['search_vector', 'effective_rank']
+
+    def get_logo_renditions(self, obj: Advert) -> dict:
+        return rendition_urls(obj.logo_renditions, obj.logo.storage)
+
+
+class AdvertUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AdvertUpload
+        fields = ['token', 'file']
+        read_only_fields = ['token']
 
 
 class AdvertCreationSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор подачи объявления
+
+    Логотип передается либо в base64 (`logo`), либо токеном заранее загруженного изображения (`logo_upload`),
+    фотографии - токенами загрузок (`image_uploads`). Загрузки ищутся среди загрузок профиля из `context['profile']`
+    """
+
     images = AdvertImageSerializer(many=True, read_only=True)
-    logo = Base64ImageField(required=True)
+    logo = Base64ImageField(required=False)
+    logo_upload = serializers.UUIDField(required=False, write_only=True)
+    image_uploads = serializers.ListField(child=serializers.UUIDField(), required=False, write_only=True)
+
+    def validate(self, attrs):
+        if not attrs.get('logo') and not attrs.get('logo_upload'):
+            raise serializers.ValidationError({'logo': 'Нужно передать логотип или токен его загрузки'})
+
+        tokens = attrs.get('image_uploads', []) + ([attrs['logo_upload']] if attrs.get('logo_upload') else [])
+        uploads = {
+            upload.token: upload
+            for upload in AdvertUpload.objects.filter(token__in=tokens, owner=self.context.get('profile'))
+        }
+        missing = [str(token) for token in tokens if token not in uploads]
+        if missing:
+            raise serializers.ValidationError({'uploads': f'Загрузки не найдены: {", ".join(missing)}'})
+
+        if attrs.get('logo_upload'):
+            attrs['logo_upload'] = uploads[attrs['logo_upload']]
+        attrs['image_uploads'] = [uploads[token] for token in attrs.get('image_uploads', [])]
+        return attrs
 
     def create(self, validated_data):
+        logo_upload = validated_data.pop('logo_upload', None)
+        image_uploads = validated_data.pop('image_uploads', [])
+        if logo_upload is not None:
+            validated_data['logo'] = logo_upload.file.name
+
         advert = Advert.objects.create(**validated_data)
         advert.images.set([image.save() for image in validated_data.pop('images', [])])
+        AdvertImage.objects.bulk_create(
+            [AdvertImage(advert=advert, image=upload.file.name) for upload in image_uploads]
+        )
+
+        # Файлы теперь принадлежат объявлению, а сами загрузки больше не нужны
+        used = [upload.pk for upload in image_uploads] + ([logo_upload.pk] if logo_upload is not None else [])
+        AdvertUpload.objects.filter(pk__in=used).delete()
         return advert
 
     class Meta:
         model = Advert
-        fields = ['title', 'description', 'price', 'phone', 'location', 'status', 'logo', 'images']
+        fields = [
+            'title',
+            'description',
+            'price',
+            'phone',
+            'location',
+            'place',
+            'status',
+            'logo',
+            'images',
+            'logo_upload',
+            'image_uploads',
+        ]
 
 
 class AdvertUpdateSerializer(serializers.ModelSerializer):
@@ -71,6 +147,9 @@ class AdvertUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         instance.images.set([image.save() for image in validated_data.pop('images', [])])
+        if 'logo' in validated_data:
+            # Копии старого логотипа больше не подходят, новые сгенерирует фоновая задача
+            instance.logo_renditions = {}
         for field, value in validated_data.items():
             setattr(instance, field, value)
         instance.save()
@@ -78,13 +157,126 @@ class AdvertUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Advert
-        fields = ['title', 'description', 'price', 'phone', 'location', 'status', 'logo', 'images']
+        fields = ['title', 'description', 'price', 'phone', 'location', 'place', 'status', 'logo', 'images']
+
+
+class AdvertImportRowSerializer(serializers.ModelSerializer):
+    """
+    Строка файла импорта объявлений. Кроме полей объявления в строке могут быть ссылка на логотип (`logo_url`)
+    и ссылки на фотографии через пробел (`image_urls`)
+    """
+
+    logo_url = serializers.URLField(required=False)
+    image_urls = serializers.CharField(required=False)
+
+    def validate_image_urls(self, value: str) -> list:
+        urls = value.split()
+        field = serializers.URLField()
+        for url in urls:
+            field.run_validators(url)
+
+        return urls
+
+    class Meta:
+        model = Advert
+        fields = ['title', 'description', 'price', 'phone', 'location', 'status', 'logo_url', 'image_urls']
+
+
+class AdvertImportSerializer(serializers.ModelSerializer):
+    """Загрузка файла импорта объявлений и его прогресс"""
+
+    IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+
+    def validate_file(self, value):
+        if not value.name.lower().endswith(self.IMPORT_EXTENSIONS):
+            raise serializers.ValidationError('Поддерживаются только файлы .csv и .xlsx')
+
+        return value
+
+    class Meta:
+        model = AdvertImport
+        fields = [
+            'id',
+            'file',
+            'status',
+            'processed_rows',
+            'created_count',
+            'failed_count',
+            'errors',
+            'created_at',
+            'finished_at',
+        ]
+        read_only_fields = [field for field in fields if field != 'file']
+        extra_kwargs = {'file': {'write_only': True}}
+
+
+class AdvertBulkIdsSerializer(serializers.Serializer):
+    """Список идентификаторов объявлений для массовой операции"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.ADVERT_BULK_MAX_ITEMS
+    )
+
+
+class AdvertBulkPatchSerializer(serializers.ModelSerializer):
+    """Изменение одного объявления в массовом изменении: id объявления и те же поля, что в `AdvertUpdateSerializer`"""
+
+    id = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Advert
+        fields = ['id', 'title', 'description', 'price', 'phone', 'location', 'place', 'status']
+        extra_kwargs = {field: {'required': False} for field in fields if field != 'id'}
+
+
+class AdvertBulkUpdateSerializer(serializers.Serializer):
+    """
+    Массовое изменение объявлений. Изменения отдельных объявлений проверяются по одному, чтобы ошибка в одном
+    не отклоняла остальные (см. `AdvertBulkPatchSerializer`)
+    """
+
+    items = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=settings.ADVERT_BULK_MAX_ITEMS
+    )
 
 
 class SearchFilterSerializer(serializers.ModelSerializer):
     min_price = serializers.IntegerField(required=False)
     max_price = serializers.IntegerField(required=False)
+    latitude = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    longitude = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(required=False, min_value=0, max_value=settings.ADVERT_SEARCH_MAX_RADIUS_KM)
+    facets = serializers.BooleanField(required=False, default=False)
+    strategy = serializers.ChoiceField(choices=sorted(STRATEGIES), required=False)
 
     class Meta:
         model = Advert
-        fields = ['title', 'location', 'min_price', 'max_price']
+        fields = [
+            'title',
+            'location',
+            'min_price',
+            'max_price',
+            'latitude',
+            'longitude',
+            'radius_km',
+            'facets',
+            'strategy',
+        ]
+        extra_kwargs = {'title': {'required': False}, 'location': {'required': False}}
+
+    def validate(self, attrs):
+        geo_fields = [field for field in ('latitude', 'longitude', 'radius_km') if field in attrs]
+        if geo_fields and len(geo_fields) != 3:
+            raise serializers.ValidationError(
+                {'radius_km': 'Для поиска по расстоянию нужны latitude, longitude и radius_km'}
+            )
+
+        return attrs
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_limit(self, value: int) -> int:
+        return min(value, settings.ADVERT_AUTOCOMPLETE_MAX_LIMIT)
@@ -1,18 +1,31 @@
 from datetime import datetime
-from typing import Type, Optional, Union
+from functools import partial
+from typing import Dict, List, Optional, Set, Type, Union
 
 import structlog
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Subquery, IntegerField, Value, OuterRef, QuerySet
-from django.db.models.functions import Coalesce
+from django.db.models import QuerySet
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
 from rest_framework.response import Response
 
 from common.helpers.datetime import renew_for_month
 from common.service import RestService
 from authentication.models import Profile
 from booking.models import Advert, AdvertStatus, Promotion, Boost, PromotionStatus
+from booking.facets import get_facets
+from booking.geo import within_radius
+from booking.pagination import AdvertFeedCursorPagination
+from booking.ranking import RankingStrategy, get_strategy
+from booking.search import SEARCH_VECTOR_WEIGHTS, search_adverts, update_search_vector
+from booking.selectors.advert import get_feed_adverts, get_personal_adverts, get_similar_adverts, with_feed_relations
+from booking.signals import notify_advert_changed
+from booking.tasks import process_advert_images_task
 from booking.serializers import (
+    AdvertBulkPatchSerializer,
     SearchFilterSerializer,
     AdvertSerializer,
     AdvertCreationSerializer,
@@ -32,6 +45,11 @@ ADVERTS_NOT_FOUND = Response(
 PROMOTION_NOT_FOUND = Response({"err_msg": "Не указано объявление или пользователь"}, status=status.HTTP_404_NOT_FOUND)
 
 
+def process_images_on_commit(advert_id: int) -> None:
+    """Поставить в очередь генерацию уменьшенных копий изображений объявления после коммита"""
+    transaction.on_commit(partial(process_advert_images_task.delay, advert_id))
+
+
 class AdvertService(RestService):
     """
     Класс, реализующий бизнес логику работы с объявлениями
@@ -71,9 +89,14 @@ class AdvertService(RestService):
             self.not_found()
             return self
 
+        # Срок публикации продлевается при каждой активации, иначе ранее истекшее объявление
+        # снова снимется с публикации при ближайшем запуске expire_adverts
+        now = timezone.now()
         self.advert.status = AdvertStatus.ACTIVE
-        self.advert.activated_at = datetime.now()
+        self.advert.activated_at = now
+        self.advert.active_until = renew_for_month(now)
         self.advert.save()
+        notify_advert_changed(AdvertService, self.advert.pk)
         return self
 
     @transaction.atomic
@@ -85,6 +108,7 @@ class AdvertService(RestService):
         self.advert.status = AdvertStatus.DISABLED
         self.advert.activated_at = None
         self.advert.save()
+        notify_advert_changed(AdvertService, self.advert.pk)
         return self
 
     @transaction.atomic
@@ -103,6 +127,8 @@ class AdvertService(RestService):
 
         changed_data.instance = self.advert
         self.advert = changed_data.save()
+        notify_advert_changed(AdvertService, self.advert.pk)  # type: ignore[union-attr]
+        process_images_on_commit(self.advert.pk)  # type: ignore[union-attr]
         return self
 
     @transaction.atomic
@@ -113,6 +139,7 @@ class AdvertService(RestService):
             return self
 
         self.advert = None
+        notify_advert_changed(AdvertService, advert.pk)
         advert.delete()
         return self
 
@@ -134,7 +161,9 @@ class AdvertService(RestService):
         :param user_profile (Profile) Профиль юзера, которому принадлежит объявление
         :return: AdvertService
         """
-        advert: Optional[Advert] = Advert.objects.filter(id=advert_pk, contact=user_profile).first()
+        advert: Optional[Advert] = with_feed_relations(
+            Advert.objects.filter(id=advert_pk, contact=user_profile)
+        ).first()
 
         if advert is None:
             return AdvertService().not_found()
@@ -162,7 +191,11 @@ class AdvertService(RestService):
             validated_data['activated_at'] = datetime.now()
             validated_data['active_until'] = renew_for_month(datetime.now())
 
-        return AdvertService(advert_serialized_data.save(contact=contact))
+        advert = advert_serialized_data.save(contact=contact)
+        notify_advert_changed(AdvertService, advert.pk)
+        process_images_on_commit(advert.pk)
+
+        return AdvertService(advert)
 
     def created(self) -> 'AdvertService':
         """
@@ -187,15 +220,150 @@ class AdvertService(RestService):
         return self
 
 
+class AdvertBulkService(RestService):
+    """
+    Класс, реализующий массовое управление объявлениями одного профиля (например, парком техники компании)
+
+    Каждая операция выполняется в одной транзакции несколькими запросами на весь список объявлений, вместо
+    отдельного запроса и транзакции на каждое. Ответ - результат по каждому переданному объявлению:
+    `{'results': [{'id': ..., 'result': ...}, ...]}`. Объявления, которых нет у профиля, получают результат
+    `not_found` и не мешают обработке остальных
+
+    Fields:
+        + profile (Profile): Профиль владельца объявлений
+
+    Methods:
+        + activate(ids): Активировать объявления
+        + deactivate(ids): Деактивировать объявления
+        + change(items): Изменить поля объявлений
+        + remove(ids): Удалить объявления
+    """
+
+    NOT_FOUND = 'not_found'
+    INVALID = 'invalid'
+
+    def __init__(self, profile: Profile, response: Optional[Response] = None, should_commit: bool = True):
+        super().__init__(response, should_commit)
+        self.__profile = profile
+
+    @property
+    def profile(self) -> Profile:
+        return self.__profile
+
+    def _lock(self, ids: List[int]) -> QuerySet[Advert]:
+        """Объявления профиля из списка, заблокированные до конца транзакции"""
+        return Advert.objects.select_for_update().filter(contact=self.profile, pk__in=ids).order_by('pk')
+
+    def _respond(self, ids: List[int], found: Set[int], result: str) -> 'AdvertBulkService':
+        for advert_id in found:
+            notify_advert_changed(AdvertBulkService, advert_id)
+
+        return self.ok(
+            {'results': [{'id': pk, 'result': result if pk in found else self.NOT_FOUND} for pk in dict.fromkeys(ids)]}
+        )
+
+    def _set_status(self, ids: List[int], result: str, **fields) -> 'AdvertBulkService':
+        adverts = self._lock(ids)
+        found = set(adverts.values_list('pk', flat=True))
+        Advert.objects.filter(pk__in=found).update(**fields)
+
+        return self._respond(ids, found, result)
+
+    @staticmethod
+    def _status_fields(advert_status: str) -> dict:
+        """Поля, которые меняются вместе со статусом: как в `AdvertService.activate` и `AdvertService.deactivate`"""
+        if advert_status == AdvertStatus.ACTIVE:
+            now = timezone.now()
+            return {'status': advert_status, 'activated_at': now, 'active_until': renew_for_month(now)}
+        if advert_status == AdvertStatus.DISABLED:
+            return {'status': advert_status, 'activated_at': None}
+
+        return {'status': advert_status}
+
+    @transaction.atomic
+    def activate(self, ids: List[int]) -> 'AdvertBulkService':
+        return self._set_status(ids, 'activated', **self._status_fields(AdvertStatus.ACTIVE))
+
+    @transaction.atomic
+    def deactivate(self, ids: List[int]) -> 'AdvertBulkService':
+        return self._set_status(ids, 'deactivated', **self._status_fields(AdvertStatus.DISABLED))
+
+    @transaction.atomic
+    def remove(self, ids: List[int]) -> 'AdvertBulkService':
+        adverts = self._lock(ids)
+        found = set(adverts.values_list('pk', flat=True))
+        Advert.objects.filter(pk__in=found).delete()
+
+        return self._respond(ids, found, 'deleted')
+
+    @transaction.atomic
+    def change(self, items: List[dict]) -> 'AdvertBulkService':
+        """
+        Метод массового изменения объявлений: все изменения записываются одним `bulk_update`
+
+        :param items (list) Изменения объявлений, каждое - id объявления и новые значения полей
+        :return: AdvertBulkService
+        """
+        patches: Dict[int, dict] = {}
+        errors: Dict[int, dict] = {}
+        results = []
+
+        for item in items:
+            serializer = AdvertBulkPatchSerializer(data=item)
+            if not serializer.is_valid():
+                results.append({'id': item.get('id'), 'result': self.INVALID, 'errors': serializer.errors})
+                continue
+
+            patch = dict(serializer.validated_data)
+            advert_id = patch.pop('id')
+            if 'status' in patch:
+                patch.update(self._status_fields(patch['status']))
+            if advert_id in patches:
+                errors[advert_id] = {'id': ['Объявление изменяется в запросе несколько раз']}
+            patches[advert_id] = patch
+            results.append({'id': advert_id})
+
+        valid = {advert_id: patch for advert_id, patch in patches.items() if advert_id not in errors}
+        adverts = list(self._lock(list(valid)))
+        fields = sorted({field for advert in adverts for field in valid[advert.pk]})
+
+        for advert in adverts:
+            for field, value in valid[advert.pk].items():
+                setattr(advert, field, value)
+
+        if adverts and fields:
+            Advert.objects.bulk_update(adverts, fields, batch_size=settings.ADVERT_BULK_MAX_ITEMS)
+            if set(fields) & set(SEARCH_VECTOR_WEIGHTS):
+                update_search_vector(Advert.objects.filter(pk__in=[advert.pk for advert in adverts]))
+
+        found = {advert.pk for advert in adverts}
+        for advert_id in found:
+            notify_advert_changed(AdvertBulkService, advert_id)
+
+        for result in results:
+            advert_id = result['id']
+            if 'result' in result:
+                continue
+            if advert_id in errors:
+                result.update(result=self.INVALID, errors=errors[advert_id])
+            else:
+                result['result'] = 'updated' if advert_id in found else self.NOT_FOUND
+
+        return self.ok({'results': results})
+
+
 class AdvertsRecommendationService(RestService):
     def __init__(
         self,
         adverts: Optional[QuerySet[Advert]] = None,
         response: Optional[Response] = None,
         should_commit: bool = True,
+        filtered: Optional[QuerySet[Advert]] = None,
     ):
         super().__init__(response, should_commit)
         self.__adverts = adverts
+        # Вся отфильтрованная выборка, если `adverts` - ее ограниченная часть (см. `RankingStrategy.bounded`)
+        self.__filtered = filtered
 
     @property
     def adverts(self) -> Optional[QuerySet[Advert]]:
@@ -214,13 +382,33 @@ class AdvertsRecommendationService(RestService):
         if self.adverts is None or len(self.adverts) == 0:
             return self.not_found()
 
-        serialized_queryset = serializer(self.adverts.values(), many=True)
+        serialized_queryset = serializer(self.adverts, many=True)
         self.ok(serialized_queryset.data)
 
         logger.debug('serialized adverts queryset', data=serialized_queryset.data, response=self.response)
 
         return self
 
+    @transaction.atomic
+    def paginate(
+        self, paginator: BasePagination, request: Request, serializer: Type[AdvertSerializer]
+    ) -> 'AdvertsRecommendationService':
+        """
+        Метод, отдающий одну страницу ленты вместо всего набора объявлений
+
+        :param paginator (BasePagination) Пагинатор ленты
+        :param request (Request) Запрос, из которого берутся курсор и размер страницы
+        :param serializer (AdvertSerializer) Сериализатор объявлений страницы
+        :return: AdvertsRecommendationService
+        """
+        if self.adverts is None:
+            return self.not_found()
+
+        page = paginator.paginate_queryset(self.adverts, request)
+        self.response = paginator.get_paginated_response(serializer(page, many=True).data)
+
+        return self
+
     @transaction.atomic
     def view_ad(self, pk: int, profile: Profile):
         return self._get(pk, profile)
@@ -228,42 +416,100 @@ class AdvertsRecommendationService(RestService):
     @staticmethod
     @transaction.atomic
     def list():
-        queryset = Advert.objects.filter(status=AdvertStatus.ACTIVE)
+        queryset = get_feed_adverts()
 
         return AdvertsRecommendationService(queryset).ok()  # TODO: what the hack is this warnings?
 
     @staticmethod
     @transaction.atomic
-    def ranked_list(filters: SearchFilterSerializer):
+    def ranked_list(filters: SearchFilterSerializer, strategy: Optional[RankingStrategy] = None):
+        """
+        Метод поиска объявлений с фильтрацией
+
+        Поиск по тексту идет через полнотекстовый индекс (`search_vector`), найденные объявления ранжируются
+        сначала по score стратегии ранжирования (по умолчанию - уровень продвижения `effective_rank`),
+        затем по релевантности (ts_rank) и дате создания
+        Если переданы координаты и `radius_km`, остаются только объявления не дальше `radius_km` от точки
+
+        :param filters (SearchFilterSerializer) Провалидированные параметры поиска
+        :param strategy (RankingStrategy) Стратегия ранжирования
+        :return: AdvertsRecommendationService
+        """
+        strategy = strategy or get_strategy(None)
         valid_data = filters.validated_data
-        queryset = (
-            Advert.objects.filter(
-                **{
-                    k: v
-                    for k, v in {
-                        'price__gte': valid_data.get('min_price', None),
-                        'price__lte': valid_data.get('max_price', None),
-                    }.items()
-                    if v is not None
-                },
-                title__icontains=valid_data.get('title', ''),
-                status=AdvertStatus.ACTIVE,
-            )
-            .annotate(
-                promotion_rate=Coalesce(
-                    Subquery(
-                        Promotion.objects.filter(advert=OuterRef('pk')).values('rate')[:1], output_field=IntegerField()
-                    ),
-                    Value(0),
-                )
-            )
-            .order_by('-promotion_rate', '-created_at')
+        queryset = get_feed_adverts().filter(
+            **{
+                k: v
+                for k, v in {
+                    'price__gte': valid_data.get('min_price', None),
+                    'price__lte': valid_data.get('max_price', None),
+                }.items()
+                if v is not None
+            },
         )
 
-        if len(queryset) == 0 or queryset is None:
+        if 'radius_km' in valid_data:
+            queryset = within_radius(queryset, valid_data['latitude'], valid_data['longitude'], valid_data['radius_km'])
+
+        ordering = strategy.ordering
+
+        search_text = valid_data.get('title', '').strip()
+        if search_text:
+            queryset = search_adverts(queryset, search_text)
+            ordering = (ordering[0], '-search_rank', *ordering[1:])
+
+        ranked = strategy.rank(queryset).order_by(*ordering)
+
+        if len(ranked) == 0 or ranked is None:
             return AdvertsRecommendationService().not_found()
 
-        return AdvertsRecommendationService(queryset).ok()  # TODO: what the hack is this warnings?
+        return AdvertsRecommendationService(ranked, filtered=queryset).ok()  # TODO: what the hack is this warnings?
+
+    @staticmethod
+    @transaction.atomic
+    def similar(advert_id: int):
+        """
+        Метод, отдающий объявления, похожие на данное (по совместным лайкам)
+
+        :param advert_id (int) id объявления
+        :return: AdvertsRecommendationService
+        """
+        return AdvertsRecommendationService(get_similar_adverts(advert_id, settings.ADVERT_RECOMMENDATIONS_LIMIT)).ok()
+
+    @staticmethod
+    @transaction.atomic
+    def personal(profile: Profile):
+        """
+        Метод, отдающий персональную подборку объявлений для профиля
+
+        Подборка собирается из похожих на лайкнутые профилем объявлений. Если собрать ее не из чего
+        (профиль еще ничего не лайкал), отдается начало обычной ленты
+
+        :param profile (Profile) Профиль пользователя
+        :return: AdvertsRecommendationService
+        """
+        limit = settings.ADVERT_RECOMMENDATIONS_LIMIT
+        queryset = get_personal_adverts(profile, limit, settings.ADVERT_PERSONAL_FEED_SEED_LIKES)
+
+        if not queryset:
+            queryset = get_feed_adverts().order_by(*AdvertFeedCursorPagination.ordering)[:limit]
+
+        return AdvertsRecommendationService(queryset).ok()
+
+    def with_facets(self, filters: dict) -> 'AdvertsRecommendationService':
+        """
+        Добавить к сериализованным объявлениям разрезы по ним: ответ становится `{'results': [...], 'facets': {...}}`
+
+        Разрезы считаются по всей отфильтрованной выборке, даже если стратегия ранжирования отдала только ее часть
+
+        :param filters (dict) Провалидированные параметры фильтра, по которым получены объявления
+        :return: AdvertsRecommendationService
+        """
+        if self.response is not None and self.response.status_code == status.HTTP_200_OK and self.adverts is not None:
+            adverts = self.adverts if self.__filtered is None else self.__filtered
+            self.response.data = {'results': self.response.data, 'facets': get_facets(adverts, filters)}
+
+        return self
 
     def not_found(self) -> 'AdvertsRecommendationService':
         """
@@ -286,8 +532,12 @@ class PromotionService(RestService):
 
     Methods:
         + boost(): Повысить уровень продвижения объявления
+        + disable(): Отключить продвижение
+        + remove(): Удалить продвижение
         + find():
         + promote(): Продвинуть объявление
+
+    Все методы, меняющие продвижение, синхронизируют `Advert.effective_rank`, по которому сортируется лента
     """
 
     def __init__(
@@ -304,6 +554,17 @@ class PromotionService(RestService):
     def promotion(self, promotion: Promotion) -> None:
         self.__promotion = promotion
 
+    @staticmethod
+    def _sync_advert_rank(promotion: Promotion, rank: Optional[int] = None) -> None:
+        """Записать в продвигаемое объявление актуальный ранг (по умолчанию - `promotion.effective_rate`)"""
+        advert_ids = list(Advert.objects.filter(promotion=promotion).values_list('pk', flat=True))
+        Advert.objects.filter(pk__in=advert_ids).update(
+            effective_rank=promotion.effective_rate if rank is None else rank
+        )
+
+        for advert_id in advert_ids:
+            notify_advert_changed(PromotionService, advert_id)
+
     @transaction.atomic
     def boost(self, how_to_boost: Boost) -> 'PromotionService':
         promotion: Optional[Promotion] = self.promotion
@@ -313,6 +574,7 @@ class PromotionService(RestService):
 
         promotion = how_to_boost.boost(promotion=promotion)
         promotion.save()  # type: ignore
+        self._sync_advert_rank(promotion)
         return self
 
     @transaction.atomic
@@ -324,6 +586,7 @@ class PromotionService(RestService):
 
         promotion.status = PromotionStatus.DISABLED
         promotion.save()
+        self._sync_advert_rank(promotion)
         return self
 
     @transaction.atomic
@@ -334,6 +597,7 @@ class PromotionService(RestService):
             return self
 
         self.promotion = None  # type: ignore[assignment]
+        self._sync_advert_rank(promotion, rank=0)
         promotion.delete()
         return self
 
@@ -399,10 +663,13 @@ class PromotionService(RestService):
             promotion = Promotion.objects.create(
                 type=type,
                 rate=rate,
+                status=PromotionStatus.ACTIVE,
             )
 
             advert.promotion = promotion
-            advert.save(update_fields=["promotion"])
+            advert.effective_rank = promotion.effective_rate
+            advert.save(update_fields=["promotion", "effective_rank"])
+            notify_advert_changed(PromotionService, advert.pk)
 
         elif user_profile and advert_pk:
             promotion = Promotion.objects.create(
@@ -0,0 +1,21 @@
+from functools import partial
+
+from django.db import transaction
+from django.dispatch import Signal
+
+# Отправляется после коммита любого изменения объявления или его продвижения, влияющего на ленту
+# Аргументы: advert_id (int) - идентификатор измененного объявления
+advert_changed = Signal()
+
+
+def notify_advert_changed(sender: type, advert_id: int) -> None:
+    """
+    Отправить `advert_changed` после коммита текущей транзакции
+
+    Если транзакция откатится, подписчики (кэш ленты и т.п.) ничего не узнают, а если сигнал отправить сразу,
+    они могут успеть перечитать из бд еще не закоммиченное состояние
+
+    :param sender (type) Класс сервиса, изменившего объявление
+    :param advert_id (int) Идентификатор измененного объявления
+    """
+    transaction.on_commit(partial(advert_changed.send, sender=sender, advert_id=advert_id))
@@ -0,0 +1,64 @@
+from typing import List, Optional
+
+from django.conf import settings
+
+from DjangoServer import celery_app
+from booking.counters import flush_advert_likes, flush_advert_views
+from booking.expiry import expire_adverts
+from booking.feed import FeedSnapshot
+from booking.images import process_advert_images
+from booking.imports import download_advert_images, run_advert_import
+from booking.recommendations import rebuild_advert_neighbours
+from booking.uploads import delete_stale_uploads
+
+
+@celery_app.task
+def flush_advert_views_task():
+    return flush_advert_views(batch_size=settings.ADVERT_VIEWS_FLUSH_BATCH_SIZE)
+
+
+@celery_app.task
+def flush_advert_likes_task():
+    return flush_advert_likes(batch_size=settings.ADVERT_LIKES_FLUSH_BATCH_SIZE)
+
+
+@celery_app.task
+def expire_adverts_task():
+    return expire_adverts(
+        batch_size=settings.ADVERT_EXPIRY_BATCH_SIZE,
+        max_batches=settings.ADVERT_EXPIRY_MAX_BATCHES,
+    )
+
+
+@celery_app.task
+def process_advert_images_task(advert_id: int):
+    return process_advert_images(advert_id)
+
+
+@celery_app.task
+def delete_stale_uploads_task():
+    return delete_stale_uploads(ttl=settings.ADVERT_UPLOAD_TTL)
+
+
+@celery_app.task
+def rebuild_feed_snapshot_task():
+    return FeedSnapshot().rebuild()
+
+
+@celery_app.task
+def rebuild_advert_neighbours_task():
+    return rebuild_advert_neighbours(
+        top_k=settings.ADVERT_SIMILARITY_TOP_K,
+        max_profile_likes=settings.ADVERT_SIMILARITY_MAX_PROFILE_LIKES,
+    )
+
+
+@celery_app.task
+def import_adverts_task(import_id: int):
+    progress = run_advert_import(import_id)
+    return None if progress is None else progress.created
+
+
+@celery_app.task
+def download_advert_images_task(advert_id: int, logo_url: Optional[str], image_urls: List[str]):
+    return download_advert_images(advert_id, logo_url, image_urls)
@@ -2,16 +2,8 @@ import pytest
 
 from authentication.models import Profile
 from booking.models import Advert
-from booking.tests.factories import AdvertFactory
-from review.tests.conftest import save_profile_object
-
-
-def save_advert_object(advert: Advert) -> None:
-    """Сохранить объект объявления, созданный фикстурой в бд"""
-    if advert.promotion:
-        advert.promotion.save()
-    save_profile_object(advert.contact)
-    advert.save()
+from booking.tasks import rebuild_feed_snapshot_task
+from booking.tests.factories import AdvertFactory, save_advert_object  # noqa: F401 (импортируется тестами отсюда)
 
 
 @pytest.fixture
@@ -24,3 +16,15 @@ def auth_profile_advert(auth_profile: Profile) -> Advert:
 def advert() -> Advert:
     """Фикстура объявления"""
     return AdvertFactory()
+
+
+@pytest.fixture
+def media_root(settings, tmp_path) -> None:
+    """Фикстура, складывающая загруженные в тестах файлы во временный каталог"""
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.fixture(autouse=True)
+def feed_snapshot_task(mocker):
+    """Фикстура, не отправляющая пересборку снапшота ленты в брокер: в тестах снапшот строится явно"""
+    return mocker.patch.object(rebuild_feed_snapshot_task, 'delay')
@@ -4,14 +4,15 @@ import factory
 from factory import fuzzy, SubFactory
 
 from authentication.tests.factories import ProfileFactory
-from booking.models import Advert, Promotion
+from booking.models import Advert, AdvertUpload, Promotion
+from review.tests.conftest import save_profile_object
 
 
 class PromotionFactory(factory.Factory):
     """Фабрика модели Promotion"""
 
     type = fuzzy.FuzzyText()
-    description = fuzzy.FuzzyText()
+    rate = fuzzy.FuzzyInteger(0, 10)
 
     class Meta:
         model = Promotion
@@ -30,3 +31,21 @@ class AdvertFactory(factory.Factory):
 
     class Meta:
         model = Advert
+
+
+class UploadFactory(factory.Factory):
+    """Фабрика модели AdvertUpload"""
+
+    owner = SubFactory(ProfileFactory)
+    file = factory.django.ImageField()
+
+    class Meta:
+        model = AdvertUpload
+
+
+def save_advert_object(advert: Advert) -> None:
+    """Сохранить объект объявления, созданный фикстурой в бд"""
+    if advert.promotion:
+        advert.promotion.save()
+    save_profile_object(advert.contact)
+    advert.save()
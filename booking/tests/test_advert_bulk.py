@@ -0,0 +1,218 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from authentication.models import Profile
+from booking.expiry import expire_adverts
+from booking.models import Advert, AdvertStatus
+from booking.search import search_adverts
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertBulk:
+    """Тесты на массовое управление объявлениями"""
+
+    ADVERTS_BULK_ACTIVATE_URL = '/api/posts/bulk/activate/'
+    ADVERTS_BULK_DEACTIVATE_URL = '/api/posts/bulk/deactivate/'
+    ADVERTS_BULK_UPDATE_URL = '/api/posts/bulk/update/'
+    ADVERTS_BULK_DESTROY_URL = '/api/posts/bulk/delete/'
+
+    def _save_adverts(self, contact: Profile, count: int, **kwargs) -> list[Advert]:
+        adverts = [AdvertFactory(contact=contact, **kwargs) for _ in range(count)]
+        for advert in adverts:
+            save_advert_object(advert)
+        return adverts
+
+    def test_bulk_activate(self, auth_client: APIClient, auth_profile: Profile, profile: Profile):
+        """
+        Arrange: Неактивные объявления пользователя и объявление другого профиля
+        Act: Массовая активация своих объявлений, чужого и несуществующего
+        Assert: Активированы только свои объявления, по каждому id свой результат
+        """
+        own = self._save_adverts(auth_profile, 2, status=AdvertStatus.DISABLED)
+        (foreign,) = self._save_adverts(profile, 1, status=AdvertStatus.DISABLED)
+        ids = [own[0].pk, foreign.pk, own[1].pk, 0xFFFFFF]
+
+        response = auth_client.patch(self.ADVERTS_BULK_ACTIVATE_URL, {'ids': ids}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [  # type: ignore[index]
+            {'id': own[0].pk, 'result': 'activated'},
+            {'id': foreign.pk, 'result': 'not_found'},
+            {'id': own[1].pk, 'result': 'activated'},
+            {'id': 0xFFFFFF, 'result': 'not_found'},
+        ]
+        assert set(Advert.objects.filter(status=AdvertStatus.ACTIVE).values_list('pk', flat=True)) == {
+            own[0].pk,
+            own[1].pk,
+        }
+        assert Advert.objects.filter(pk=own[0].pk, activated_at__isnull=False).exists()
+
+    def test_bulk_activate_renews_expired(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Объявление пользователя, снятое с публикации по истечении срока
+        Act: Массовая активация объявления и снятие с публикации истекших объявлений
+        Assert: Срок публикации продлен, объявление остается активным
+        """
+        (advert,) = self._save_adverts(
+            auth_profile, 1, status=AdvertStatus.DISABLED, active_until=timezone.now() - timedelta(days=1)
+        )
+
+        auth_client.patch(self.ADVERTS_BULK_ACTIVATE_URL, {'ids': [advert.pk]}, format='json')
+
+        assert expire_adverts(batch_size=10, max_batches=1) == 0
+        advert.refresh_from_db()
+        assert advert.status == AdvertStatus.ACTIVE
+        assert advert.active_until > timezone.now() + timedelta(days=27)
+
+    def test_bulk_update_status(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Истекшее неактивное и активное объявления пользователя
+        Act: Массовое изменение статуса: первое активируется, второе деактивируется
+        Assert: Поля публикации меняются так же, как при активации и деактивации
+        """
+        expired, active = self._save_adverts(auth_profile, 2, active_until=timezone.now() - timedelta(days=1))
+        Advert.objects.filter(pk=expired.pk).update(status=AdvertStatus.DISABLED, activated_at=None)
+        Advert.objects.filter(pk=active.pk).update(status=AdvertStatus.ACTIVE, activated_at=timezone.now())
+
+        response = auth_client.patch(
+            self.ADVERTS_BULK_UPDATE_URL,
+            {
+                'items': [
+                    {'id': expired.pk, 'status': AdvertStatus.ACTIVE},
+                    {'id': active.pk, 'status': AdvertStatus.DISABLED},
+                ]
+            },
+            format='json',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        expired.refresh_from_db()
+        active.refresh_from_db()
+        assert expired.status == AdvertStatus.ACTIVE and expired.activated_at is not None
+        assert expired.active_until > timezone.now() + timedelta(days=27)
+        assert active.status == AdvertStatus.DISABLED and active.activated_at is None
+
+    def test_bulk_deactivate(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Активные объявления пользователя
+        Act: Массовая деактивация
+        Assert: Объявления деактивированы
+        """
+        adverts = self._save_adverts(auth_profile, 3, status=AdvertStatus.ACTIVE)
+
+        response = auth_client.patch(
+            self.ADVERTS_BULK_DEACTIVATE_URL, {'ids': [advert.pk for advert in adverts]}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not Advert.objects.filter(status=AdvertStatus.ACTIVE).exists()
+
+    def test_bulk_query_count_does_not_grow(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Объявления пользователя
+        Act: Массовая активация одного и многих объявлений
+        Assert: Количество запросов не зависит от количества объявлений
+        """
+        adverts = self._save_adverts(auth_profile, 10, status=AdvertStatus.DISABLED)
+
+        with CaptureQueriesContext(connection) as single:
+            auth_client.patch(self.ADVERTS_BULK_ACTIVATE_URL, {'ids': [adverts[0].pk]}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            auth_client.patch(self.ADVERTS_BULK_ACTIVATE_URL, {'ids': [a.pk for a in adverts]}, format='json')
+
+        assert len(many) == len(single)
+
+    def test_bulk_destroy(self, auth_client: APIClient, auth_profile: Profile, profile: Profile):
+        """
+        Arrange: Объявления пользователя и объявление другого профиля
+        Act: Массовое удаление своих и чужого объявлений
+        Assert: Удалены только свои объявления
+        """
+        own = self._save_adverts(auth_profile, 2)
+        (foreign,) = self._save_adverts(profile, 1)
+
+        response = auth_client.post(
+            self.ADVERTS_BULK_DESTROY_URL, {'ids': [own[0].pk, own[1].pk, foreign.pk]}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['result'] for item in response.data['results']] == [  # type: ignore[index]
+            'deleted',
+            'deleted',
+            'not_found',
+        ]
+        assert list(Advert.objects.values_list('pk', flat=True)) == [foreign.pk]
+
+    def test_bulk_update(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Объявления пользователя
+        Act: Массовое изменение с корректными, некорректными и повторяющимися элементами
+        Assert: Применены только корректные изменения, поисковый вектор пересчитан, по каждому элементу свой результат
+        """
+        first, second, third = self._save_adverts(auth_profile, 3, price=100)
+
+        response = auth_client.patch(
+            self.ADVERTS_BULK_UPDATE_URL,
+            {
+                'items': [
+                    {'id': first.pk, 'price': 200, 'title': 'Бульдозер'},
+                    {'id': second.pk, 'price': 'дорого'},
+                    {'id': third.pk, 'price': 300},
+                    {'id': third.pk, 'price': 400},
+                    {'price': 500},
+                ]
+            },
+            format='json',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data['results']  # type: ignore[index]
+        assert [item['result'] for item in results] == ['updated', 'invalid', 'invalid', 'invalid', 'invalid']
+        assert 'price' in results[1]['errors']
+
+        first.refresh_from_db()
+        assert (first.price, first.title) == (200, 'Бульдозер')
+        assert set(Advert.objects.filter(price=100).values_list('pk', flat=True)) == {second.pk, third.pk}
+        assert list(search_adverts(Advert.objects.all(), 'бульдозер').values_list('pk', flat=True)) == [first.pk]
+
+    @pytest.mark.parametrize('data', ({}, {'ids': []}, {'ids': ['один']}))
+    def test_bulk_invalid_request(self, auth_client: APIClient, data: dict):
+        """
+        Arrange: -
+        Act: Массовая активация с некорректным телом запроса
+        Assert: 422 ошибка
+        """
+        response = auth_client.patch(self.ADVERTS_BULK_ACTIVATE_URL, data, format='json')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_bulk_too_many_items(self, auth_client: APIClient, settings):
+        """
+        Arrange: Ограничение на количество объявлений в запросе
+        Act: Массовая активация большего количества объявлений
+        Assert: 422 ошибка
+        """
+        response = auth_client.patch(
+            self.ADVERTS_BULK_ACTIVATE_URL, {'ids': list(range(1, settings.ADVERT_BULK_MAX_ITEMS + 2))}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_bulk_unauthorized(self, api_client: APIClient):
+        """
+        Arrange: -
+        Act: Массовая активация без авторизации
+        Assert: 401 ошибка
+        """
+        response = api_client.patch(self.ADVERTS_BULK_ACTIVATE_URL, {'ids': [1]}, format='json')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,90 @@
+import pytest
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from booking.cache import ADVERT_VERSION_KEY, LOCK_KEY, _bump_version, _get_or_compute, _get_version
+from booking.models import AdvertStatus
+from booking.tests.factories import AdvertFactory, save_advert_object
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertResponseCache:
+
+    ADVERT_RECOMMENDATION_LIST_URL = '/api/adverts/'
+    ADVERT_RECOMMENDATION_RETRIEVE_URL = '/api/adverts/{id}/'
+
+    def test_feed_page_cached_per_host(self, api_client: APIClient):
+        """
+        Arrange: Два активных объявления, страница ленты уже запрошена с подставным Host
+        Act: Тот же запрос страницы с настоящим Host
+        Assert: Ссылка на следующую страницу ведет на настоящий хост, а не на подставной
+        """
+        for _ in range(2):
+            save_advert_object(AdvertFactory(status=AdvertStatus.ACTIVE))
+        params = {'page_size': 1}
+
+        forged = api_client.get(self.ADVERT_RECOMMENDATION_LIST_URL, params, HTTP_HOST='attacker.example')
+        response = api_client.get(self.ADVERT_RECOMMENDATION_LIST_URL, params, HTTP_HOST='testserver')
+
+        assert forged.data['next'].startswith('http://attacker.example/')  # type: ignore[index]
+        assert response.data['next'].startswith('http://testserver/')  # type: ignore[index]
+
+    def test_missing_advert_does_not_create_version(self, api_client: APIClient):
+        """
+        Arrange: Объявления нет в бд
+        Act: Запрос объявления анонимным пользователем
+        Assert: Версия объявления в кэше не заведена
+        """
+        api_client.get(self.ADVERT_RECOMMENDATION_RETRIEVE_URL.format(id=100500))
+
+        assert cache.get(ADVERT_VERSION_KEY.format(advert_id=100500)) is None
+
+    def test_error_response_cached_briefly(self, settings, mocker):
+        """
+        Arrange: Ответ с ошибкой
+        Act: Два обращения к кэшу по одному ключу
+        Assert: Ответ посчитан один раз и закэширован на ADVERT_CACHE_ERROR_TTL секунд
+        """
+        key = 'adverts:detail:100500:v0'
+        compute = mocker.Mock(return_value=(status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'}))
+        cache_set = mocker.spy(cache, 'set')
+
+        results = [_get_or_compute(key, 'detail', compute) for _ in range(2)]
+
+        assert results == [(status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'})] * 2
+        assert compute.call_count == 1
+        cache_set.assert_called_once_with(key, results[0], timeout=settings.ADVERT_CACHE_ERROR_TTL)
+
+    def test_version_expires(self):
+        """
+        Arrange: Версия объявления поднята
+        Act: Версия истекает
+        Assert: Версия читается как 0, следующее изменение снова ее поднимает
+        """
+        version_key = ADVERT_VERSION_KEY.format(advert_id=1)
+        _bump_version(version_key)
+        assert _get_version(version_key) == 1
+
+        cache.delete(version_key)
+        assert _get_version(version_key) == 0
+
+        _bump_version(version_key)
+        assert _get_version(version_key) == 1
+
+    def test_waiter_computes_after_lock_released(self, mocker):
+        """
+        Arrange: Ответ считает другой воркер (блокировка занята)
+        Act: Воркер падает, не записав ответ, и снимает блокировку
+        Assert: Ожидающий сразу считает ответ сам, не дожидаясь таймаута
+        """
+        key = 'adverts:detail:1:v0'
+        lock_key = LOCK_KEY.format(key=key)
+        cache.add(lock_key, 1)
+        sleep = mocker.patch('booking.cache.time.sleep', side_effect=lambda _: cache.delete(lock_key))
+
+        result = _get_or_compute(key, 'detail', lambda: (status.HTTP_200_OK, {'id': 1}))
+
+        assert result == (status.HTTP_200_OK, {'id': 1})
+        assert sleep.call_count == 1
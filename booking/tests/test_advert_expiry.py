@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from booking.expiry import expire_adverts
+from booking.models import Advert, AdvertStatus
+from booking.services import AdvertService
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertExpiry:
+
+    def _save_advert(self, status: str, active_until) -> Advert:
+        advert = AdvertFactory(status=status, active_until=active_until)
+        save_advert_object(advert)
+        return advert
+
+    def test_expired_adverts_deactivated(self):
+        """
+        Arrange: Активные объявления с истекшим и неистекшим сроком, неактивное истекшее объявление
+        Act: Снятие с публикации истекших объявлений
+        Assert: Снято только активное истекшее объявление
+        """
+        now = timezone.now()
+        expired = self._save_advert(AdvertStatus.ACTIVE, now - timedelta(days=1))
+        actual = self._save_advert(AdvertStatus.ACTIVE, now + timedelta(days=1))
+        draft = self._save_advert(AdvertStatus.DRAFT, now - timedelta(days=1))
+
+        assert expire_adverts(batch_size=10, max_batches=1) == 1
+
+        expired.refresh_from_db()
+        actual.refresh_from_db()
+        draft.refresh_from_db()
+        assert expired.status == AdvertStatus.DISABLED
+        assert expired.activated_at is None
+        assert actual.status == AdvertStatus.ACTIVE
+        assert draft.status == AdvertStatus.DRAFT
+
+    @pytest.mark.parametrize('max_batches, expected_processed', ((1, 2), (2, 4), (3, 5), (10, 5)))
+    def test_expiry_bounded_by_batches(self, max_batches: int, expected_processed: int):
+        """
+        Arrange: Пять активных истекших объявлений
+        Act: Снятие с публикации пачками по два объявления с ограничением количества пачек
+        Assert: Обработано не больше, чем помещается в разрешенное количество пачек
+        """
+        now = timezone.now()
+        for days in range(1, 6):
+            self._save_advert(AdvertStatus.ACTIVE, now - timedelta(days=days))
+
+        assert expire_adverts(batch_size=2, max_batches=max_batches) == expected_processed
+        assert Advert.objects.filter(status=AdvertStatus.ACTIVE).count() == 5 - expected_processed
+
+    def test_reactivated_advert_not_expired(self):
+        """
+        Arrange: Объявление, снятое с публикации по истечении срока
+        Act: Повторная активация объявления и снятие с публикации истекших объявлений
+        Assert: Срок публикации продлен, объявление остается активным
+        """
+        advert = self._save_advert(AdvertStatus.ACTIVE, timezone.now() - timedelta(days=1))
+        expire_adverts(batch_size=10, max_batches=1)
+
+        AdvertService.find(advert_pk=advert.pk, user_profile=advert.contact).activate()
+
+        assert expire_adverts(batch_size=10, max_batches=1) == 0
+        advert.refresh_from_db()
+        assert advert.status == AdvertStatus.ACTIVE
+        assert advert.active_until > timezone.now() + timedelta(days=27)
@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+
+import pytest
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from authentication.models import Profile
+from booking.models import Advert
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+from common.helpers.export import CSV_BOM
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertExport:
+
+    ADVERTS_EXPORT_URL = '/api/posts/export/'
+
+    def _save_adverts(self, contact: Profile, count: int) -> list[Advert]:
+        adverts = [AdvertFactory(contact=contact) for _ in range(count)]
+        for advert in adverts:
+            save_advert_object(advert)
+        return adverts
+
+    def _content(self, response) -> str:
+        assert response.streaming
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_csv(self, auth_client: APIClient, auth_profile: Profile, profile: Profile, settings):
+        """
+        Arrange: Объявления пользователя и объявление другого профиля, размер пачки выгрузки меньше их количества
+        Act: Выгрузка объявлений в CSV
+        Assert: Выгрузка потоковая, в ней заголовок и только объявления пользователя
+        """
+        settings.EXPORT_CHUNK_SIZE = 2
+        adverts = self._save_adverts(auth_profile, 3)
+        self._save_adverts(profile, 1)
+
+        response = auth_client.get(self.ADVERTS_EXPORT_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Disposition'] == 'attachment; filename="adverts.csv"'
+        rows = list(csv.DictReader(io.StringIO(self._content(response).removeprefix(CSV_BOM))))
+        assert [int(row['id']) for row in rows] == [advert.pk for advert in adverts]
+        assert rows[0]['title'] == adverts[0].title
+
+    def test_export_csv_escapes_formulas(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Объявление пользователя с названием и описанием, похожими на формулы
+        Act: Выгрузка объявлений в CSV
+        Assert: Ячейки с формулами экранированы апострофом, числа не тронуты
+        """
+        advert = AdvertFactory(contact=auth_profile, title='=HYPERLINK("http://example.com")', description='@SUM(A1)')
+        save_advert_object(advert)
+
+        response = auth_client.get(self.ADVERTS_EXPORT_URL)
+
+        rows = list(csv.DictReader(io.StringIO(self._content(response).removeprefix(CSV_BOM))))
+        assert rows[0]['title'] == '\'=HYPERLINK("http://example.com")'
+        assert rows[0]['description'] == "'@SUM(A1)"
+        assert rows[0]['price'] == str(advert.price)
+
+    def test_export_ndjson(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Объявления пользователя
+        Act: Выгрузка объявлений в NDJSON
+        Assert: По JSON объекту на строку
+        """
+        adverts = self._save_adverts(auth_profile, 2)
+
+        response = auth_client.get(self.ADVERTS_EXPORT_URL, {'file_format': 'ndjson'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        lines = [json.loads(line) for line in self._content(response).splitlines()]
+        assert [line['id'] for line in lines] == [advert.pk for advert in adverts]
+        assert lines[0]['price'] == str(adverts[0].price)
+
+    def test_export_unknown_format(self, auth_client: APIClient):
+        """
+        Arrange: -
+        Act: Выгрузка в неподдерживаемом формате
+        Assert: 422 ошибка
+        """
+        response = auth_client.get(self.ADVERTS_EXPORT_URL, {'file_format': 'xml'})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_export_unauthorized(self, api_client: APIClient):
+        """
+        Arrange: -
+        Act: Выгрузка без авторизации
+        Assert: 401 ошибка
+        """
+        response = api_client.get(self.ADVERTS_EXPORT_URL)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,79 @@
+import pytest
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from booking.geo import bounding_box
+from booking.models import AdvertStatus, Location
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+MOSCOW = (55.7558, 37.6173)
+PODOLSK = (55.4242, 37.5547)  # ~37 км от Москвы
+SAINT_PETERSBURG = (59.9343, 30.3351)  # ~635 км от Москвы
+
+
+class TestAdvertGeoSearch:
+
+    ADVERT_RECOMMENDATION_FILTER_URL = '/api/adverts/filter/'
+
+    def _save_advert_at(self, name: str, coordinates) -> int:
+        place = Location.objects.create(name=name, latitude=coordinates[0], longitude=coordinates[1])
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE, place=place)
+        save_advert_object(advert)
+        return advert.pk
+
+    def test_filter_by_radius(self, api_client: APIClient):
+        """
+        Arrange: Активные объявления в Москве, Подольске, Санкт-Петербурге и без координат
+        Act: Поиск в радиусе 50 км от центра Москвы
+        Assert: Вернулись только объявления из Москвы и Подольска
+        """
+        nearby = {self._save_advert_at('Москва', MOSCOW), self._save_advert_at('Подольск', PODOLSK)}
+        self._save_advert_at('Санкт-Петербург', SAINT_PETERSBURG)
+        save_advert_object(AdvertFactory(status=AdvertStatus.ACTIVE))
+
+        response = api_client.get(
+            self.ADVERT_RECOMMENDATION_FILTER_URL,
+            {'latitude': MOSCOW[0], 'longitude': MOSCOW[1], 'radius_km': 50},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert {advert['id'] for advert in response.data} == nearby  # type: ignore[union-attr]
+        assert {advert['place']['name'] for advert in response.data} == {'Москва', 'Подольск'}  # type: ignore
+
+    @pytest.mark.parametrize(
+        'params',
+        (
+            {'radius_km': 50},
+            {'latitude': MOSCOW[0], 'longitude': MOSCOW[1]},
+            {'latitude': 91, 'longitude': 0, 'radius_km': 50},
+            {'latitude': MOSCOW[0], 'longitude': MOSCOW[1], 'radius_km': 100000},
+        ),
+    )
+    def test_filter_by_radius_invalid_params(self, api_client: APIClient, params: dict):
+        """
+        Arrange: Пустая бд
+        Act: Поиск по расстоянию с неполными или некорректными параметрами
+        Assert: 422 ошибка
+        """
+        response = api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL, params)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.parametrize(
+        'latitude, longitude, radius_km, full_longitude',
+        ((55.0, 37.0, 50, False), (89.9, 0.0, 50, True), (0.0, 179.9, 50, True)),
+    )
+    def test_bounding_box(self, latitude: float, longitude: float, radius_km: float, full_longitude: bool):
+        """
+        Arrange: Точка в средних широтах, у полюса и у 180-го меридиана
+        Act: Расчет прямоугольника вокруг точки
+        Assert: Прямоугольник содержит точку, у полюса и меридиана долгота не ограничивается
+        """
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+
+        assert min_latitude < latitude < max_latitude
+        assert min_longitude < longitude < max_longitude
+        assert ((min_longitude, max_longitude) == (-180, 180)) == full_longitude
@@ -0,0 +1,141 @@
+import io
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from booking.images import RENDITION_FORMATS, process_advert_images
+from booking.models import Advert, AdvertImage
+from booking.serializers import AdvertSerializer
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures('media_root')]
+
+EXIF_ORIENTATION = 0x0112
+EXIF_MAKE = 0x010F
+EXIF_GPS_INFO = 0x8825
+
+
+def make_photo(width: int, height: int, orientation: int = 6) -> ContentFile:
+    """JPEG с EXIF: производитель камеры, GPS координаты и поворот (по умолчанию на 90 градусов)"""
+    exif = Image.Exif()
+    exif[EXIF_MAKE] = 'Camera'
+    exif[EXIF_ORIENTATION] = orientation
+    exif[EXIF_GPS_INFO] = {1: 'N', 2: (55.0, 45.0, 0.0), 3: 'E', 4: (37.0, 37.0, 0.0)}
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, format='JPEG', exif=exif.tobytes())
+    return ContentFile(buffer.getvalue(), name='photo.jpg')
+
+
+class TestAdvertImages:
+
+    def _save_advert(self) -> Advert:
+        advert = AdvertFactory()
+        save_advert_object(advert)
+        advert.logo.save('logo.jpg', make_photo(3000, 2000))
+        return advert
+
+    def test_renditions_generated(self):
+        """
+        Arrange: Объявление с большим логотипом и фотографией, содержащими EXIF
+        Act: Обработка изображений объявления
+        Assert: Для логотипа и фотографии сохранены копии всех размеров и форматов без EXIF и с примененным поворотом
+        """
+        advert = self._save_advert()
+        image = AdvertImage(advert=advert)
+        image.image.save('photo.jpg', make_photo(400, 300))
+
+        assert process_advert_images(advert.pk) == 2
+
+        advert.refresh_from_db()
+        image.refresh_from_db()
+        for renditions in (advert.logo_renditions, image.renditions):
+            assert set(renditions) == set(settings.ADVERT_IMAGE_RENDITIONS)
+            for name, (max_width, max_height) in settings.ADVERT_IMAGE_RENDITIONS.items():
+                assert set(renditions[name]) == set(RENDITION_FORMATS)
+                for path in renditions[name].values():
+                    with default_storage.open(path) as file, Image.open(file) as rendition:
+                        width, height = rendition.size
+                        assert width <= max_width and height <= max_height
+                        # Поворот из EXIF применен: портретная ориентация
+                        assert height > width
+                        assert not rendition.getexif()
+
+    @pytest.mark.parametrize('orientation, expected_size', ((6, (300, 400)), (1, (400, 300))))
+    def test_original_metadata_stripped(self, orientation: int, expected_size: tuple):
+        """
+        Arrange: Объявление с фотографией, в EXIF которой есть GPS координаты
+        Act: Обработка изображений объявления
+        Assert: Оригинал перезаписан без EXIF под тем же именем, поворот применен к пикселям
+        """
+        advert = AdvertFactory()
+        save_advert_object(advert)
+        image = AdvertImage(advert=advert)
+        image.image.save('photo.jpg', make_photo(400, 300, orientation))
+        name = image.image.name
+
+        process_advert_images(advert.pk)
+
+        image.refresh_from_db()
+        assert image.image.name == name
+        with default_storage.open(name) as file, Image.open(file) as original:
+            assert original.format == 'JPEG'
+            assert not original.getexif()
+            assert original.size == expected_size
+
+    def test_decompression_bomb_skipped(self, monkeypatch):
+        """
+        Arrange: Объявление с логотипом, размер которого в пикселях больше допустимого
+        Act: Обработка изображений объявления
+        Assert: Копии не созданы, обработка не упала
+        """
+        advert = self._save_advert()
+        monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+
+        assert process_advert_images(advert.pk) == 0
+        advert.refresh_from_db()
+        assert advert.logo_renditions == {}
+
+    def test_processed_images_skipped(self):
+        """
+        Arrange: Объявление, изображения которого уже обработаны
+        Act: Повторная обработка изображений объявления
+        Assert: Ничего не обработано
+        """
+        advert = self._save_advert()
+        process_advert_images(advert.pk)
+
+        assert process_advert_images(advert.pk) == 0
+
+    def test_broken_logo_skipped(self):
+        """
+        Arrange: Объявление с логотипом, который не является изображением
+        Act: Обработка изображений объявления
+        Assert: Копии не созданы, обработка не упала
+        """
+        advert = AdvertFactory()
+        save_advert_object(advert)
+        advert.logo.save('logo.jpg', ContentFile(b'not an image'))
+
+        assert process_advert_images(advert.pk) == 0
+        advert.refresh_from_db()
+        assert advert.logo_renditions == {}
+
+    def test_serializer_exposes_rendition_urls(self):
+        """
+        Arrange: Объявление с обработанным логотипом
+        Act: Сериализация объявления
+        Assert: Отданы ссылки на копии логотипа
+        """
+        advert = self._save_advert()
+        process_advert_images(advert.pk)
+        advert.refresh_from_db()
+
+        data = AdvertSerializer(advert).data
+
+        thumbnail = data['logo_renditions']['thumbnail']['webp']
+        assert thumbnail == default_storage.url(advert.logo_renditions['thumbnail']['webp'])
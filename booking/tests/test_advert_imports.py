@@ -0,0 +1,369 @@
+import io
+import socket
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List
+
+import pytest
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from authentication.models import Profile
+from booking.imports import _download_image, download_advert_images, import_adverts, iter_xlsx_rows, read_rows
+from booking.models import Advert, AdvertImportStatus, AdvertStatus
+from booking.search import search_adverts
+from booking.tasks import download_advert_images_task, import_adverts_task
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+from review.tests.conftest import save_profile_object
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures('media_root')]
+
+CSV_CONTENT = (
+    'title;description;price;phone;location;status;image_urls\n'
+    'Экскаватор;Гусеничный;1000;79990000000;Москва;ACTIVE;\n'
+    'Бульдозер;Тяжелый;дорого;79990000000;Казань;;\n'
+    '\n'
+    'Кран;"Башенный; 20 т";5000;79990000000;Казань;DRAFT;https://example.com/1.png https://example.com/2.png\n'
+)
+
+XLSX_WORKBOOK = (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Лист1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/></Relationships>'
+)
+
+
+def make_xlsx(rows: List[List[object]]) -> bytes:
+    """Минимальная XLSX книга с одним листом: строки хранятся в общих строках, числа - в ячейках"""
+    strings: List[str] = []
+    sheet_rows = []
+    for row_index, row in enumerate(rows, start=1):
+        cells = []
+        for column_index, value in enumerate(row):
+            if value is None:
+                continue
+            reference = f'{chr(ord("A") + column_index)}{row_index}'
+            if isinstance(value, str):
+                strings.append(value)
+                cells.append(f'<c r="{reference}" t="s"><v>{len(strings) - 1}</v></c>')
+            else:
+                cells.append(f'<c r="{reference}"><v>{value}</v></c>')
+        sheet_rows.append(f'<row r="{row_index}">{"".join(cells)}</row>')
+
+    namespace = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        archive.writestr(
+            'xl/sharedStrings.xml',
+            f'<sst {namespace}>' + ''.join(f'<si><t>{value}</t></si>' for value in strings) + '</sst>',
+        )
+        archive.writestr(
+            'xl/worksheets/sheet1.xml',
+            f'<worksheet {namespace}><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>',
+        )
+
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def public_dns(mocker):
+    """Фикстура, разрешающая любой хост, кроме ip адресов, в публичный адрес, чтобы тесты не зависели от DNS"""
+    getaddrinfo = socket.getaddrinfo
+
+    def resolve(host, port, *args, **kwargs):
+        if host.replace('.', '').isdigit():
+            return getaddrinfo(host, port, *args, **kwargs)
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('93.184.216.34', 0))]
+
+    return mocker.patch('booking.imports.socket.getaddrinfo', side_effect=resolve)
+
+
+def make_png(size=(10, 10)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class TestAdvertImports:
+
+    ADVERTS_IMPORT_URL = '/api/posts/imports/'
+    ADVERTS_IMPORT_STATUS_URL = '/api/posts/imports/{id}/'
+
+    def test_import_csv(self, profile: Profile, mocker):
+        """
+        Arrange: CSV файл с разделителем ";" с корректными строками, строкой с ошибкой и пустой строкой
+        Act: Импорт объявлений пачками по одной строке
+        Assert: Созданы объявления из корректных строк, активное объявление активировано, ошибка указана
+        с номером строки, прогресс сообщается после каждой пачки
+        """
+        save_profile_object(profile)
+        mocker.patch.object(download_advert_images_task, 'delay')
+        reports = []
+
+        progress = import_adverts(
+            read_rows(io.BytesIO(CSV_CONTENT.encode()), 'fleet.csv'),
+            profile,
+            chunk_size=1,
+            on_progress=lambda current: reports.append(current.processed),
+        )
+
+        assert (progress.processed, progress.created, progress.failed) == (3, 2, 1)
+        assert reports == [1, 2, 3]
+        assert progress.errors[0]['row'] == 3
+        assert 'price' in progress.errors[0]['errors']
+
+        excavator = Advert.objects.get(title='Экскаватор')
+        crane = Advert.objects.get(title='Кран')
+        assert excavator.contact == profile
+        assert excavator.status == AdvertStatus.ACTIVE and excavator.active_until is not None
+        assert crane.description == 'Башенный; 20 т'
+        assert list(search_adverts(Advert.objects.all(), 'кран').values_list('pk', flat=True)) == [crane.pk]
+
+    def test_import_csv_schedules_image_download(self, profile: Profile, mocker, django_capture_on_commit_callbacks):
+        """
+        Arrange: CSV файл, в одной строке которого есть ссылки на фотографии
+        Act: Импорт объявлений
+        Assert: После коммита поставлено одно скачивание изображений со ссылками из файла
+        """
+        save_profile_object(profile)
+        download = mocker.patch.object(download_advert_images_task, 'delay')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            import_adverts(read_rows(io.BytesIO(CSV_CONTENT.encode()), 'fleet.csv'), profile, chunk_size=10)
+
+        crane = Advert.objects.get(title='Кран')
+        download.assert_called_once_with(crane.pk, None, ['https://example.com/1.png', 'https://example.com/2.png'])
+
+    def test_read_xlsx(self):
+        """
+        Arrange: XLSX книга со строками, числами и пустой ячейкой
+        Act: Чтение строк книги
+        Assert: Строки прочитаны по заголовкам, пустая ячейка - пустая строка
+        """
+        content = make_xlsx([['title', 'price', 'location', 'phone'], ['Каток', 1500, None, 79990000000]])
+
+        rows = list(iter_xlsx_rows(io.BytesIO(content)))
+
+        assert rows == [(2, {'title': 'Каток', 'price': '1500', 'location': '', 'phone': '79990000000'})]
+
+    def test_import_endpoint(
+        self, auth_client: APIClient, auth_profile: Profile, mocker, django_capture_on_commit_callbacks
+    ):
+        """
+        Arrange: XLSX файл с объявлениями
+        Act: Загрузка файла и запрос прогресса импорта
+        Assert: Импорт принят, выполнен в фоне, объявления созданы от имени пользователя
+        """
+        mocker.patch.object(import_adverts_task, 'delay', side_effect=import_adverts_task)
+        content = make_xlsx(
+            [
+                ['title', 'description', 'price', 'phone', 'location'],
+                ['Каток', 'Дорожный', 1500, '79990000000', 'Тверь'],
+                ['Погрузчик', 'Вилочный', 2500, '79990000000', 'Тверь'],
+            ]
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = auth_client.post(
+                self.ADVERTS_IMPORT_URL, {'file': SimpleUploadedFile('fleet.xlsx', content)}, format='multipart'
+            )
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        import_id = response.data['id']  # type: ignore[index]
+
+        response = auth_client.get(self.ADVERTS_IMPORT_STATUS_URL.format(id=import_id))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == AdvertImportStatus.DONE  # type: ignore[index]
+        assert response.data['created_count'] == 2  # type: ignore[index]
+        assert Advert.objects.filter(contact=auth_profile).count() == 2
+
+    def test_import_broken_file(self, auth_client: APIClient, mocker, django_capture_on_commit_callbacks):
+        """
+        Arrange: Файл с расширением .xlsx, который не является XLSX книгой
+        Act: Загрузка файла
+        Assert: Импорт завершился ошибкой, ошибка описана в отчете
+        """
+        mocker.patch.object(import_adverts_task, 'delay', side_effect=import_adverts_task)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = auth_client.post(
+                self.ADVERTS_IMPORT_URL, {'file': SimpleUploadedFile('fleet.xlsx', b'not a zip')}, format='multipart'
+            )
+        response = auth_client.get(self.ADVERTS_IMPORT_STATUS_URL.format(id=response.data['id']))  # type: ignore
+
+        assert response.data['status'] == AdvertImportStatus.FAILED  # type: ignore[index]
+        assert response.data['errors'][0]['row'] == 0  # type: ignore[index]
+
+    def test_import_unsupported_file(self, auth_client: APIClient):
+        """
+        Arrange: -
+        Act: Загрузка файла неподдерживаемого формата
+        Assert: 422 ошибка
+        """
+        response = auth_client.post(
+            self.ADVERTS_IMPORT_URL, {'file': SimpleUploadedFile('fleet.txt', b'title')}, format='multipart'
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_foreign_import_status(self, auth_client: APIClient, profile: Profile):
+        """
+        Arrange: Импорт другого профиля
+        Act: Запрос прогресса чужого импорта
+        Assert: 404 ошибка
+        """
+        save_profile_object(profile)
+        advert_import = profile.advert_imports.create(file=SimpleUploadedFile('fleet.csv', b'title'))
+
+        response = auth_client.get(self.ADVERTS_IMPORT_STATUS_URL.format(id=advert_import.pk))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.usefixtures('public_dns')
+    def test_download_images(self, requests_mock):
+        """
+        Arrange: Объявление без изображений, ссылки на логотип, фотографию и недоступное изображение
+        Act: Скачивание изображений объявления
+        Assert: Скачаны логотип и фотография, для них сгенерированы рендиции, недоступное пропущено
+        """
+        advert = AdvertFactory(logo=None)
+        save_advert_object(advert)
+        requests_mock.get('https://example.com/logo.png', content=make_png())
+        requests_mock.get('https://example.com/photo.png', content=make_png())
+        requests_mock.get('https://example.com/missing.png', status_code=404)
+
+        downloaded = download_advert_images(
+            advert.pk,
+            'https://example.com/logo.png',
+            ['https://example.com/photo.png', 'https://example.com/missing.png'],
+        )
+
+        assert downloaded == 2
+        advert.refresh_from_db()
+        assert advert.logo.name.endswith('logo.png')
+        assert advert.logo_renditions
+        assert [bool(image.renditions) for image in advert.images.all()] == [True]
+
+    @pytest.mark.usefixtures('public_dns')
+    def test_download_images_rejects_internal_urls(self, requests_mock):
+        """
+        Arrange: Ссылки на loopback адрес, адрес метаданных облака, не http ссылка и редирект на localhost
+        Act: Скачивание изображений объявления
+        Assert: Ни одна ссылка не скачана, к внутренним адресам запросы не отправлялись
+        """
+        advert = AdvertFactory(logo=None)
+        save_advert_object(advert)
+        internal = requests_mock.get('http://127.0.0.1/logo.png', content=make_png())
+        metadata = requests_mock.get('http://169.254.169.254/latest/meta-data', content=make_png())
+        requests_mock.get('https://example.com/moved.png', status_code=302, headers={'Location': 'http://127.0.0.1/'})
+
+        downloaded = download_advert_images(
+            advert.pk,
+            'http://127.0.0.1/logo.png',
+            ['http://169.254.169.254/latest/meta-data', 'file:///etc/passwd', 'https://example.com/moved.png'],
+        )
+
+        assert downloaded == 0
+        assert not internal.called and not metadata.called
+        assert not advert.images.exists()
+
+    def test_download_connects_to_checked_address(self, mocker):
+        """
+        Arrange: Ссылка на хост, адрес которого уже проверен, сервер изображений на этом адресе
+        Act: Скачивание изображения
+        Assert: Соединение установлено с проверенным адресом без повторного разрешения хоста, Host из ссылки
+        """
+        hosts = []
+
+        class ImageHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hosts.append(self.headers['Host'])
+                body = make_png()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), ImageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://images.example:{server.server_port}/photo.png'
+        mocker.patch('booking.imports._check_public_url', return_value='127.0.0.1')
+        resolve = mocker.spy(socket, 'getaddrinfo')
+
+        try:
+            image = _download_image(url)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert image.name == 'photo.png'
+        assert hosts == [f'images.example:{server.server_port}']
+        assert 'images.example' not in [call.args[0] for call in resolve.call_args_list]
+
+    @pytest.mark.usefixtures('public_dns')
+    def test_download_not_rebound_to_internal_address(self, mocker):
+        """
+        Arrange: Хост, проверенный как публичный (DNS которого к моменту соединения может вести уже на localhost)
+        Act: Скачивание изображения
+        Assert: Соединение устанавливается с проверенным адресом, а не с заново разрешенным именем хоста
+        """
+        connect = mocker.patch('urllib3.util.connection.create_connection', side_effect=ConnectionRefusedError)
+
+        with pytest.raises(requests.ConnectionError):
+            _download_image('https://rebind.example/photo.png')
+
+        assert connect.call_args.args[0] == ('93.184.216.34', 443)
+
+    @pytest.mark.usefixtures('public_dns')
+    def test_download_images_skips_decompression_bomb(self, requests_mock, monkeypatch):
+        """
+        Arrange: Изображение, размер которого в пикселях больше допустимого Pillow, и обычное изображение
+        Act: Скачивание изображений объявления
+        Assert: Слишком большое изображение пропущено, обычное скачано
+        """
+        advert = AdvertFactory(logo=None)
+        save_advert_object(advert)
+        requests_mock.get('https://example.com/bomb.png', content=make_png(size=(100, 100)))
+        requests_mock.get('https://example.com/photo.png', content=make_png())
+        monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+
+        downloaded = download_advert_images(
+            advert.pk, None, ['https://example.com/bomb.png', 'https://example.com/photo.png']
+        )
+
+        assert downloaded == 1
+
+    def test_import_command(self, profile: Profile, tmp_path, mocker):
+        """
+        Arrange: CSV файл на диске
+        Act: Импорт командой import_adverts
+        Assert: Объявления созданы, в выводе итог импорта
+        """
+        save_profile_object(profile)
+        mocker.patch.object(download_advert_images_task, 'delay')
+        path = tmp_path / 'fleet.csv'
+        path.write_text(CSV_CONTENT, encoding='utf-8')
+        out, err = io.StringIO(), io.StringIO()
+
+        call_command('import_adverts', str(path), profile=profile.pk, stdout=out, stderr=err)
+
+        assert Advert.objects.filter(contact=profile).count() == 2
+        assert 'создано объявлений: 2' in out.getvalue()
+        assert 'Строка 3' in err.getvalue()
@@ -0,0 +1,139 @@
+import pytest
+import redis
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from authentication.models import Profile
+from booking.counters import LIKES_PENDING_KEY, flush_advert_likes
+from booking.models import Advert, AdvertStatus
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertLikes:
+
+    ADVERT_LIKE_URL = '/api/adverts/{id}/like/'
+    ADVERT_UNLIKE_URL = '/api/adverts/{id}/unlike/'
+
+    def _save_advert(self, **kwargs) -> Advert:
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE, **kwargs)
+        save_advert_object(advert)
+        return advert
+
+    def test_like_is_idempotent(
+        self,
+        auth_client: APIClient,
+        auth_profile: Profile,
+        redis_storage: redis.Redis,
+        django_capture_on_commit_callbacks,
+    ):
+        """
+        Arrange: Активное объявление
+        Act: Два лайка объявления одним пользователем и перенос лайков в бд
+        Assert: Лайк поставлен один раз, счетчик лайков объявления увеличился на 1
+        """
+        advert = self._save_advert()
+
+        for _ in range(2):
+            with django_capture_on_commit_callbacks(execute=True):
+                response = auth_client.post(self.ADVERT_LIKE_URL.format(id=advert.pk))
+
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data == {'liked': True}  # type: ignore[attr-defined]
+
+        assert list(auth_profile.liked_adverts.all()) == [advert]
+        assert redis_storage.hget(LIKES_PENDING_KEY, advert.pk) == b'1'
+
+        assert flush_advert_likes(batch_size=100) == 1
+        advert.refresh_from_db()
+        assert advert.likes_count == 1
+        assert not redis_storage.exists(LIKES_PENDING_KEY)
+
+    def test_unlike(
+        self,
+        auth_client: APIClient,
+        auth_profile: Profile,
+        redis_storage: redis.Redis,
+        django_capture_on_commit_callbacks,
+    ):
+        """
+        Arrange: Объявление, лайкнутое пользователем, с перенесенным в бд счетчиком
+        Act: Два снятия лайка и перенос лайков в бд
+        Assert: Лайк снят, счетчик лайков уменьшился на 1
+        """
+        advert = self._save_advert(likes_count=1)
+        auth_profile.liked_adverts.add(advert)
+
+        for _ in range(2):
+            with django_capture_on_commit_callbacks(execute=True):
+                response = auth_client.post(self.ADVERT_UNLIKE_URL.format(id=advert.pk))
+
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data == {'liked': False}  # type: ignore[attr-defined]
+
+        assert not auth_profile.liked_adverts.exists()
+
+        flush_advert_likes(batch_size=100)
+        advert.refresh_from_db()
+        assert advert.likes_count == 0
+
+    def test_like_and_unlike_cancel_out(
+        self, auth_client: APIClient, redis_storage: redis.Redis, django_capture_on_commit_callbacks
+    ):
+        """
+        Arrange: Активное объявление
+        Act: Лайк и снятие лайка между переносами лайков в бд
+        Assert: Переносить нечего, счетчик не изменился
+        """
+        advert = self._save_advert()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            auth_client.post(self.ADVERT_LIKE_URL.format(id=advert.pk))
+            auth_client.post(self.ADVERT_UNLIKE_URL.format(id=advert.pk))
+
+        assert flush_advert_likes(batch_size=100) == 0
+        advert.refresh_from_db()
+        assert advert.likes_count == 0
+
+    def test_like_without_redis(self, auth_client: APIClient, settings, django_capture_on_commit_callbacks):
+        """
+        Arrange: Активное объявление, Redis недоступен
+        Act: Лайк объявления
+        Assert: Счетчик лайков обновлен сразу в бд
+        """
+        advert = self._save_advert()
+        settings.REDIS_STORAGE_URL = 'redis://localhost:1/0'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = auth_client.post(self.ADVERT_LIKE_URL.format(id=advert.pk))
+
+        assert response.status_code == status.HTTP_200_OK
+        advert.refresh_from_db()
+        assert advert.likes_count == 1
+
+    def test_like_inactive_advert(self, auth_client: APIClient):
+        """
+        Arrange: Объявление, снятое с публикации
+        Act: Лайк объявления
+        Assert: 404 ошибка
+        """
+        advert = self._save_advert()
+        Advert.objects.filter(pk=advert.pk).update(status=AdvertStatus.DISABLED)
+
+        response = auth_client.post(self.ADVERT_LIKE_URL.format(id=advert.pk))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_like_unauthorized(self, api_client: APIClient):
+        """
+        Arrange: Активное объявление
+        Act: Лайк объявления без авторизации
+        Assert: 401 ошибка
+        """
+        advert = self._save_advert()
+
+        response = api_client.post(self.ADVERT_LIKE_URL.format(id=advert.pk))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
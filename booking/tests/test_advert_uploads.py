@@ -0,0 +1,122 @@
+import io
+import uuid
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from authentication.models import Profile
+from booking.models import Advert, AdvertUpload
+from booking.tests.factories import UploadFactory
+from review.tests.conftest import save_profile_object
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures('media_root')]
+
+
+def make_image_file(name: str = 'photo.png') -> SimpleUploadedFile:
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), 'blue').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def save_upload_object(owner: Profile) -> AdvertUpload:
+    """Сохранить в бд загрузку изображения профилем owner"""
+    save_profile_object(owner)
+    upload = UploadFactory(owner=owner)
+    upload.save()
+    return upload
+
+
+class TestAdvertUploads:
+
+    ADVERTS_UPLOAD_URL = '/api/posts/uploads/'
+    ADVERTS_CREATE_URL = '/api/posts/'
+
+    ADVERT_CREATE_DATA = {
+        'title': 'Экскаватор',
+        'description': 'Гусеничный экскаватор',
+        'price': '1000.00',
+        'phone': '79990000000',
+        'location': 'Москва',
+        'status': 'DRAFT',
+    }
+
+    def test_upload_image(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Залогиненный клиент
+        Act: Загрузка изображения
+        Assert: Загрузка сохранена за профилем и вернулся ее токен
+        """
+        response = auth_client.post(self.ADVERTS_UPLOAD_URL, {'file': make_image_file()}, format='multipart')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        upload = AdvertUpload.objects.get(token=response.data['token'])
+        assert upload.owner == auth_profile
+        assert upload.file.read()
+
+    def test_upload_too_large(self, auth_client: APIClient, settings):
+        """
+        Arrange: Лимит размера загрузки меньше файла
+        Act: Загрузка изображения
+        Assert: Загрузка отклонена с 413
+        """
+        settings.ADVERT_UPLOAD_MAX_SIZE = 10
+
+        response = auth_client.post(self.ADVERTS_UPLOAD_URL, {'file': make_image_file()}, format='multipart')
+
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert not AdvertUpload.objects.exists()
+
+    def test_upload_not_image(self, auth_client: APIClient):
+        """
+        Arrange: Залогиненный клиент
+        Act: Загрузка файла, не являющегося изображением
+        Assert: Загрузка отклонена с 422
+        """
+        file = SimpleUploadedFile('photo.png', b'not an image', content_type='image/png')
+
+        response = auth_client.post(self.ADVERTS_UPLOAD_URL, {'file': file}, format='multipart')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_create_advert_from_uploads(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Загруженные профилем логотип и фотографии
+        Act: Подача объявления со ссылками на загрузки
+        Assert: Файлы загрузок стали логотипом и фотографиями объявления, сами загрузки удалены
+        """
+        logo, *photos = [save_upload_object(auth_profile) for _ in range(3)]
+
+        response = auth_client.post(
+            self.ADVERTS_CREATE_URL,
+            {
+                **self.ADVERT_CREATE_DATA,
+                'logo_upload': str(logo.token),
+                'image_uploads': [str(photo.token) for photo in photos],
+            },
+            format='json',
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        advert = Advert.objects.get(contact=auth_profile)
+        assert advert.logo.name == logo.file.name
+        assert sorted(image.image.name for image in advert.images.all()) == sorted(p.file.name for p in photos)
+        assert not AdvertUpload.objects.exists()
+
+    @pytest.mark.parametrize('foreign', (True, False))
+    def test_create_advert_with_unknown_upload(self, auth_client: APIClient, profile: Profile, foreign: bool):
+        """
+        Arrange: Загрузка другого профиля или несуществующий токен
+        Act: Подача объявления со ссылкой на эту загрузку
+        Assert: Объявление не создано
+        """
+        token = save_upload_object(profile).token if foreign else uuid.uuid4()
+
+        response = auth_client.post(
+            self.ADVERTS_CREATE_URL, {**self.ADVERT_CREATE_DATA, 'logo_upload': str(token)}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert not Advert.objects.exists()
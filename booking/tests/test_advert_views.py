@@ -0,0 +1,152 @@
+import pytest
+import redis
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from booking.counters import (
+    COUNTER_FLUSH_LOCK_KEY,
+    COUNTER_FLUSHING_KEY,
+    VIEWS_PENDING_KEY,
+    apply_view_deltas,
+    flush_advert_views,
+)
+from booking.models import AdvertStatus
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertViews:
+
+    ADVERT_RECOMMENDATION_RETRIEVE_URL = '/api/adverts/{id}/'
+
+    def test_repeated_view_counted_once(self, api_client: APIClient, redis_storage: redis.Redis):
+        """
+        Arrange: Активное объявление
+        Act: Два запроса на получение объявления от одного клиента и перенос просмотров в бд
+        Assert: Засчитан один просмотр
+        """
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE, views=0)
+        save_advert_object(advert)
+
+        for _ in range(2):
+            response = api_client.get(self.ADVERT_RECOMMENDATION_RETRIEVE_URL.format(id=advert.pk))
+            assert response.status_code == status.HTTP_200_OK
+
+        assert redis_storage.hget(VIEWS_PENDING_KEY, advert.pk) == b'1'
+
+        assert flush_advert_views(batch_size=100) == 1
+        advert.refresh_from_db()
+        assert advert.views == 1
+        assert not redis_storage.exists(VIEWS_PENDING_KEY)
+
+    def test_views_from_different_clients(self, redis_storage: redis.Redis):
+        """
+        Arrange: Активное объявление
+        Act: Запросы на получение объявления с разных адресов
+        Assert: Засчитан просмотр от каждого адреса
+        """
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE, views=0)
+        save_advert_object(advert)
+
+        for address in ('10.0.0.1', '10.0.0.2'):
+            APIClient(REMOTE_ADDR=address).get(self.ADVERT_RECOMMENDATION_RETRIEVE_URL.format(id=advert.pk))
+
+        assert redis_storage.hget(VIEWS_PENDING_KEY, advert.pk) == b'2'
+
+    @pytest.mark.parametrize(
+        'proxy_count, forwarded_for, expected_views',
+        (
+            # Без доверенных прокси подставленный клиентом заголовок не учитывается
+            (0, ('10.0.0.1', '10.0.0.2'), b'1'),
+            # За одним прокси клиент подставляет левые адреса, а правый дописывает прокси
+            (1, ('10.0.0.1, 192.168.0.1', '10.0.0.2, 192.168.0.1'), b'1'),
+            (1, ('192.168.0.1', '192.168.0.2'), b'2'),
+        ),
+    )
+    def test_views_with_forwarded_for(
+        self, redis_storage: redis.Redis, settings, proxy_count: int, forwarded_for: tuple, expected_views: bytes
+    ):
+        """
+        Arrange: Активное объявление, перед приложением `proxy_count` доверенных прокси
+        Act: Запросы на получение объявления с одного адреса и с разными X-Forwarded-For
+        Assert: Просмотры засчитаны по адресу клиента, который видит доверенный прокси
+        """
+        settings.TRUSTED_PROXY_COUNT = proxy_count
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE, views=0)
+        save_advert_object(advert)
+
+        for header in forwarded_for:
+            APIClient(HTTP_X_FORWARDED_FOR=header).get(self.ADVERT_RECOMMENDATION_RETRIEVE_URL.format(id=advert.pk))
+
+        assert redis_storage.hget(VIEWS_PENDING_KEY, advert.pk) == expected_views
+
+    def test_missing_advert_not_counted(self, api_client: APIClient, redis_storage: redis.Redis):
+        """
+        Arrange: Пустая бд
+        Act: Запрос на получение несуществующего объявления
+        Assert: Просмотр не засчитан
+        """
+        api_client.get(self.ADVERT_RECOMMENDATION_RETRIEVE_URL.format(id=1))
+
+        assert not redis_storage.exists(VIEWS_PENDING_KEY)
+
+    def test_apply_view_deltas_in_batches(self):
+        """
+        Arrange: Несколько объявлений
+        Act: Перенос приращений просмотров пачками меньше количества объявлений
+        Assert: Просмотры прибавились ко всем объявлениям
+        """
+        adverts = [AdvertFactory(views=10) for _ in range(3)]
+        for advert in adverts:
+            save_advert_object(advert)
+
+        apply_view_deltas({advert.pk: index + 1 for index, advert in enumerate(adverts)}, batch_size=2)
+
+        for index, advert in enumerate(adverts):
+            advert.refresh_from_db()
+            assert advert.views == 10 + index + 1
+
+    def test_failed_flush_keeps_views(self, mocker, redis_storage: redis.Redis):
+        """
+        Arrange: Накопленные просмотры в Redis, бд недоступна
+        Act: Перенос просмотров в бд
+        Assert: Просмотры остались в Redis
+        """
+        redis_storage.hset(VIEWS_PENDING_KEY, mapping={'1': 3, '2': 5})
+        mocker.patch('booking.counters.apply_view_deltas', side_effect=RuntimeError)
+
+        with pytest.raises(RuntimeError):
+            flush_advert_views(batch_size=100)
+
+        assert redis_storage.hgetall(VIEWS_PENDING_KEY) == {b'1': b'3', b'2': b'5'}
+
+    def test_leftover_flush_counted(self, redis_storage: redis.Redis):
+        """
+        Arrange: Перенос, начатый упавшим воркером, остался в Redis, пришли новые просмотры
+        Act: Перенос просмотров в бд
+        Assert: Учтены и оставшиеся, и новые просмотры, в Redis ничего не осталось
+        """
+        advert = AdvertFactory(views=10)
+        save_advert_object(advert)
+        redis_storage.hset(COUNTER_FLUSHING_KEY.format(key=VIEWS_PENDING_KEY), advert.pk, 3)
+        redis_storage.hset(VIEWS_PENDING_KEY, advert.pk, 2)
+
+        assert flush_advert_views(batch_size=100) == 1
+
+        advert.refresh_from_db()
+        assert advert.views == 15
+        assert not redis_storage.exists(VIEWS_PENDING_KEY, COUNTER_FLUSHING_KEY.format(key=VIEWS_PENDING_KEY))
+
+    def test_concurrent_flush_skipped(self, redis_storage: redis.Redis):
+        """
+        Arrange: Накопленные просмотры в Redis, перенос уже выполняет другой воркер
+        Act: Перенос просмотров в бд
+        Assert: Перенос пропущен, просмотры остались в Redis
+        """
+        redis_storage.hset(VIEWS_PENDING_KEY, mapping={'1': 3})
+        redis_storage.set(COUNTER_FLUSH_LOCK_KEY.format(key=VIEWS_PENDING_KEY), 'other')
+
+        assert flush_advert_views(batch_size=100) == 0
+        assert redis_storage.hgetall(VIEWS_PENDING_KEY) == {b'1': b'3'}
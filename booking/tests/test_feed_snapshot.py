@@ -0,0 +1,150 @@
+import datetime
+
+import pytest
+import redis
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from booking.feed import FEED_SNAPSHOT_LOCK_KEY, FeedSnapshot
+from booking.models import Advert, AdvertStatus
+from booking.services import AdvertService, PromotionService
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestFeedSnapshot:
+
+    ADVERT_RECOMMENDATION_LIST_URL = '/api/adverts/'
+
+    def _save_adverts(self, count: int) -> list[Advert]:
+        adverts = [AdvertFactory(status=AdvertStatus.ACTIVE) for _ in range(count)]
+        for advert in adverts:
+            save_advert_object(advert)
+        return adverts
+
+    def _feed_ids(self, api_client: APIClient) -> list[int]:
+        response = api_client.get(self.ADVERT_RECOMMENDATION_LIST_URL, {'page_size': 100})
+        assert response.status_code == status.HTTP_200_OK
+        return [advert['id'] for advert in response.data['results']]  # type: ignore[index]
+
+    def test_snapshot_page_order(self):
+        """
+        Arrange: Активные объявления, одно продвигаемое, и неактивное объявление
+        Act: Постраничное чтение снапшота ленты
+        Assert: Продвигаемое первым, остальные от новых к старым, неактивного нет, страницы не пересекаются
+        """
+        adverts = self._save_adverts(4)
+        save_advert_object(AdvertFactory(status=AdvertStatus.DISABLED))
+        PromotionService.promote('Базовое', 2, adverts[1])
+
+        snapshot = FeedSnapshot()
+        snapshot.rebuild()
+        first = snapshot.page(None, 2)
+        second = snapshot.page(first[-1], 10)
+
+        expected = [adverts[1].pk] + [advert.pk for advert in sorted(adverts, key=lambda a: a.pk, reverse=True)]
+        expected = list(dict.fromkeys(expected))
+        assert [advert_id for *_, advert_id in first + second] == expected
+
+    def test_snapshot_updated_incrementally(self, api_client: APIClient, django_capture_on_commit_callbacks):
+        """
+        Arrange: Лента из активных объявлений уже построена
+        Act: Продвижение одного объявления и деактивация другого
+        Assert: Продвигаемое поднялось в начало ленты, деактивированное пропало из снапшота
+        """
+        first, second, third = self._save_adverts(3)
+        FeedSnapshot().rebuild()
+        assert self._feed_ids(api_client) == [third.pk, second.pk, first.pk]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            PromotionService.promote('Базовое', 1, first)
+            AdvertService(second).deactivate()
+
+        assert self._feed_ids(api_client) == [first.pk, third.pk]
+        assert [advert_id for *_, advert_id in FeedSnapshot().page(None, 10)] == [first.pk, third.pk]
+
+    def test_snapshot_cursor_continues_in_database(self, api_client: APIClient, mocker):
+        """
+        Arrange: Объявления созданы в одну секунду, порядок микросекунд не совпадает с порядком id,
+            снапшот ленты построен
+        Act: Первые страницы ленты из снапшота, затем Redis становится недоступен и лента дочитывается из бд
+        Assert: Лента целиком в порядке бд, без пропусков и повторов
+        """
+        adverts = self._save_adverts(4)
+        base = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+        for advert, microseconds in zip(adverts, (500000, 200000, 700000, 200000)):
+            Advert.objects.filter(pk=advert.pk).update(created_at=base + datetime.timedelta(microseconds=microseconds))
+        expected = list(Advert.objects.order_by('-effective_rank', '-created_at', '-id').values_list('id', flat=True))
+        FeedSnapshot().rebuild()
+
+        ids = []
+        response = api_client.get(self.ADVERT_RECOMMENDATION_LIST_URL, {'page_size': 1})
+        for _ in range(2):
+            ids += [advert['id'] for advert in response.data['results']]  # type: ignore[index]
+            response = api_client.get(response.data['next'])  # type: ignore[index]
+        ids += [advert['id'] for advert in response.data['results']]  # type: ignore[index]
+        page = mocker.patch.object(FeedSnapshot, 'page', side_effect=redis.ConnectionError)
+        response = api_client.get(response.data['next'])  # type: ignore[index]
+        ids += [advert['id'] for advert in response.data['results']]  # type: ignore[index]
+
+        assert page.called
+        assert response.data['next'] is None  # type: ignore[index]
+        assert ids == expected
+
+    def test_feed_falls_back_to_database(self, api_client: APIClient, mocker):
+        """
+        Arrange: Активные объявления, Redis недоступен
+        Act: Запрос страницы ленты
+        Assert: Лента отдана из бд
+        """
+        adverts = self._save_adverts(2)
+        mocker.patch.object(FeedSnapshot, 'page', side_effect=redis.ConnectionError)
+
+        assert sorted(self._feed_ids(api_client)) == sorted(advert.pk for advert in adverts)
+
+    def test_cold_start_served_from_database(self, api_client: APIClient, feed_snapshot_task):
+        """
+        Arrange: Активные объявления, снапшот ленты не построен
+        Act: Два запроса страницы ленты
+        Assert: Лента отдана из бд, построение снапшота поставлено в очередь один раз
+        """
+        adverts = self._save_adverts(2)
+
+        for _ in range(2):
+            assert self._feed_ids(api_client) == [advert.pk for advert in reversed(adverts)]
+
+        feed_snapshot_task.assert_called_once_with()
+
+    def test_changes_during_rebuild_replayed(self, mocker):
+        """
+        Arrange: Активные объявления
+        Act: Пока снапшот строится, одно объявление деактивируется уже после чтения из бд
+        Assert: После пересборки деактивированного объявления в снапшоте нет
+        """
+        first, second = self._save_adverts(2)
+        snapshot = FeedSnapshot()
+        add_chunk = snapshot._add_chunk
+
+        def deactivate_then_add(*args):
+            Advert.objects.filter(pk=first.pk).update(status=AdvertStatus.DISABLED)
+            FeedSnapshot().update(first.pk)
+            add_chunk(*args)
+
+        mocker.patch.object(snapshot, '_add_chunk', side_effect=deactivate_then_add)
+
+        assert snapshot.rebuild() == 2
+        assert [advert_id for *_, advert_id in snapshot.page(None, 10)] == [second.pk]
+
+    def test_concurrent_rebuild_skipped(self, redis_storage: redis.Redis):
+        """
+        Arrange: Активное объявление, снапшот уже строит другой воркер
+        Act: Пересборка снапшота
+        Assert: Пересборка пропущена, снапшот не тронут
+        """
+        self._save_adverts(1)
+        redis_storage.set(FEED_SNAPSHOT_LOCK_KEY.format(strategy='default'), 'other')
+
+        assert FeedSnapshot().rebuild() is None
+        assert not redis_storage.exists(FeedSnapshot().key)
@@ -0,0 +1,49 @@
+import pytest
+
+from booking.models import Advert, Boost, BoostType
+from booking.services import PromotionService
+from booking.tests.conftest import save_advert_object
+
+pytestmark = pytest.mark.django_db
+
+
+class TestPromotionRank:
+    """Тесты на синхронизацию Advert.effective_rank в PromotionService"""
+
+    def test_promote_sets_rank(self, advert: Advert):
+        """
+        Arrange: Объявление без продвижения
+        Act: Продвижение объявления
+        Assert: Ранг объявления равен уровню продвижения
+        """
+        save_advert_object(advert)
+
+        PromotionService.promote('Базовое', 3, advert)
+
+        assert Advert.objects.get(pk=advert.pk).effective_rank == 3
+
+    def test_boost_updates_rank(self, advert: Advert):
+        """
+        Arrange: Продвигаемое объявление
+        Act: Повышение уровня продвижения
+        Assert: Ранг объявления вырос вместе с уровнем продвижения
+        """
+        save_advert_object(advert)
+        promotion = PromotionService.promote('Базовое', 3, advert).promotion
+
+        PromotionService(promotion).boost(Boost(BoostType.INCREASE))
+
+        assert Advert.objects.get(pk=advert.pk).effective_rank == 4
+
+    def test_disable_resets_rank(self, advert: Advert):
+        """
+        Arrange: Продвигаемое объявление
+        Act: Отключение продвижения
+        Assert: Ранг объявления обнулился
+        """
+        save_advert_object(advert)
+        promotion = PromotionService.promote('Базовое', 3, advert).promotion
+
+        PromotionService(promotion).disable()
+
+        assert Advert.objects.get(pk=advert.pk).effective_rank == 0
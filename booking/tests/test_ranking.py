@@ -0,0 +1,150 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from booking.models import Advert, AdvertStatus
+from booking.ranking import STRATEGIES
+from booking.services import PromotionService
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRankingStrategies:
+
+    ADVERT_RECOMMENDATION_FILTER_URL = '/api/adverts/filter/'
+
+    def _save_advert(self, **kwargs) -> Advert:
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE, **kwargs)
+        save_advert_object(advert)
+        return advert
+
+    def _filter_ids(self, api_client: APIClient, **params) -> list[int]:
+        response = api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL, params)
+        assert response.status_code == status.HTTP_200_OK
+        return [advert['id'] for advert in response.data]  # type: ignore[union-attr]
+
+    @pytest.mark.parametrize('strategy', sorted(STRATEGIES))
+    def test_strategy_selected_by_request(self, api_client: APIClient, strategy: str):
+        """
+        Arrange: Активное объявление в бд
+        Act: Поиск с явно указанной стратегией, с текстом и без
+        Assert: Запрос выполнен, стратегия указана в заголовке ответа
+        """
+        self._save_advert(title='Экскаватор')
+
+        for params in ({'strategy': strategy}, {'strategy': strategy, 'title': 'экскаватор'}):
+            response = api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL, params)
+
+            assert response.status_code == status.HTTP_200_OK
+            assert response['X-Ranking-Strategy'] == strategy
+
+    def test_strategies_only_change_order(self, api_client: APIClient):
+        """
+        Arrange: Несколько объявлений разного возраста (меньше ADVERT_RANKING_CANDIDATES), одно из них продвигается
+        Act: Поиск с разными стратегиями и разрезами
+        Assert: Все стратегии находят одни и те же объявления с одинаковыми разрезами
+        """
+        adverts = [self._save_advert() for _ in range(3)]
+        PromotionService.promote('Базовое', 1, adverts[0])
+        Advert.objects.filter(pk=adverts[0].pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        responses = {}
+        for strategy in sorted(STRATEGIES):
+            response = api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL, {'strategy': strategy, 'facets': True})
+            assert response.status_code == status.HTTP_200_OK
+            responses[strategy] = response.data
+
+        for data in responses.values():
+            assert sorted(advert['id'] for advert in data['results']) == sorted(advert.pk for advert in adverts)
+            assert data['facets'] == responses['default']['facets']
+
+    def test_ranking_candidates_bounded(self, api_client: APIClient, settings):
+        """
+        Arrange: Объявлений больше, чем ADVERT_RANKING_CANDIDATES
+        Act: Поиск с разрезами со стратегией по умолчанию и со стратегией затухания
+        Assert: Затухание ранжирует только самые свежие объявления, стратегия по умолчанию - все,
+                разрезы у обеих посчитаны по всем найденным объявлениям
+        """
+        settings.ADVERT_RANKING_CANDIDATES = 2
+        adverts = [self._save_advert() for _ in range(3)]
+        for age, advert in enumerate(reversed(adverts)):
+            Advert.objects.filter(pk=advert.pk).update(created_at=timezone.now() - timedelta(days=age))
+
+        responses = {
+            strategy: api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL, {'strategy': strategy, 'facets': True})
+            for strategy in ('recency', 'default')
+        }
+
+        assert {advert['id'] for advert in responses['recency'].data['results']} == {adverts[2].pk, adverts[1].pk}
+        assert len(responses['default'].data['results']) == 3
+        assert responses['recency'].data['facets'] == responses['default'].data['facets']
+        assert sum(bucket['count'] for bucket in responses['recency'].data['facets']['price']) == 3
+
+    def test_unknown_strategy(self, api_client: APIClient):
+        """
+        Arrange: -
+        Act: Поиск с несуществующей стратегией
+        Assert: 422 ошибка
+        """
+        response = api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL, {'strategy': 'unknown'})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_recency_strategy(self, api_client: APIClient):
+        """
+        Arrange: Продвигаемое объявление месячной давности и свежее обычное
+        Act: Поиск со стратегией затухания и со стратегией по умолчанию
+        Assert: Свежее объявление обходит старое продвигаемое только при затухании
+        """
+        old = self._save_advert()
+        fresh = self._save_advert()
+        PromotionService.promote('Базовое', 1, old)
+        Advert.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        assert self._filter_ids(api_client, strategy='recency') == [fresh.pk, old.pk]
+        assert self._filter_ids(api_client, strategy='default') == [old.pk, fresh.pk]
+
+    def test_popular_strategy(self, api_client: APIClient):
+        """
+        Arrange: Объявление с просмотрами, объявление с лайками и объявление без того и другого
+        Act: Поиск со стратегией популярности
+        Assert: Объявления упорядочены по популярности
+        """
+        viewed = self._save_advert(views=5)
+        liked = self._save_advert(views=0, likes_count=3)
+        unknown = self._save_advert(views=0)
+
+        assert self._filter_ids(api_client, strategy='popular') == [liked.pk, viewed.pk, unknown.pk]
+
+    def test_rating_strategy(self, api_client: APIClient):
+        """
+        Arrange: Объявления авторов с разным рейтингом и без рейтинга
+        Act: Поиск со стратегией рейтинга
+        Assert: Объявления упорядочены по рейтингу автора
+        """
+        adverts = [self._save_advert() for _ in range(3)]
+        for advert, rating in zip(adverts, (Decimal('3.5'), None, Decimal('4.9'))):
+            advert.contact.rating = rating
+            advert.contact.save()
+
+        assert self._filter_ids(api_client, strategy='rating') == [adverts[2].pk, adverts[0].pk, adverts[1].pk]
+
+    @pytest.mark.parametrize('experiment, expected', (({}, 'default'), ({'recency': 100}, 'recency')))
+    def test_strategy_chosen_by_experiment(self, api_client: APIClient, settings, experiment: dict, expected: str):
+        """
+        Arrange: Настроенный A/B эксперимент
+        Act: Поиск без явно указанной стратегии
+        Assert: Стратегия выбрана по эксперименту
+        """
+        settings.ADVERT_RANKING_EXPERIMENT = experiment
+        self._save_advert()
+
+        response = api_client.get(self.ADVERT_RECOMMENDATION_FILTER_URL)
+
+        assert response['X-Ranking-Strategy'] == expected
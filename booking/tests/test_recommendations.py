@@ -0,0 +1,131 @@
+import pytest
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from authentication.models import Profile
+from booking.models import Advert, AdvertNeighbour, AdvertStatus
+from booking.recommendations import rebuild_advert_neighbours
+from booking.tests.conftest import save_advert_object
+from booking.tests.factories import AdvertFactory
+from review.tests.conftest import save_profile_object
+from review.tests.factories import ProfileFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAdvertRecommendations:
+
+    ADVERT_SIMILAR_URL = '/api/adverts/{}/similar/'
+    ADVERT_PERSONAL_URL = '/api/adverts/personal/'
+
+    def _save_advert(self) -> Advert:
+        advert = AdvertFactory(status=AdvertStatus.ACTIVE)
+        save_advert_object(advert)
+        return advert
+
+    def _save_profile(self, *liked: Advert) -> Profile:
+        profile = ProfileFactory()
+        save_profile_object(profile)
+        profile.liked_adverts.add(*liked)
+        return profile
+
+    def _neighbours(self, advert: Advert) -> list:
+        return list(advert.neighbours.order_by('-score').values_list('neighbour_id', flat=True))
+
+    def test_rebuild_neighbours(self):
+        """
+        Arrange: Объявления A, B, C, D. A и B лайкнули два профиля, A и C - один, D никто не лайкал вместе с A
+        Act: Пересчет соседей
+        Assert: У A соседи B и C по убыванию сходства, сходство - косинусная мера, у D соседей нет
+        """
+        a, b, c, d = (self._save_advert() for _ in range(4))
+        self._save_profile(a, b)
+        self._save_profile(a, b, c)
+        self._save_profile(d)
+
+        saved = rebuild_advert_neighbours(top_k=10, max_profile_likes=10)
+
+        assert self._neighbours(a) == [b.pk, c.pk]
+        assert self._neighbours(d) == []
+        # A лайкнули 2 профиля, C - 1, вместе - 1
+        assert AdvertNeighbour.objects.get(advert=a, neighbour=c).score == pytest.approx(1 / 2**0.5)
+        assert AdvertNeighbour.objects.get(advert=a, neighbour=b).score == pytest.approx(1.0)
+        assert saved == AdvertNeighbour.objects.count() == 6
+
+    def test_rebuild_neighbours_limits(self):
+        """
+        Arrange: Профиль, лайкнувший три объявления, и профиль, лайкнувший слишком много объявлений
+        Act: Пересчет соседей с top_k=1 и повторный пересчет
+        Assert: У объявления хранится один сосед, профиль с множеством лайков не учитывается, пересчет не дублирует пары
+        """
+        a, b, c = (self._save_advert() for _ in range(3))
+        noisy = [self._save_advert() for _ in range(3)]
+        self._save_profile(a, b, c)
+        self._save_profile(a, *noisy)
+
+        rebuild_advert_neighbours(top_k=1, max_profile_likes=3)
+        saved = rebuild_advert_neighbours(top_k=1, max_profile_likes=3)
+
+        assert len(self._neighbours(a)) == 1
+        assert not AdvertNeighbour.objects.filter(advert__in=noisy).exists()
+        assert saved == AdvertNeighbour.objects.count() == 3
+
+    def test_similar_adverts(self, api_client: APIClient):
+        """
+        Arrange: Объявления с общими лайками, одно из похожих снято с публикации
+        Act: Запрос похожих объявлений
+        Assert: Отдаются только активные похожие объявления, от наиболее похожего
+        """
+        a, b, c, disabled = (self._save_advert() for _ in range(4))
+        self._save_profile(a, b, disabled)
+        self._save_profile(a, b, c)
+        Advert.objects.filter(pk=disabled.pk).update(status=AdvertStatus.DISABLED)
+        rebuild_advert_neighbours(top_k=10, max_profile_likes=10)
+
+        response = api_client.get(self.ADVERT_SIMILAR_URL.format(a.pk))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [advert['id'] for advert in response.data] == [b.pk, c.pk]  # type: ignore[union-attr]
+
+    def test_personal_feed(self, auth_client: APIClient, auth_profile: Profile):
+        """
+        Arrange: Пользователь лайкнул A и B, другие профили лайкали их вместе с C и D, C - чаще
+        Act: Запрос персональной подборки
+        Assert: Подборка из C и D по убыванию суммарного сходства, без уже лайкнутых объявлений
+        """
+        a, b, c, d = (self._save_advert() for _ in range(4))
+        auth_profile.liked_adverts.add(a, b)
+        self._save_profile(a, c)
+        self._save_profile(b, c)
+        self._save_profile(a, d)
+        rebuild_advert_neighbours(top_k=10, max_profile_likes=10)
+
+        response = auth_client.get(self.ADVERT_PERSONAL_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [advert['id'] for advert in response.data] == [c.pk, d.pk]  # type: ignore[union-attr]
+
+    def test_personal_feed_fallback(self, auth_client: APIClient):
+        """
+        Arrange: Активные объявления, пользователь ничего не лайкал
+        Act: Запрос персональной подборки
+        Assert: Отдается начало обычной ленты
+        """
+        adverts = [self._save_advert() for _ in range(3)]
+
+        response = auth_client.get(self.ADVERT_PERSONAL_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [advert['id'] for advert in response.data] == [  # type: ignore[union-attr]
+            advert.pk for advert in reversed(adverts)
+        ]
+
+    def test_personal_feed_unauthorized(self, api_client: APIClient):
+        """
+        Arrange: -
+        Act: Запрос персональной подборки без авторизации
+        Assert: 401 ошибка
+        """
+        response = api_client.get(self.ADVERT_PERSONAL_URL)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
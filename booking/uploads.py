@@ -0,0 +1,78 @@
+from datetime import timedelta
+from typing import List, Optional
+
+import structlog
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from booking.models import AdvertUpload
+
+logger = structlog.get_logger(__name__)
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой'
+    default_code = 'upload_too_large'
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, прерывающий ее, как только тело запроса или файл превысили `max_size`
+    (по умолчанию `ADVERT_UPLOAD_MAX_SIZE`)
+
+    Сам данные не сохраняет, а передает их следующему обработчику в цепочке (временному файлу на диске)
+    """
+
+    def __init__(self, request: HttpRequest = None, max_size: Optional[int] = None):
+        super().__init__(request)
+        self.max_size = max_size or settings.ADVERT_UPLOAD_MAX_SIZE
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Запрос заведомо больше лимита (с запасом на заголовки multipart) - не читаем его вовсе
+        if content_length > self.max_size + 64 * 1024:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> bytes:
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            raise UploadTooLarge()
+
+        return raw_data
+
+    def file_complete(self, file_size: int):
+        return None
+
+
+def get_upload_handlers(request: HttpRequest, max_size: Optional[int] = None) -> List[FileUploadHandler]:
+    """Обработчики, которые пишут загрузку во временный файл по частям, не держа ее целиком в памяти"""
+    return [MaxSizeUploadHandler(request, max_size), TemporaryFileUploadHandler(request)]
+
+
+def delete_stale_uploads(ttl: int) -> int:
+    """
+    Удалить загрузки (и их файлы), на которые так и не сослалось ни одно объявление
+
+    :param ttl (int) Сколько секунд хранится загрузка
+    :return: количество удаленных загрузок
+    """
+    deleted = 0
+    stale = AdvertUpload.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=ttl))
+
+    for upload in stale.iterator():
+        upload.file.delete(save=False)
+        upload.delete()
+        deleted += 1
+
+    logger.info('stale advert uploads deleted', count=deleted)
+
+    return deleted
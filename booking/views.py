@@ -1,10 +1,14 @@
+from functools import partial
 from typing import Optional
 
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.routers import DefaultRouter
 from rest_framework.viewsets import ViewSet
@@ -12,21 +16,77 @@ import structlog
 
 from authentication.misc.custom_auth import CookieTokenAuthentication
 from authentication.models import Profile
-from booking.models import Advert, Promotion, AdvertStatus
+from authentication.selectors.profile import get_request_profile
+from booking.cache import cached_feed_response, cached_advert_response
+from booking.counters import record_advert_view
+from booking.likes import like_advert, unlike_advert
+from booking.models import Advert, AdvertImport, Promotion, AdvertStatus
+from booking.pagination import AdvertFeedSnapshotPagination
+from booking.ranking import choose_strategy
 from booking.serializers import (
+    AdvertImportSerializer,
+    AdvertBulkIdsSerializer,
+    AdvertBulkUpdateSerializer,
     AdvertSerializer,
     SearchFilterSerializer,
     PromotionSerializer,
     AdvertCreationSerializer,
     AdvertUpdateSerializer,
+    AutocompleteSerializer,
+    AdvertUploadSerializer,
+)
+from booking.search import suggest_titles
+from booking.selectors.advert import get_feed_adverts, with_feed_relations
+from booking.services import AdvertBulkService, AdvertService, AdvertsRecommendationService
+from booking.tasks import import_adverts_task
+from booking.uploads import get_upload_handlers
+from common.helpers.export import ExportSerializer, export_response
+from common.swagger.schema import (
+    DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+    DEFAULT_PUBLIC_API_SCHEMA_RESPONSES,
+    SWAGGER_NO_RESPONSE_BODY,
 )
-from booking.services import AdvertService, AdvertsRecommendationService
-from common.swagger.schema import DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES, SWAGGER_NO_RESPONSE_BODY
 
 logger = structlog.get_logger(__name__)
 router = DefaultRouter()
 
 POSTS_SWAGGER_TAG = 'Объявления'
+RANKING_STRATEGY_HEADER = 'X-Ranking-Strategy'
+
+ADVERT_EXPORT_FIELDS = (
+    'id',
+    'title',
+    'description',
+    'price',
+    'phone',
+    'location',
+    'status',
+    'views',
+    'likes_count',
+    'created_at',
+    'activated_at',
+    'active_until',
+)
+
+BULK_RESULTS_RESPONSE = OpenApiResponse(
+    response={
+        'type': 'object',
+        'properties': {
+            'results': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'id': {'type': 'integer'},
+                        'result': {'type': 'string'},
+                        'errors': {'type': 'object'},
+                    },
+                },
+            }
+        },
+    },
+    description='Результат по каждому объявлению',
+)
 
 
 @extend_schema(tags=[POSTS_SWAGGER_TAG])
@@ -45,9 +105,9 @@ class AdvertViewSet(ViewSet):
         },
     )
     def list(self, request):
-        profile: Profile = get_object_or_404(Profile, user=request.user)  # type: ignore[annotation-unchecked]
+        profile: Profile = get_request_profile(request)  # type: ignore[annotation-unchecked]
         return (
-            AdvertsRecommendationService(self.queryset.filter(contact=profile))
+            AdvertsRecommendationService(with_feed_relations(self.queryset.filter(contact=profile)))
             .serialize(self.serializer_class)
             .ok()
             .or_else_404()
@@ -62,7 +122,7 @@ class AdvertViewSet(ViewSet):
         },
     )
     def retrieve(self, request, pk=None) -> Optional[Response]:
-        profile: Profile = get_object_or_404(Profile, user=request.user)
+        profile: Profile = get_request_profile(request)
         return (
             AdvertService.find(
                 advert_pk=pk,
@@ -89,8 +149,8 @@ class AdvertViewSet(ViewSet):
             data=request.data,
         )
 
-        profile: Profile = get_object_or_404(Profile, user=request.user)
-        serializer = AdvertCreationSerializer(data=request.data)
+        profile: Profile = get_request_profile(request)
+        serializer = AdvertCreationSerializer(data=request.data, context={'profile': profile})
 
         logger.debug('user got profile', user=request.user, profile=profile)
 
@@ -108,6 +168,110 @@ class AdvertViewSet(ViewSet):
         else:
             return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        # Тело разбирается лениво, так что обработчики загрузки еще можно заменить
+        if self.action == 'upload':
+            request.upload_handlers = get_upload_handlers(request)
+        elif self.action == 'import_adverts':
+            request.upload_handlers = get_upload_handlers(request, settings.ADVERT_IMPORT_MAX_SIZE)
+
+        return drf_request
+
+    @extend_schema(
+        description='Загрузить изображение для объявления. Возвращает токен, который передается при подаче объявления',
+        request={'multipart/form-data': AdvertUploadSerializer},
+        responses={
+            status.HTTP_201_CREATED: AdvertUploadSerializer,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: OpenApiResponse(description='Request Entity Too Large'),
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['post'], detail=False, url_path='uploads', parser_classes=[MultiPartParser])
+    def upload(self, request) -> Response:
+        profile: Profile = get_request_profile(request)
+        serializer = AdvertUploadSerializer(data=request.data)
+
+        if serializer.is_valid():
+            serializer.save(owner=profile)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        else:
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @extend_schema(
+        description=(
+            'Загрузить CSV или XLSX файл с объявлениями. Первая строка файла - заголовки колонок: title, description, '
+            'price, phone, location, status, logo_url, image_urls (ссылки через пробел). Файл обрабатывается в фоне, '
+            'прогресс и ошибки по строкам отдаются по id импорта'
+        ),
+        request={'multipart/form-data': AdvertImportSerializer},
+        responses={
+            status.HTTP_202_ACCEPTED: AdvertImportSerializer,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: OpenApiResponse(description='Request Entity Too Large'),
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['post'], detail=False, url_path='imports', parser_classes=[MultiPartParser])
+    def import_adverts(self, request) -> Response:
+        profile: Profile = get_request_profile(request)
+        serializer = AdvertImportSerializer(data=request.data)
+
+        if serializer.is_valid():
+            advert_import = serializer.save(owner=profile)
+            transaction.on_commit(partial(import_adverts_task.delay, advert_import.pk))
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+        else:
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @extend_schema(
+        description='Прогресс импорта объявлений из файла',
+        request={},
+        responses={
+            status.HTTP_200_OK: AdvertImportSerializer,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+        },
+    )
+    @action(methods=['get'], detail=False, url_path=r'imports/(?P<import_id>\d+)')
+    def import_status(self, request, import_id=None) -> Response:
+        profile: Profile = get_request_profile(request)
+        advert_import = get_object_or_404(AdvertImport, pk=import_id, owner=profile)
+
+        return Response(AdvertImportSerializer(advert_import).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            'Выгрузить объявления пользователя в CSV или NDJSON. Колонки CSV совпадают с колонками импорта, '
+            'выгрузка отдается потоково'
+        ),
+        parameters=[ExportSerializer],
+        responses={
+            (status.HTTP_200_OK, 'text/csv'): OpenApiResponse(description='CSV выгрузка'),
+            (status.HTTP_200_OK, 'application/x-ndjson'): OpenApiResponse(description='NDJSON выгрузка'),
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        profile: Profile = get_request_profile(request)
+        serializer = ExportSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            return export_response(
+                Advert.objects.filter(contact=profile).order_by('pk'),
+                ADVERT_EXPORT_FIELDS,
+                ADVERT_EXPORT_FIELDS,
+                serializer.validated_data['file_format'],
+                filename='adverts',
+            )
+
+        else:
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
     @extend_schema(
         description='Изменить объявление',
         request=AdvertSerializer,
@@ -118,7 +282,7 @@ class AdvertViewSet(ViewSet):
         },
     )
     def update(self, request, pk=None) -> Optional[Response]:
-        profile: Profile = get_object_or_404(Profile, user=request.user)
+        profile: Profile = get_request_profile(request)
         serializer = AdvertUpdateSerializer(data=request.data, partial=True)
 
         if serializer.is_valid():
@@ -146,7 +310,7 @@ class AdvertViewSet(ViewSet):
     )
     @action(methods=['patch'], detail=True)  # type: ignore[type-var]
     def activate(self, request, pk=None) -> Optional[Response]:
-        profile: Profile = get_object_or_404(Profile, user=request.user)
+        profile: Profile = get_request_profile(request)
 
         return (
             AdvertService.find(
@@ -169,7 +333,7 @@ class AdvertViewSet(ViewSet):
     )
     @action(methods=['patch'], detail=True)  # type: ignore[type-var]
     def deactivate(self, request, pk=None) -> Optional[Response]:
-        user: Profile = get_object_or_404(Profile, user=request.user)
+        user: Profile = get_request_profile(request)
 
         return (
             AdvertService.find(
@@ -190,7 +354,7 @@ class AdvertViewSet(ViewSet):
         },
     )
     def destroy(self, request, pk=None) -> Optional[Response]:
-        user: Profile = get_object_or_404(Profile, user=request.user)
+        user: Profile = get_request_profile(request)
 
         return (
             AdvertService.find(
@@ -202,6 +366,79 @@ class AdvertViewSet(ViewSet):
             .or_else_400()
         )
 
+    def _bulk(self, request, operation: str) -> Optional[Response]:
+        profile: Profile = get_request_profile(request)
+        serializer = AdvertBulkIdsSerializer(data=request.data)
+
+        if serializer.is_valid():
+            service = AdvertBulkService(profile)
+            return getattr(service, operation)(serializer.validated_data['ids']).ok().or_else_422()
+
+        else:
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @extend_schema(
+        description='Активировать несколько объявлений пользователя одним запросом',
+        request=AdvertBulkIdsSerializer,
+        responses={
+            status.HTTP_200_OK: BULK_RESULTS_RESPONSE,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['patch'], detail=False, url_path='bulk/activate')
+    def bulk_activate(self, request) -> Optional[Response]:
+        return self._bulk(request, 'activate')
+
+    @extend_schema(
+        description='Деактивировать несколько объявлений пользователя одним запросом',
+        request=AdvertBulkIdsSerializer,
+        responses={
+            status.HTTP_200_OK: BULK_RESULTS_RESPONSE,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['patch'], detail=False, url_path='bulk/deactivate')
+    def bulk_deactivate(self, request) -> Optional[Response]:
+        return self._bulk(request, 'deactivate')
+
+    @extend_schema(
+        description='Удалить несколько объявлений пользователя одним запросом',
+        request=AdvertBulkIdsSerializer,
+        responses={
+            status.HTTP_200_OK: BULK_RESULTS_RESPONSE,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['post'], detail=False, url_path='bulk/delete')
+    def bulk_destroy(self, request) -> Optional[Response]:
+        return self._bulk(request, 'remove')
+
+    @extend_schema(
+        description=(
+            'Изменить несколько объявлений пользователя одним запросом. Каждый элемент `items` - id объявления '
+            'и новые значения его полей. Некорректные элементы получают результат `invalid` и не мешают остальным'
+        ),
+        request=AdvertBulkUpdateSerializer,
+        responses={
+            status.HTTP_200_OK: BULK_RESULTS_RESPONSE,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(methods=['patch'], detail=False, url_path='bulk/update')
+    def bulk_update(self, request) -> Optional[Response]:
+        profile: Profile = get_request_profile(request)
+        serializer = AdvertBulkUpdateSerializer(data=request.data)
+
+        if serializer.is_valid():
+            return AdvertBulkService(profile).change(serializer.validated_data['items']).ok().or_else_422()
+
+        else:
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
 
 @extend_schema(tags=[POSTS_SWAGGER_TAG])
 class AdvertsRecommendationViewSet(ViewSet):
@@ -209,16 +446,37 @@ class AdvertsRecommendationViewSet(ViewSet):
 
     queryset = Advert.objects.filter(status=AdvertStatus.ACTIVE)
     serializer_class = AdvertSerializer
+    pagination_class = AdvertFeedSnapshotPagination
 
     @extend_schema(
-        description='Лента объявлений',
+        description=(
+            'Лента объявлений. Если передан `cursor` или `page_size`, лента отдается постранично '
+            '(keyset пагинация), иначе целиком'
+        ),
         request={},
+        parameters=[
+            OpenApiParameter('cursor', str, description='Курсор следующей страницы ленты'),
+            OpenApiParameter('page_size', int, description='Количество объявлений на странице'),
+        ],
         responses={
             status.HTTP_200_OK: serializer_class,
             **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
         },
     )
     def list(self, request):
+        return cached_feed_response(request, lambda: self._list(request))
+
+    def _list(self, request) -> Optional[Response]:
+        paginator = self.pagination_class()
+
+        if paginator.is_requested(request):
+            return (
+                AdvertsRecommendationService.list()
+                .paginate(paginator, request, self.serializer_class)
+                .ok()
+                .or_else_400()
+            )
+
         return AdvertsRecommendationService.list().serialize(self.serializer_class).ok().or_else_400()
 
     @extend_schema(
@@ -230,15 +488,28 @@ class AdvertsRecommendationViewSet(ViewSet):
         },
     )
     def retrieve(self, request, pk=None):
+        response = cached_advert_response(request, pk, lambda: self._retrieve(pk))
+        # Просмотр засчитывается и для ответа из кэша, но только если объявление действительно нашлось
+        if response.status_code == status.HTTP_200_OK and response.data:
+            record_advert_view(request, pk)
+
+        return response
+
+    def _retrieve(self, pk) -> Optional[Response]:
         return (
-            AdvertsRecommendationService(self.queryset.filter(id=pk).values())
+            AdvertsRecommendationService(get_feed_adverts(self.queryset.filter(id=pk)))
             .serialize(self.serializer_class)
             .ok()
             .or_else_404()
         )
 
     @extend_schema(
-        description='Поиск объявлений с фильтрацией',
+        description=(
+            'Поиск объявлений с фильтрацией. С facets=true ответ имеет вид {"results": [...], "facets": {...}}, '
+            'где facets - гистограмма цен, самые частые местоположения и количество продвигаемых объявлений. '
+            'Все стратегии ранжирования, кроме default, ранжируют только ADVERT_RANKING_CANDIDATES самых свежих '
+            'найденных объявлений; facets всегда считаются по всем найденным'
+        ),
         parameters=[SearchFilterSerializer],
         responses={
             status.HTTP_200_OK: serializer_class,
@@ -259,9 +530,127 @@ class AdvertsRecommendationViewSet(ViewSet):
                 params=data,
             )
 
-            return (
-                AdvertsRecommendationService.ranked_list(serializer).serialize(self.serializer_class).ok().or_else_400()
+            strategy = choose_strategy(request, data.get('strategy'))
+            service = AdvertsRecommendationService.ranked_list(serializer, strategy).serialize(self.serializer_class)
+            if data['facets']:
+                service = service.with_facets(data)
+
+            response = service.ok().or_else_400()
+            # По заголовку аналитика понимает, в какую группу A/B эксперимента попал запрос
+            response[RANKING_STRATEGY_HEADER] = strategy.name
+            return response
+
+        else:
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @extend_schema(
+        description='Лайкнуть объявление. Повторный лайк ничего не меняет',
+        request={},
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response={'type': 'object', 'properties': {'liked': {'type': 'boolean'}}},
+                description='Объявление лайкнуто',
+            ),
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+        },
+    )
+    @action(
+        detail=True,
+        methods=['post'],
+        permission_classes=[IsAuthenticated],
+        authentication_classes=[CookieTokenAuthentication],
+    )
+    def like(self, request, pk=None):
+        profile: Profile = get_request_profile(request)
+        advert: Advert = get_object_or_404(self.queryset, pk=pk)
+
+        like_advert(profile, advert.pk)
+
+        return Response({'liked': True}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description='Снять лайк с объявления. Снятие отсутствующего лайка ничего не меняет',
+        request={},
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response={'type': 'object', 'properties': {'liked': {'type': 'boolean'}}},
+                description='Лайк снят',
+            ),
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+        },
+    )
+    @action(
+        detail=True,
+        methods=['post'],
+        permission_classes=[IsAuthenticated],
+        authentication_classes=[CookieTokenAuthentication],
+    )
+    def unlike(self, request, pk=None):
+        profile: Profile = get_request_profile(request)
+        # Лайк можно снять и с объявления, которое уже сняли с публикации
+        advert: Advert = get_object_or_404(Advert, pk=pk)
+
+        unlike_advert(profile, advert.pk)
+
+        return Response({'liked': False}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description='Объявления, похожие на данное: их лайкали те же пользователи',
+        request={},
+        responses={
+            status.HTTP_200_OK: serializer_class,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+        },
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        return AdvertsRecommendationService.similar(pk).serialize(self.serializer_class).ok().or_else_404()
+
+    @extend_schema(
+        description=(
+            'Персональная подборка объявлений по лайкам пользователя. Если пользователь еще ничего не лайкал, '
+            'отдается начало обычной ленты'
+        ),
+        request={},
+        responses={
+            status.HTTP_200_OK: serializer_class,
+            **DEFAULT_PRIVATE_API_ERRORS_WITH_404_SCHEMA_RESPONSES,
+        },
+    )
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        authentication_classes=[CookieTokenAuthentication],
+    )
+    def personal(self, request):
+        profile: Profile = get_request_profile(request)
+
+        return AdvertsRecommendationService.personal(profile).serialize(self.serializer_class).ok().or_else_404()
+
+    @extend_schema(
+        description='Подсказки названий объявлений по введенной строке (с учетом опечаток)',
+        parameters=[AutocompleteSerializer],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response={'type': 'array', 'items': {'type': 'string'}},
+                description='Названия объявлений, от наиболее похожего к наименее',
+            ),
+            **DEFAULT_PUBLIC_API_SCHEMA_RESPONSES,
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description='Unprocessable Entity'),
+        },
+    )
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        serializer = AutocompleteSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            suggestions = suggest_titles(
+                self.queryset,
+                prefix=serializer.validated_data['q'],
+                limit=serializer.validated_data.get('limit', settings.ADVERT_AUTOCOMPLETE_MAX_LIMIT),
             )
+            return Response(suggestions, status=status.HTTP_200_OK)
 
         else:
             return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
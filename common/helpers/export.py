@@ -0,0 +1,94 @@
+import csv
+import json
+from itertools import islice
+from typing import Iterable, Iterator, Sequence
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# BOM, чтобы Excel открывал выгрузку как UTF-8, а не в кодировке системы
+CSV_BOM = '\ufeff'
+
+# Ячейку с такого символа табличные редакторы считают формулой
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportSerializer(serializers.Serializer):
+    """Параметры выгрузки"""
+
+    file_format = serializers.ChoiceField(choices=sorted(EXPORT_FORMATS), default='csv')
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку, вместо того чтобы ее хранить"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _rows(queryset: QuerySet, fields: Sequence[str]) -> Iterator[tuple]:
+    # Кортежи вместо моделей, а iterator() читает их из курсора бд пачками, не кэшируя всю выборку
+    return queryset.values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def _batched(lines: Iterable[str]) -> Iterator[str]:
+    # Отдавать по строке на каждую запись слишком дорого, а копить всю выгрузку - слишком много памяти
+    lines = iter(lines)
+    while True:
+        batch = ''.join(islice(lines, settings.EXPORT_CHUNK_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _escape_formula(value):
+    # Пользовательский текст вида "=HYPERLINK(...)" не должен выполниться формулой при открытии выгрузки
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(queryset: QuerySet, fields: Sequence[str], header: Sequence[str]) -> Iterator[str]:
+    """Строки CSV выгрузки выборки: сначала заголовок, затем по строке на запись"""
+    writer = csv.writer(_Echo())
+    yield CSV_BOM + writer.writerow(header)
+    yield from _batched(writer.writerow([_escape_formula(value) for value in row]) for row in _rows(queryset, fields))
+
+
+def iter_ndjson(queryset: QuerySet, fields: Sequence[str], header: Sequence[str]) -> Iterator[str]:
+    """Строки NDJSON выгрузки выборки: по JSON объекту с ключами из `header` на запись"""
+    yield from _batched(
+        json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        for row in _rows(queryset, fields)
+    )
+
+
+def export_response(
+    queryset: QuerySet, fields: Sequence[str], header: Sequence[str], export_format: str, filename: str
+) -> StreamingHttpResponse:
+    """
+    Потоковая выгрузка выборки в CSV или NDJSON
+
+    Ответ начинает отдаваться сразу, а записи читаются из бд по мере отправки (серверным курсором PostgreSQL),
+    так что память не зависит от размера выгрузки
+
+    :param queryset (QuerySet) Выгружаемая выборка
+    :param fields (Sequence[str]) Поля выборки (в формате values_list)
+    :param header (Sequence[str]) Названия колонок CSV / ключи NDJSON, по одному на поле
+    :param export_format (str) Формат выгрузки: csv или ndjson
+    :param filename (str) Имя файла без расширения
+    :return: StreamingHttpResponse
+    """
+    rows = iter_csv if export_format == 'csv' else iter_ndjson
+    response = StreamingHttpResponse(rows(queryset, fields, header), content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+
+    return response
@@ -0,0 +1,19 @@
+from django.conf import settings
+from rest_framework.request import Request
+
+
+def get_client_ip(request: Request) -> str:
+    """
+    IP адрес клиента
+
+    Без доверенных прокси (`TRUSTED_PROXY_COUNT` = 0) это адрес соединения: X-Forwarded-For задает сам клиент.
+    За N доверенными прокси, каждый из которых дописывает в X-Forwarded-For адрес, от которого получил запрос,
+    адрес клиента - N-й справа: все, что левее, мог подставить клиент
+    """
+    proxy_count = settings.TRUSTED_PROXY_COUNT
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxy_count and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(',')]
+        return addresses[-min(proxy_count, len(addresses))]
+
+    return request.META.get('REMOTE_ADDR', '')
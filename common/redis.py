@@ -0,0 +1,18 @@
+from typing import Dict
+
+import redis
+from django.conf import settings
+
+_clients: Dict[str, redis.Redis] = {}
+
+
+def get_redis() -> redis.Redis:
+    """
+    Клиент Redis для структур данных, которые не укладываются в интерфейс кэша Django
+    (счетчики, множества, скрипты). Клиент (и его пул соединений) создается один раз на процесс
+    """
+    url = settings.REDIS_STORAGE_URL
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+
+    return _clients[url]
@@ -1,10 +1,16 @@
+import contextlib
+
 import pytest
+import redis
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient
 
 from authentication.models import Profile
 from authentication.tests.factories import UserFactory, ProfileFactory
+from authentication.token_cache import local_token_cache
+from common.redis import get_redis
 
 
 LOGIN_URL_NAME = 'login'
@@ -42,3 +48,35 @@ def auth_client(api_client: APIClient, auth_user: User, auth_profile: Profile) -
 def profile() -> Profile:
     """Фикстура профиля"""
     return ProfileFactory()
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """Фикстура, подменяющая Redis кэш локальным, чтобы тесты не зависели от Redis и друг от друга"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def redis_storage(settings) -> redis.Redis:
+    """Фикстура, переключающая Redis счетчиков на отдельную тестовую базу и очищающая ее после теста"""
+    settings.REDIS_STORAGE_URL = f'redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/15'
+    client = get_redis()
+    yield client
+    # Тесты, которым Redis не нужен, не должны падать, если он не запущен
+    with contextlib.suppress(redis.ConnectionError):
+        client.flushdb()
+
+
+@pytest.fixture(autouse=True)
+def token_cache():
+    """Фикстура, очищающая кэш токенов авторизации в памяти процесса (Redis очищает redis_storage)"""
+    yield
+    local_token_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def otp_backend(settings):
+    """Фикстура, хранящая одноразовые коды в бд, чтобы тесты видели их в OneTimePassword"""
+    settings.OTP_BACKEND = 'database'
@@ -1,3 +1,5 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
 from rest_framework.exceptions import APIException
 
 from payments.models import Payment
@@ -10,3 +12,8 @@ def get_payment_by_external_id(id: str) -> Payment:
         raise APIException()
 
     return payment
+
+
+def get_user_payments(user: User) -> QuerySet[Payment]:
+    """Платежи пользователя, от новых к старым"""
+    return Payment.objects.filter(user=user).order_by("-created_at", "pk")
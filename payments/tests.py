@@ -0,0 +1,53 @@
+import csv
+import io
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth.models import User
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from booking.tests.factories import AdvertFactory, save_advert_object
+from common.helpers.export import CSV_BOM
+from payments.models import Payment, PaymentStatus
+
+pytestmark = pytest.mark.django_db
+
+
+class TestPaymentExport:
+
+    PAYMENTS_EXPORT_URL = '/api/payments/export/'
+
+    def test_export_payments(self, auth_client: APIClient, auth_user: User, profile):
+        """
+        Arrange: Платежи пользователя и платеж другого пользователя
+        Act: Выгрузка платежей в CSV
+        Assert: В выгрузке только платежи пользователя вместе с названием объявления
+        """
+        advert = AdvertFactory()
+        save_advert_object(advert)
+        own = [
+            Payment.objects.create(user=auth_user, advert=advert, amount=Decimal('100.00'), external_transaction_id=i)
+            for i in ('first', 'second')
+        ]
+        profile.user.save()
+        Payment.objects.create(user=profile.user, advert=advert, amount=Decimal('1.00'), external_transaction_id='x')
+
+        response = auth_client.get(self.PAYMENTS_EXPORT_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        content = b''.join(response.streaming_content).decode().removeprefix(CSV_BOM)
+        rows = list(csv.DictReader(io.StringIO(content)))
+        assert sorted(row['id'] for row in rows) == sorted(str(payment.pk) for payment in own)
+        assert {row['advert_title'] for row in rows} == {advert.title}
+        assert {row['status'] for row in rows} == {PaymentStatus.PENDING}
+
+    def test_export_payments_unauthorized(self, api_client: APIClient):
+        """
+        Arrange: -
+        Act: Выгрузка платежей без авторизации
+        Assert: 401 ошибка
+        """
+        response = api_client.get(self.PAYMENTS_EXPORT_URL)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -1,8 +1,9 @@
 from django.urls import path
 
-from payments.views import PromotionPurchaseView, PaymentSystemWebHookView
+from payments.views import PaymentExportView, PromotionPurchaseView, PaymentSystemWebHookView
 
 urlpatterns = [
     path("pay/", PromotionPurchaseView.as_view(), name="purchase-promotion"),
     path("hook/", PaymentSystemWebHookView.as_view(), name="payment-webhook"),
+    path("export/", PaymentExportView.as_view(), name="payment-export"),
 ]
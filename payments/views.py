@@ -1,4 +1,4 @@
-from drf_spectacular.utils import extend_schema, inline_serializer
+from drf_spectacular.utils import OpenApiResponse, extend_schema, inline_serializer
 from rest_framework import status, serializers
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
@@ -9,15 +9,40 @@ from rest_framework.views import APIView
 from authentication.misc.custom_auth import CookieTokenAuthentication
 from booking.permissions import IsAdvertOwnerOrReadOnly
 from booking.services import PromotionService
+from common.helpers.export import ExportSerializer, export_response
 from common.swagger.schema import SWAGGER_NO_RESPONSE_BODY, DEFAULT_PUBLIC_API_SCHEMA_RESPONSES
 from payments.models import PaymentStatus
-from payments.selectors import get_payment_by_external_id
+from payments.selectors import get_payment_by_external_id, get_user_payments
 from payments.serializers import PaymentSerializer, WebHookEventSerializer
 from payments.services.purchase_processors import YooKassa
 
 
 PAYMENTS_SWAGGER_TAG = "Оплата"
 
+# Поля выгрузки платежей и названия соответствующих колонок
+PAYMENT_EXPORT_FIELDS = (
+    "id",
+    "advert_id",
+    "advert__title",
+    "amount",
+    "status",
+    "service_provider",
+    "external_transaction_id",
+    "created_at",
+    "completed_at",
+)
+PAYMENT_EXPORT_HEADER = (
+    "id",
+    "advert_id",
+    "advert_title",
+    "amount",
+    "status",
+    "service_provider",
+    "external_transaction_id",
+    "created_at",
+    "completed_at",
+)
+
 
 class PromotionPurchaseView(APIView):
     authentication_classes = [CookieTokenAuthentication]
@@ -77,3 +102,33 @@ class PaymentSystemWebHookView(APIView):
             PromotionService().promote("Базовое", 1, internal_payment.advert)
 
         return Response(status=HTTP_200_OK)
+
+
+class PaymentExportView(APIView):
+    authentication_classes = [CookieTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        tags=[PAYMENTS_SWAGGER_TAG],
+        description="Выгрузить историю платежей пользователя в CSV или NDJSON (потоково)",
+        parameters=[ExportSerializer],
+        responses={
+            (status.HTTP_200_OK, "text/csv"): OpenApiResponse(description="CSV выгрузка"),
+            (status.HTTP_200_OK, "application/x-ndjson"): OpenApiResponse(description="NDJSON выгрузка"),
+            status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(description="Unprocessable Entity"),
+            **DEFAULT_PUBLIC_API_SCHEMA_RESPONSES,
+        },
+    )
+    def get(self, request: Request):
+        serializer = ExportSerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        return export_response(
+            get_user_payments(request.user),
+            PAYMENT_EXPORT_FIELDS,
+            PAYMENT_EXPORT_HEADER,
+            serializer.validated_data["file_format"],
+            filename="payments",
+        )